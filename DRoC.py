@@ -1,43 +1,34 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
 from common import *
 from utils import context_all,context_or_tools_codes, context_gurobi_codes, write_code_to_file, merge_retriever
 from langchain_core.prompts import PromptTemplate
 from langchain.globals import set_debug
 import warnings
 from langchain.tools.retriever import create_retriever_tool
-from langchain_anthropic import ChatAnthropic
+from journal import load_state
+from tracking import current_usage
+from compaction import compact_context, compact_messages, context_budget
+from streaming import code_chain, invoke_code, ainvoke_code, check_generation, acheck_generation
+from llms import chat_model, retrying, call_priority, GRADING_PRIORITY, GENERATION_PRIORITY
+import asyncio
 
 set_debug(False)
 
-def evolutionary_decomposer(problem, llm):
-    """Extract constraints and prepare for evolutionary optimization at constraint level."""
-
+def _evolutionary_decomposer_chain(llm):
     system = """You will extract the keywords of an assignment problem for me. 
     I give you the name of an assignment problem and you produce the keywords according to its constraints.
     Also assign a priority (1-5) for each constraint based on its complexity and impact on solution quality.
     Structure your answer with: <keyword1:priority1, keyword2:priority2, ...>. Do not return other things."""
-    if llm.startswith("llama"):
-        llm = ChatOllama(
-            model=llm,
-            temperature=0,
-        )
-    elif llm.startswith("gpt"):
-        llm = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        llm = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError("llm not supported!")
     prompt = ChatPromptTemplate.from_messages([
         ("system", system),
         ("human", "Here is the name of the assignment problem: \n\n {problem}"),
     ])
+    return retrying(prompt | chat_model(llm))
 
-    keyword_extractor = prompt | llm
-    res = keyword_extractor.invoke({"problem": problem}).content.replace("<", "").replace(">", "").split(",")
 
+def _parse_constraints(content):
+    res = content.replace("<", "").replace(">", "").split(",")
     constraints = []
     for item in res:
         if ":" in item:
@@ -45,19 +36,23 @@ def evolutionary_decomposer(problem, llm):
             constraints.append({"keyword": keyword.strip(), "priority": int(priority.strip())})
         else:
             constraints.append({"keyword": item.strip(), "priority": 3})
-
     return constraints
-def evolve_constraint_code(keyword, code_examples, solver, llm, priority):
-    """Apply evolutionary algorithm to optimize constraint implementation."""
-    if llm.startswith("gpt"):
-        model = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        model = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError
 
-    population_size = min(len(code_examples), 5 + priority)
-    print(5)
+
+def evolutionary_decomposer(problem, llm):
+    """Extract constraints and prepare for evolutionary optimization at constraint level."""
+    res = _evolutionary_decomposer_chain(llm).invoke({"problem": problem})
+    return _parse_constraints(res.content)
+
+
+async def aevolutionary_decomposer(problem, llm):
+    """Async variant of evolutionary_decomposer."""
+    res = await _evolutionary_decomposer_chain(llm).ainvoke({"problem": problem})
+    return _parse_constraints(res.content)
+
+
+def _evolve_chain(code_examples, llm):
+    model = chat_model(llm)
     prompt_template_evo = ChatPromptTemplate.from_messages([
         ("system", f"""You are an expert in evolutionary algorithms for constraint optimization.
         You will evolve population_size implementations of keyword constraint for solver."""),
@@ -76,9 +71,13 @@ def evolve_constraint_code(keyword, code_examples, solver, llm, priority):
         Return only the best evolved constraint implementation without explanations.
         """)
     ])
-    print(6)
-    chain = prompt_template_evo | model.with_structured_output(code_examples)
-    result = chain.invoke({
+    return retrying(prompt_template_evo | model.with_structured_output(code_examples))
+
+
+def evolve_constraint_code(keyword, code_examples, solver, llm, priority):
+    """Apply evolutionary algorithm to optimize constraint implementation."""
+    population_size = min(len(code_examples), 5 + priority)
+    result = _evolve_chain(code_examples, llm).invoke({
         "keyword": keyword,
         "solver": solver,
         "priority": priority
@@ -87,32 +86,39 @@ def evolve_constraint_code(keyword, code_examples, solver, llm, priority):
     return result.content
 
 
-def evolutionary_constraint_retriever(constraints, solver="or-tools", llm=None):
-    """Retrieve multiple code examples for each constraint and apply evolutionary optimization."""
+async def aevolve_constraint_code(keyword, code_examples, solver, llm, priority):
+    """Async variant of evolve_constraint_code."""
+    result = await _evolve_chain(code_examples, llm).ainvoke({
+        "keyword": keyword,
+        "solver": solver,
+        "priority": priority
+    })
+    return result.content
+
+
+def solver_retriever(solver):
+    """The retriever over the example codes of a solver."""
     if solver == "OR-tools":
-        retriever = context_all()
+        return context_all()
     elif solver == "Gurobi":
-        retriever = context_gurobi_codes()
-    if llm.startswith("gpt"):
-        model = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        model = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError
+        return context_gurobi_codes()
+    raise NotImplementedError
+
+
+def evolutionary_constraint_retriever(constraints, solver="or-tools", llm=None):
+    """Retrieve multiple code examples for each constraint and apply evolutionary optimization."""
+    retriever = solver_retriever(solver)
     evolved_constraints = {}
 
-    for constraint_info in constraints:
+    # highest priority first, the order in which the context is kept within the prompt budget
+    for constraint_info in sorted(constraints, key=lambda c: -c["priority"]):
         keyword = constraint_info["keyword"]
         priority = constraint_info["priority"]
-        print(1)
         docs = retriever.invoke("Python code of " + keyword)
-        print(2)
         if len(docs) >= 2:
-            print(3)
             evolved_code = evolve_constraint_code(
                 keyword, docs, solver, llm, priority
             )
-            print(4)
             evolved_constraints[keyword] = evolved_code
         else:
             if docs:
@@ -120,20 +126,27 @@ def evolutionary_constraint_retriever(constraints, solver="or-tools", llm=None):
 
     return evolved_constraints
 
-def decomposer(problem, llm="gpt-4o"):
-    # LLM with function call
-    if llm.startswith("llama"):
-        llm = ChatOllama(
-            model=llm,
-            temperature=0,
-        )
-    elif llm.startswith("gpt"):
-        llm = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        llm = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError("llm not supported!")
 
+async def aevolutionary_constraint_retriever(constraints, solver="or-tools", llm=None):
+    """Async variant of evolutionary_constraint_retriever: the constraints are retrieved and evolved concurrently."""
+    # loading the vector stores blocks, so it runs in a thread
+    retriever = await asyncio.to_thread(solver_retriever, solver)
+
+    async def evolve(constraint_info):
+        keyword = constraint_info["keyword"]
+        docs = await retriever.ainvoke("Python code of " + keyword)
+        if len(docs) >= 2:
+            return keyword, await aevolve_constraint_code(keyword, docs, solver, llm, constraint_info["priority"])
+        return keyword, docs[0].page_content if docs else None
+
+    evolved_constraints = {}
+    constraints = sorted(constraints, key=lambda c: -c["priority"])
+    for keyword, evolved_code in await asyncio.gather(*[evolve(c) for c in constraints]):
+        if evolved_code is not None:
+            evolved_constraints[keyword] = evolved_code
+    return evolved_constraints
+
+def _decomposer_chain(llm):
     # Prompt
     system = """You will extract the keywords of an assignment problem for me. \n 
     I give you the name of an assignment problem and you produce the keywords according to its constraints.\n 
@@ -150,24 +163,21 @@ def decomposer(problem, llm="gpt-4o"):
         ]
     )
 
-    keyword_extractor = prompt | llm
-    res = keyword_extractor.invoke({"problem": problem}).content.replace("<", "").replace(">", "").split(",")
+    return retrying(prompt | chat_model(llm))
+
+
+def decomposer(problem, llm="gpt-4o"):
+    res = _decomposer_chain(llm).invoke({"problem": problem}).content.replace("<", "").replace(">", "").split(",")
     return res
 
 
-def summarize_document(solver, keyword, context, llm="gpt-4o"):
-    if llm.startswith("llama"):
-        llm = ChatOllama(
-            model=llm,
-            temperature=0,
-        )
-    elif llm.startswith("gpt"):
-        llm = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        llm = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError("llm not supported!")
+async def adecomposer(problem, llm="gpt-4o"):
+    """Async variant of decomposer."""
+    res = await _decomposer_chain(llm).ainvoke({"problem": problem})
+    return res.content.replace("<", "").replace(">", "").split(",")
 
+
+def _summarize_document_chain(llm):
     # Data model
     class summary(BaseModel):
         """Summary for retrieved document."""
@@ -175,7 +185,7 @@ def summarize_document(solver, keyword, context, llm="gpt-4o"):
         code_snippet: str = Field(description="key code snippet to program a specific constraint")
         summary: str = Field(description="textual summary on how to correctly program a specific constraint")
 
-    model = llm.with_structured_output(summary)
+    model = chat_model(llm).with_structured_output(summary)
 
     # Prompt
     prompt = PromptTemplate(
@@ -192,15 +202,20 @@ def summarize_document(solver, keyword, context, llm="gpt-4o"):
     )
 
     # Chain
-    chain = prompt | model
-    result = chain.invoke({"solver": solver, "context": context, "keyword": keyword})
+    return retrying(prompt | model)
+
+
+def summarize_document(solver, keyword, context, llm="gpt-4o"):
+    result = _summarize_document_chain(llm).invoke({"solver": solver, "context": context, "keyword": keyword})
     return result
 
 
-def branched_retriever(problem, solver="or-tools", llm="gpt-4o"):
-    """Retrieve from example codes based on the constraint keywords of the problem."""
-    llm_call = 0
+async def asummarize_document(solver, keyword, context, llm="gpt-4o"):
+    """Async variant of summarize_document."""
+    return await _summarize_document_chain(llm).ainvoke({"solver": solver, "context": context, "keyword": keyword})
 
+
+def _filter_chain(llm):
     prompt = PromptTemplate(
         template="""You are an expert in Python programming and {solver} for assignment problems.\n 
         I will give you several retrieved documents (codes) and their explanations potentially related to {keyword}, and you should assess which context is the most relevant one and with minimal redundant information.\n 
@@ -208,23 +223,24 @@ def branched_retriever(problem, solver="or-tools", llm="gpt-4o"):
         Return the index of the most relevant document and do not return anything else. For example, if you think the second document is the most relevant one, just return 2. Please strictly return integer index following the above instruction. """,
         input_variables=["solver", "contexts", "keyword"],
     )
+    return retrying(prompt | chat_model(llm))
 
-    if llm.startswith("gpt"):
-        llm = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        llm = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError
 
-    chain = prompt | llm
-    keywords = decomposer(problem)
+def _filter_index(idx):
+    try:
+        return int(idx) - 1
+    except:
+        warnings.warn("the return value of the filter process is not correct!", RuntimeWarning)
+        return 0
 
-    if solver == "OR-tools":
-        retriever = context_all()
-    elif solver == "Gurobi":
-        retriever = context_gurobi_codes()
-    else:
-        raise NotImplementedError
+
+def branched_retriever(problem, solver="or-tools", llm="gpt-4o"):
+    """Retrieve from example codes based on the constraint keywords of the problem."""
+    llm_call = 0
+
+    chain = _filter_chain(llm)
+    keywords = decomposer(problem)
+    retriever = solver_retriever(solver)
 
     keyword_context = {}
     keyword_summary = {}
@@ -235,27 +251,24 @@ def branched_retriever(problem, solver="or-tools", llm="gpt-4o"):
         summaries = []
         contexts_input = []
 
-        for doc in docs:
-            summary_context = summarize_document(solver, keyword, doc)
-            llm_call += 1
-            if summary_context.relevance == "yes":
-                contexts.append(doc)
-                summaries.append(summary_context.code_snippet + '\n' + summary_context.summary)
-                contexts_input.append(doc.page_content + '\n' + summary_context.summary)
-
-        contexts = [c.page_content for c in contexts]
-
-        if len(contexts) > 1:
-            filter_context = " \n ====== \n ".join(contexts_input)
-            idx = chain.invoke({"solver": solver, "contexts": filter_context, "keyword": keyword}).content
-            llm_call += 1
-            try:
-                idx = int(idx) - 1
-            except:
+        with call_priority(GRADING_PRIORITY):
+            for doc in docs:
+                summary_context = summarize_document(solver, keyword, doc)
+                llm_call += 1
+                if summary_context.relevance == "yes":
+                    contexts.append(doc)
+                    summaries.append(summary_context.code_snippet + '\n' + summary_context.summary)
+                    contexts_input.append(doc.page_content + '\n' + summary_context.summary)
+
+            contexts = [c.page_content for c in contexts]
+
+            if len(contexts) > 1:
+                filter_context = " \n ====== \n ".join(contexts_input)
+                idx = chain.invoke({"solver": solver, "contexts": filter_context, "keyword": keyword}).content
+                llm_call += 1
+                idx = _filter_index(idx)
+            else:
                 idx = 0
-                warnings.warn("the return value of the filter process is not correct!", RuntimeWarning)
-        else:
-            idx = 0
 
         if len(contexts) != 0:
             keyword_context[keyword] = contexts[idx]
@@ -265,15 +278,45 @@ def branched_retriever(problem, solver="or-tools", llm="gpt-4o"):
     return keyword_context, keyword_summary
 
 
-def self_debug(state: code, input: dict, llm="gpt-4o"):
-    """Call to fix the error of the code based on an LLM when there are syntax error, incomplete program, or other errors."""
-    if llm.startswith("gpt"):
-        model = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        model = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError
+async def abranched_retriever(problem, solver="or-tools", llm="gpt-4o"):
+    """Async variant of branched_retriever: keywords, and the documents of each keyword, are graded concurrently."""
+    chain = _filter_chain(llm)
+    keywords = await adecomposer(problem)
+    retriever = await asyncio.to_thread(solver_retriever, solver)
+
+    async def select(keyword):
+        docs = await retriever.ainvoke("Python code of " + keyword)
+        summary_contexts = await asyncio.gather(*[asummarize_document(solver, keyword, doc) for doc in docs])
+        contexts = []
+        summaries = []
+        contexts_input = []
+        for doc, summary_context in zip(docs, summary_contexts):
+            if summary_context.relevance == "yes":
+                contexts.append(doc.page_content)
+                summaries.append(summary_context.code_snippet + '\n' + summary_context.summary)
+                contexts_input.append(doc.page_content + '\n' + summary_context.summary)
+        if not contexts:
+            return None
+        idx = 0
+        if len(contexts) > 1:
+            filter_context = " \n ====== \n ".join(contexts_input)
+            res = await chain.ainvoke({"solver": solver, "contexts": filter_context, "keyword": keyword})
+            idx = _filter_index(res.content)
+        return contexts[idx], summaries[idx]
+
+    # the grading calls wait behind the generation calls of other problems
+    with call_priority(GRADING_PRIORITY):
+        selections = await asyncio.gather(*[select(keyword) for keyword in keywords])
+    keyword_context = {}
+    keyword_summary = {}
+    for keyword, selected in zip(keywords, selections):
+        if selected is not None:
+            keyword_context[keyword], keyword_summary[keyword] = selected
+    print("============Context filter successful!============")
+    return keyword_context, keyword_summary
+
 
+def _self_debug_chain(llm, stream=False):
     prompt_template_debugger = ChatPromptTemplate.from_messages(
         [
             (
@@ -294,16 +337,32 @@ def self_debug(state: code, input: dict, llm="gpt-4o"):
         ]
     )
 
-    chain = prompt_template_debugger | model.with_structured_output(code)
-    res = chain.invoke(
-        {'solver': input['solver'],
-         'prep_code': state['generation'].imports + "\n" + state['generation'].code,
-         'message': state['messages']})
+    return code_chain(prompt_template_debugger, llm, stream=stream)
+
+
+def _self_debug_input(state, input):
+    return {'solver': input['solver'],
+            'prep_code': state['generation'].imports + "\n" + state['generation'].code,
+            'message': compact_messages(state['messages'])}
+
+
+def self_debug(state: code, input: dict, llm="gpt-4o", stream=False):
+    """Call to fix the error of the code based on an LLM when there are syntax error, incomplete program, or other errors."""
+    res = invoke_code(_self_debug_chain(llm, stream), _self_debug_input(state, input), stream)
     return res
 
 
-def retrieval_augmented_generate(input: dict, context: dict, llm="gpt-4o"):
-    """Call to generate a new program for solving the problem, drawing upon the retrieved code in the context."""
+async def aself_debug(state: code, input: dict, llm="gpt-4o", stream=False):
+    """Async variant of self_debug."""
+    return await ainvoke_code(_self_debug_chain(llm, stream), _self_debug_input(state, input), stream)
+
+
+def _context_text(context, *fields):
+    """The context of a prompt, within the token budget left by the other fields of the prompt."""
+    return compact_context(context, context_budget(*fields))
+
+
+def _generate_chain(llm, stream=False):
     prompt_template_gen = ChatPromptTemplate.from_messages(
         [
             (
@@ -329,25 +388,22 @@ def retrieval_augmented_generate(input: dict, context: dict, llm="gpt-4o"):
         ]
     )
 
-    if llm.startswith("gpt"):
-        model = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        model = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError
+    return code_chain(prompt_template_gen, llm, stream=stream)
 
-    chain = prompt_template_gen | model.with_structured_output(code)
 
-    c = ""
-    for keyword in context.keys():
-        c += "Constraint/Feature: " + keyword + "\nExample code: " + context[keyword] + "===============\n"
-    input['context'] = c
+def retrieval_augmented_generate(input: dict, context: dict, llm="gpt-4o", stream=False):
+    """Call to generate a new program for solving the problem, drawing upon the retrieved code in the context."""
+    input['context'] = _context_text(context, input['problem'], input.get('code_example', ''))
+    return invoke_code(_generate_chain(llm, stream), input, stream)
 
-    return chain.invoke(input)
 
+async def aretrieval_augmented_generate(input: dict, context: dict, llm="gpt-4o", stream=False):
+    """Async variant of retrieval_augmented_generate."""
+    input['context'] = _context_text(context, input['problem'], input.get('code_example', ''))
+    return await ainvoke_code(_generate_chain(llm, stream), input, stream)
 
-def retrieval_augmented_refine(input: dict, context: dict, state: code, llm="gpt-4o"):
-    """Call to refine the current generated code, which is with error, drawing upon the retrieved code in the context."""
+
+def _refine_chain(llm, stream=False):
     prompt_template_ref = ChatPromptTemplate.from_messages(
         [
             (
@@ -370,24 +426,24 @@ def retrieval_augmented_refine(input: dict, context: dict, state: code, llm="gpt
         ]
     )
 
-    if llm.startswith("gpt"):
-        model = ChatOpenAI(model=llm, temperature=0.0, verbose=True)
-    elif llm.startswith("claude"):
-        model = ChatAnthropic(model=llm, temperature=0.0, max_tokens=5000)
-    else:
-        raise NotImplementedError
+    return code_chain(prompt_template_ref, llm, stream=stream)
 
-    chain = prompt_template_ref | model.with_structured_output(code)
 
+def _refine_input(input, context, state):
     input['prep_code'] = state['generation'].imports + "\n" + state['generation'].code
-    input['message'] = state['messages']
+    input['message'] = compact_messages(state['messages'])
+    input['context'] = _context_text(context, input['problem'], input['prep_code'], input['message'])
+    return input
+
+
+def retrieval_augmented_refine(input: dict, context: dict, state: code, llm="gpt-4o", stream=False):
+    """Call to refine the current generated code, which is with error, drawing upon the retrieved code in the context."""
+    return invoke_code(_refine_chain(llm, stream), _refine_input(input, context, state), stream)
 
-    c = ""
-    for keyword in context.keys():
-        c += "Constraint/Feature: " + keyword + "\nExample code: " + context[keyword] + "===============\n"
-    input['context'] = c
 
-    return chain.invoke(input)
+async def aretrieval_augmented_refine(input: dict, context: dict, state: code, llm="gpt-4o", stream=False):
+    """Async variant of retrieval_augmented_refine."""
+    return await ainvoke_code(_refine_chain(llm, stream), _refine_input(input, context, state), stream)
 
 
 class System():
@@ -397,6 +453,9 @@ class System():
         self.llm = llm
         self.max_iteration = 4
         self.retrieval_flag = False
+        self.profile_hint = False
+        self.stream = False
+        self.journal = None
 
         ret = context_all() if input['solver'] == "OR-tools" else context_gurobi_codes()
         self.retriever = create_retriever_tool(ret,
@@ -406,7 +465,7 @@ class System():
         self.context = None
         self.optimum = input['optimum']
 
-    def standard_generator(self):
+    def _standard_chain(self):
         prompt_template_gen = ChatPromptTemplate.from_messages(
             [
                 (
@@ -431,20 +490,24 @@ class System():
             ]
         )
 
-        if self.llm.startswith("gpt"):
-            llm = ChatOpenAI(model=self.llm, temperature=0.0, verbose=True)
-        elif self.llm.startswith("claude"):
-            llm = ChatAnthropic(model=self.llm, temperature=0.0, max_tokens=8000)
-        else:
-            raise NotImplementedError
+        return code_chain(prompt_template_gen, self.llm, max_tokens=8000, stream=self.stream)
 
-        chain = prompt_template_gen | llm.with_structured_output(code)
-        result = chain.invoke(self.input)
-        state = GraphState(error='', messages=[], generation=result, iterations=0)
-        state = code_check(state, self.params, self.optimum)
-        return state
+    def check(self, generate, iterations=0):
+        return check_generation(generate, self.params, self.optimum, self.input.get('code_example'),
+                                self.profile_hint, iterations)
 
-    def agent(self, input, params_dict, state):
+    async def acheck(self, generate, iterations=0):
+        return await acheck_generation(generate, self.params, self.optimum, self.input.get('code_example'),
+                                       self.profile_hint, iterations)
+
+    def standard_generator(self):
+        return self.check(lambda: invoke_code(self._standard_chain(), self.input, self.stream))
+
+    async def astandard_generator(self):
+        """Async variant of standard_generator."""
+        return await self.acheck(lambda: ainvoke_code(self._standard_chain(), self.input, self.stream))
+
+    def _agent_chain(self):
         prompt = PromptTemplate(
             template=""" Your task is to determine how to refine the incorrect Python code, which is produced by another programmer. \n 
             Here is the code: The code is about solving a {problem} based on {solver}, and there is the error information while running the code: \n 
@@ -456,32 +519,45 @@ class System():
 
             Return "1" if you think you should use tool (1), otherwise return "2". Do not return other things or give explanations. """,
             input_variables=["problem", "solver", "message"])
+        return retrying(prompt | chat_model(self.llm))
 
-        if self.llm.startswith("gpt"):
-            llm = ChatOpenAI(model=self.llm, temperature=0.0, verbose=True)
-        elif self.llm.startswith("claude"):
-            llm = ChatAnthropic(model=self.llm, temperature=0.0, max_tokens=5000)
+    def agent(self, input, params_dict, state):
+        res = self._agent_chain().invoke(
+            {"problem": input['problem'], "solver": input['solver'],
+             "message": compact_messages(state["messages"])}).content
+
+        if res == "1":
+            print("======Retrieval_augmented_refine======")
+            return self.check(lambda: retrieval_augmented_refine(input, self.context, state, stream=self.stream))
+        elif res == "2":
+            print("======SELF-DEBUG======")
+            return self.check(lambda: self_debug(state, input, self.llm, self.stream))
         else:
-            raise NotImplementedError
+            raise RuntimeWarning("LLM agent doesn't return the correct value!")
 
-        model = prompt | llm
-        res = model.invoke(
-            {"problem": input['problem'], "solver": input['solver'], "message": state["messages"]}).content
+    async def aagent(self, input, params_dict, state):
+        """Async variant of agent."""
+        res = (await self._agent_chain().ainvoke(
+            {"problem": input['problem'], "solver": input['solver'],
+             "message": compact_messages(state["messages"])})).content
 
         if res == "1":
             print("======Retrieval_augmented_refine======")
-            res_new = retrieval_augmented_refine(input, self.context, state)
+            return await self.acheck(lambda: aretrieval_augmented_refine(input, self.context, state,
+                                                                         stream=self.stream))
         elif res == "2":
             print("======SELF-DEBUG======")
-            res_new = self_debug(state, input, self.llm)
+            return await self.acheck(lambda: aself_debug(state, input, self.llm, self.stream))
         else:
             raise RuntimeWarning("LLM agent doesn't return the correct value!")
 
-        state_new = GraphState(error='', messages=[], generation=res_new, iterations=0)
-        state_new = code_check(state_new, self.params, self.optimum)
-        return state_new
+    def checkpoint(self, iteration, state, no_run_time_error):
+        """Journal the state after a checked candidate, so an interrupted run can resume from it."""
+        if self.journal is not None:
+            self.journal.checkpoint(self.input['problem'], iteration, state, no_run_time_error,
+                                    self.context, current_usage())
 
-    def run(self):
+    def run(self, checkpoint=None):
         """Modified run method with constraint-level evolutionary optimization."""
         iter = 0
         no_run_time_error = False
@@ -498,16 +574,23 @@ class System():
         # else:
         #     llm_obj = self.llm
 
-        constraints = evolutionary_decomposer(self.input['problem'], self.llm)
-        evolved_context = evolutionary_constraint_retriever(
-            constraints, self.input['solver'], self.llm
-        )
+        if checkpoint is not None:
+            # Resume from the state journaled after the last checked candidate
+            iter = checkpoint['iteration']
+            no_run_time_error = checkpoint['no_run_time_error']
+            self.context = checkpoint['context']
+            state = load_state(checkpoint['state'], code)
+        else:
+            constraints = evolutionary_decomposer(self.input['problem'], self.llm)
+            evolved_context = evolutionary_constraint_retriever(
+                constraints, self.input['solver'], self.llm
+            )
 
-        # Gọi function retrieval_augmented_generate chứ không phải self.retrieval_augmented_generate
-        res = retrieval_augmented_generate(self.input, evolved_context, self.llm)
-        state = GraphState(error='', messages=[], generation=res, iterations=0)
-        state = code_check(state, self.params, self.optimum)
-        print(state)
+            # Gọi function retrieval_augmented_generate chứ không phải self.retrieval_augmented_generate
+            state = self.check(lambda: retrieval_augmented_generate(self.input, evolved_context, self.llm,
+                                                                    self.stream))
+            print(state)
+            self.checkpoint(iter, state, no_run_time_error)
 
         if state['error'] == 'no':
             no_run_time_error = True
@@ -529,15 +612,17 @@ class System():
                             or "You did not finish the function" in message[0][1]
                             or "You solution returns nothing or 0" in message[0][1]):
                         no_run_time_error = True
-                if self.context is None:
-                    self.context, summary = branched_retriever(self.input['problem'], self.input['solver'], self.llm)
-                    print(self.context)
-                    res = retrieval_augmented_generate(self.input, self.context, self.llm)
-                    state = GraphState(error='', messages=[], generation=res, iterations=iter)
-                    state = code_check(state, self.params, self.optimum)
-                else:
-                    state = self.agent(self.input, self.params, state)
+                # the calls of problems further along are served first
+                with call_priority(GENERATION_PRIORITY + iter):
+                    if self.context is None:
+                        self.context, summary = branched_retriever(self.input['problem'], self.input['solver'], self.llm)
+                        print(self.context)
+                        state = self.check(lambda: retrieval_augmented_generate(self.input, self.context, self.llm,
+                                                                                self.stream), iter)
+                    else:
+                        state = self.agent(self.input, self.params, state)
                 print(state)
+                self.checkpoint(iter, state, no_run_time_error)
             else:
                 no_run_time_error = True
                 accu_solution = True
@@ -546,3 +631,55 @@ class System():
                 return no_run_time_error, accu_solution
         return no_run_time_error, accu_solution
 
+    async def arun(self, checkpoint=None):
+        """
+        Async variant of run: the LLM calls and retrievals are awaited, independent ones concurrently,
+        and the candidates are checked in asyncio subprocesses, so other problems progress meanwhile.
+        """
+        iter = 0
+        no_run_time_error = False
+
+        if checkpoint is not None:
+            # Resume from the state journaled after the last checked candidate
+            iter = checkpoint['iteration']
+            no_run_time_error = checkpoint['no_run_time_error']
+            self.context = checkpoint['context']
+            state = load_state(checkpoint['state'], code)
+        else:
+            constraints = await aevolutionary_decomposer(self.input['problem'], self.llm)
+            evolved_context = await aevolutionary_constraint_retriever(constraints, self.input['solver'], self.llm)
+            state = await self.acheck(lambda: aretrieval_augmented_generate(self.input, evolved_context, self.llm,
+                                                                            self.stream))
+            print(state)
+            self.checkpoint(iter, state, no_run_time_error)
+
+        if state['error'] == 'no':
+            await asyncio.to_thread(write_code_to_file, self.input['problem'], state['generation'].imports,
+                                    state['generation'].code, self.llm)
+            return True, True
+
+        while iter < self.max_iteration:
+            iter += 1
+            if state['error'] == 'no':
+                await asyncio.to_thread(write_code_to_file, self.input['problem'], state['generation'].imports,
+                                        state['generation'].code, self.llm)
+                return True, True
+            message = state['messages']
+            if len(message[0]) > 1:
+                if ("The obj. is far from the optimum" in message[0][1]
+                        or "You did not finish the function" in message[0][1]
+                        or "You solution returns nothing or 0" in message[0][1]):
+                    no_run_time_error = True
+            # the calls of problems further along are served first
+            with call_priority(GENERATION_PRIORITY + iter):
+                if self.context is None:
+                    self.context, summary = await abranched_retriever(self.input['problem'], self.input['solver'],
+                                                                      self.llm)
+                    print(self.context)
+                    state = await self.acheck(lambda: aretrieval_augmented_generate(self.input, self.context,
+                                                                                    self.llm, self.stream), iter)
+                else:
+                    state = await self.aagent(self.input, self.params, state)
+            print(state)
+            self.checkpoint(iter, state, no_run_time_error)
+        return no_run_time_error, False
@@ -0,0 +1,353 @@
+import argparse
+import json
+import os
+import random
+import sys
+
+from generator import load_families, make_problem
+from instances import load_instance, read_meta
+from portfolio import objective, solve_portfolio
+from route_evaluator import RouteEvaluator
+from routing_toolkit import SEARCH_PROFILES
+from sandbox import run_batch
+
+SOLVER_DIRS = ['./gene_codes', './data/Gurobi']
+INSTANCE_DIR = './data/generated'
+# Profile fields copied into each benchmark row.
+PROFILE_FIELDS = ['build_time', 'solve_time', 'total_time', 'peak_memory_mb', 'callback_calls', 'branches',
+                  'solutions']
+# Seconds of solve at which the quality curves are read, up to the time limit of each run.
+CHECKPOINTS = [0.1, 0.5, 1, 2, 5, 10, 30, 60]
+
+
+def load_problem(source, family, n, seed, families, reference_time_limit, instance_dir=INSTANCE_DIR):
+    """
+    The generated instance of a family and its meta (reference objective, planted routes), generated
+    on first use and then reused.
+    """
+    path = os.path.join(instance_dir, f"{source}-{family}-{n}-{seed}.inst")
+    if not os.path.exists(path):
+        make_problem(family, n, seed, reference_time_limit, path, families)
+    return load_instance(path), read_meta(path)['meta']
+
+
+def run_solver(spec, params, optimal, time_limit, profile=None, workers=None, initial_routes=None):
+    """
+    Run one saved solver on an instance with its time limit, and search profile if given, overridden.
+
+    With initial_routes, the solver starts from these routes (its initial_routes option); the row
+    has the routes of the solution found, under "routes", for a warm start of a later run.
+
+    With workers, the solver runs as a portfolio of that many processes (see portfolio.solve_portfolio):
+    the row has the objective and profile of the best worker, with the branches and the incumbents
+    of all of them.
+    """
+    with open(spec['file'], 'r') as f:
+        code = f.read()
+    if initial_routes is not None:
+        # the option comes after the params in the signature of the solvers
+        params = dict(params, initial_routes=initial_routes)
+    if workers:
+        result = solve_portfolio(code, params, time_limit, workers)
+        runs = result['runs']
+        verdict = next((run for run in runs if result['obj'] is not None and objective(run) == result['obj']), runs[0])
+        branches = [(run.get('profile') or {}).get('branches') for run in runs]
+        verdict['profile'] = dict(verdict.get('profile') or {}, incumbents=result['incumbents'],
+                                  branches=sum(b for b in branches if b) if any(branches) else None)
+    else:
+        limits = {'time_limit': time_limit, 'profile': profile}
+        verdict = run_batch([code], params, timeout=2 * time_limit + 60, limits=limits)[0]
+    row = {'status': verdict['status'], 'obj': None, 'gap': None}
+    if verdict['status'] == 'ok':
+        try:
+            obj = float(verdict['obj'])
+        except ValueError:
+            obj = -1
+        if obj < 0:
+            row['status'] = 'no_solution'
+        else:
+            row['obj'] = obj
+            row['gap'] = round((obj - optimal) / optimal, 4) if optimal else None
+    else:
+        row['error'] = verdict['error'].splitlines()[0]
+    for field in PROFILE_FIELDS:
+        row[field] = (verdict.get('profile') or {}).get(field)
+    row['branches_per_second'] = throughput(row['branches'], row['solve_time'])
+    row['incumbents'] = (verdict.get('profile') or {}).get('incumbents') or []
+    row['routes'] = (verdict.get('profile') or {}).get('routes')
+    return row
+
+
+def route_violations(row, params):
+    """
+    The constraints the routes of a run's solution violate (see RouteEvaluator.check), or None when
+    the solver reported no routes; routes that do not cost the objective the solver returned are a
+    violation too.
+    """
+    if not row.get('routes'):
+        return None
+    evaluator = RouteEvaluator.from_params(params)
+    violations = evaluator.check(row['routes'])
+    cost = evaluator.evaluate([row['routes']])['objective'][0]
+    if row['obj'] is not None and cost != row['obj']:
+        violations.append(f"the routes cost {cost}, the solver returned {row['obj']:g}")
+    return violations
+
+
+def new_orders(routes, fraction, seed=0):
+    """
+    The routes of a solution without a random fraction of their customers, as a previous solution
+    that misses the orders placed since: the warm start of a re-optimization.
+    """
+    rng = random.Random(seed)
+    return [route[:1] + [node for node in route[1:-1] if rng.random() >= fraction] + route[-1:]
+            for route in routes]
+
+
+def time_to_reach(row, obj):
+    """
+    Seconds a run took to find a solution at least as good as obj, model building included (where a
+    warm start prepares its routes), or None if it did not.
+    """
+    if obj is None or row['build_time'] is None:
+        return None
+    found = next((at for at, value in row['incumbents'] if value <= obj), None)
+    return round(row['build_time'] + found, 4) if found is not None else None
+
+
+def warm_start_savings(cold, warm):
+    """
+    Seconds a warm start saved: the time the cold run took to find its best solution, less the time
+    the warm run took to find one as good, or None when either has none.
+    """
+    reached = time_to_reach(warm, cold['obj'])
+    if reached is None:
+        return None
+    return round(time_to_reach(cold, cold['obj']) - reached, 4)
+
+
+def throughput(branches, solve_time):
+    """Branches the search explored per second of solve, or None for the solvers that do not report them."""
+    if branches is None or not solve_time:
+        return None
+    return round(branches / solve_time, 1)
+
+
+def quality_curve(row, checkpoints=CHECKPOINTS):
+    """
+    The gap of the best solution a run had found at each checkpoint within its time limit.
+
+    Returns:
+        {seconds: gap, or None before the first solution}
+    """
+    curve = {}
+    for seconds in checkpoints:
+        if seconds > row['time_limit']:
+            break
+        found = [objective for at, objective in row['incumbents'] if at <= seconds]
+        curve[seconds] = (round((min(found) - row['optimal']) / row['optimal'], 4)
+                          if found and row['optimal'] else None)
+    return curve
+
+
+def run_benchmark(dirs, sizes, time_limits, seeds, solvers=None, reference_time_limit=0, instance_dir=INSTANCE_DIR,
+                  profiles=None, workers=None, warm_start=None):
+    """
+    Run every saved solver over a grid of generated instance sizes and time limits.
+
+    Args:
+        dirs: directories of solvers (gene_codes, data/Gurobi)
+        sizes: numbers of nodes of the generated instances
+        time_limits: time limits in seconds, overriding the limit each solver sets itself
+        seeds: seeds of the generated instances
+        solvers: only run the solvers with these keys (family abbreviations or file names)
+        reference_time_limit: seconds of the reference solve when an instance is generated,
+            0 to use the planted objective of the generator
+        profiles: names of routing_toolkit.SEARCH_PROFILES to run each routing solver with, instead
+            of its own search
+        workers: numbers of processes to run each solver as a portfolio with, instead of profiles
+        warm_start: fractions of new orders: each run of a solver with the initial_routes option is
+            followed by a run that starts from its solution without this fraction of the customers
+            (see new_orders), or from the planted solution when it found none; the row of the warm
+            start has the warm_start fraction and the time_saved
+
+    Returns:
+        a list of rows: source, solver, size, seed, time_limit, search profile, workers, warm_start, status, obj,
+        optimal, gap, the profile fields, the incumbents of the search and the violations of the routes
+        of its solution (see route_violations)
+    """
+    rows = []
+    names = [os.path.basename(os.path.normpath(dir)) for dir in dirs]
+    for dir, source in zip(dirs, names):
+        # directories of the same name (e.g. gene_codes of two checkouts) are told apart by their path
+        if names.count(source) > 1:
+            source = os.path.normpath(dir)
+        families = load_families(dir)
+        for family, spec in families.items():
+            if solvers and family not in solvers:
+                continue
+            for n in sizes:
+                for seed in seeds:
+                    params, meta = load_problem(source, family, n, seed, families, reference_time_limit,
+                                                instance_dir)
+                    optimal = meta['optimal']
+                    for time_limit in time_limits:
+                        runs = [(None, w) for w in workers] if workers else [(p, None) for p in profiles or [None]]
+                        for profile, count in runs:
+                            row = {'source': source, 'solver': family, 'size': n, 'seed': seed,
+                                   'time_limit': time_limit, 'profile': profile, 'workers': count,
+                                   'warm_start': None, 'optimal': optimal}
+                            row.update(run_solver(spec, params, optimal, time_limit, profile, count))
+                            row['violations'] = route_violations(row, params)
+                            cold = row
+                            rows.append(_logged(row))
+                            # without a solution, the previous one is the planted solution of the generator
+                            previous = cold['routes'] or meta.get('planted_routes')
+                            if not previous or 'initial_routes' not in spec.get('options', []):
+                                continue
+                            for fraction in warm_start or []:
+                                row = dict(cold, warm_start=fraction)
+                                row.update(run_solver(spec, params, optimal, time_limit, profile, count,
+                                                      new_orders(previous, fraction, seed)))
+                                row['violations'] = route_violations(row, params)
+                                row['time_saved'] = warm_start_savings(cold, row)
+                                rows.append(_logged(row))
+    return rows
+
+
+def _logged(row):
+    """The row without the routes of its solution, printed."""
+    row = {k: v for k, v in row.items() if k != 'routes'}
+    print(json.dumps({k: v for k, v in row.items() if k != 'incumbents'}))
+    return row
+
+
+def row_key(row):
+    return (row['source'], row['solver'], row['size'], row['seed'], row['time_limit'], row.get('profile'),
+            row.get('workers'), row.get('warm_start'))
+
+
+def compare(rows, baseline, gap_tolerance=0.01, time_tolerance=0.5):
+    """
+    Regressions of rows against a baseline run of the same grid.
+
+    A row regresses when it no longer finds a solution, when the routes of its solution violate the
+    constraints, when its gap grows by more than gap_tolerance, or when its build time grows by more
+    than time_tolerance (relative, and at least 0.1 seconds). The build time is compared as the solve
+    time is bounded by the time limit.
+
+    Returns:
+        a list of (row, reason)
+    """
+    previous = {row_key(row): row for row in baseline}
+    regressions = []
+    for row in rows:
+        old = previous.get(row_key(row))
+        if old is None:
+            continue
+        if old['status'] == 'ok' and row['status'] != 'ok':
+            regressions.append((row, f"{old['status']} -> {row['status']}"))
+        elif row.get('violations') and not old.get('violations'):
+            regressions.append((row, f"the routes violate the constraints: {'; '.join(row['violations'])}"))
+        elif row['gap'] is not None and old['gap'] is not None and row['gap'] > old['gap'] + gap_tolerance:
+            regressions.append((row, f"gap {old['gap']:.2%} -> {row['gap']:.2%}"))
+        elif (row['build_time'] is not None and old['build_time'] is not None
+              and row['build_time'] > max(old['build_time'] * (1 + time_tolerance), old['build_time'] + 0.1)):
+            regressions.append((row, f"build time {old['build_time']:.2f}s -> {row['build_time']:.2f}s"))
+    return regressions
+
+
+def search_label(row):
+    label = f"portfolio x{row['workers']}" if row.get('workers') else row.get('profile') or '-'
+    if row.get('warm_start') is not None:
+        label += f", warm start ({row['warm_start']:.0%} new)"
+    return label
+
+
+def markdown_report(rows):
+    lines = ['| source | solver | size | seed | time limit | search | status | objective | gap | routes | build (s) '
+             '| solve (s) | memory (MB) | callbacks | branches/s |',
+             '|---|---|---|---|---|---|---|---|---|---|---|---|---|---|---|']
+    for row in rows:
+        gap = f"{row['gap']:.2%}" if row['gap'] is not None else '-'
+        obj = f"{row['obj']:g}" if row['obj'] is not None else '-'
+        violations = row.get('violations')
+        routes = '-' if violations is None else f"{len(violations)} violations" if violations else 'ok'
+        lines.append(f"| {row['source']} | {row['solver']} | {row['size']} | {row['seed']} | {row['time_limit']} "
+                     f"| {search_label(row)} | {row['status']} | {obj} | {gap} | {routes} | {row['build_time']} "
+                     f"| {row['solve_time']} | {row['peak_memory_mb']} | {row.get('callback_calls', '-')} "
+                     f"| {row.get('branches_per_second') or '-'} |")
+
+    # the quality reached over time, for the runs that traced their incumbents
+    traced = [row for row in rows if row.get('incumbents')]
+    if traced:
+        checkpoints = [c for c in CHECKPOINTS if c <= max(row['time_limit'] for row in traced)]
+        lines += ['', '## Gap over time', '',
+                  '| source | solver | size | seed | search | ' + ' | '.join(f"{c}s" for c in checkpoints) + ' |',
+                  '|---|---|---|---|---|' + '---|' * len(checkpoints)]
+        for row in traced:
+            curve = quality_curve(row, checkpoints)
+            cells = [f"{curve[c]:.2%}" if curve.get(c) is not None else '-' for c in checkpoints]
+            lines.append(f"| {row['source']} | {row['solver']} | {row['size']} | {row['seed']} "
+                         f"| {search_label(row)} | " + ' | '.join(cells) + ' |')
+
+    # the warm starts against the cold runs they started from
+    cold = {row_key(row): row for row in rows if row.get('warm_start') is None}
+    warm = [row for row in rows if row.get('warm_start') is not None]
+    if warm:
+        lines += ['', '## Warm starts', '',
+                  '| source | solver | size | seed | search | new orders | cold objective | cold best at (s) '
+                  '| warm objective | warm reaches cold at (s) | time saved (s) |',
+                  '|---|---|---|---|---|---|---|---|---|---|---|']
+        for row in warm:
+            start = cold[row_key(dict(row, warm_start=None))]
+            cells = [start['obj'], time_to_reach(start, start['obj']), row['obj'], time_to_reach(row, start['obj']),
+                     row['time_saved']]
+            lines.append(f"| {row['source']} | {row['solver']} | {row['size']} | {row['seed']} "
+                         f"| {search_label(start)} | {row['warm_start']:.0%} | "
+                         + ' | '.join(f"{cell:g}" if cell is not None else '-' for cell in cells) + ' |')
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the saved solvers on generated instances')
+    parser.add_argument('--dirs', type=str, nargs='+', default=SOLVER_DIRS, help='directories of solvers')
+    parser.add_argument('--solvers', type=str, nargs='*', help='family abbreviations or file names, all by default')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--time_limits', type=int, nargs='+', default=[10])
+    parser.add_argument('--profiles', type=str, nargs='*', choices=sorted(SEARCH_PROFILES),
+                        help='search profiles to run the routing solvers with, their own search by default')
+    parser.add_argument('--workers', type=int, nargs='*',
+                        help='run the solvers as portfolios of these numbers of processes, instead of profiles')
+    parser.add_argument('--warm_start', type=float, nargs='*',
+                        help='fractions of new orders to re-solve each instance with, from the routes of its solution')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--reference_time_limit', type=int, default=0,
+                        help='seconds of the reference solve of new instances, 0 for the planted objective')
+    parser.add_argument('--instance_dir', type=str, default=INSTANCE_DIR)
+    parser.add_argument('--output', type=str, default='./results/benchmark.json')
+    parser.add_argument('--baseline', type=str, help='a previous benchmark.json to compare with')
+    parser.add_argument('--gap_tolerance', type=float, default=0.01)
+    parser.add_argument('--time_tolerance', type=float, default=0.5)
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.dirs, args.sizes, args.time_limits, args.seeds, args.solvers,
+                         args.reference_time_limit, args.instance_dir, args.profiles, args.workers, args.warm_start)
+    directory = os.path.dirname(args.output)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(args.output, 'w') as f:
+        json.dump(rows, f, indent=1)
+    with open(os.path.splitext(args.output)[0] + '.md', 'w') as f:
+        f.write(markdown_report(rows) + '\n')
+    print(markdown_report(rows))
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(rows, baseline, args.gap_tolerance, args.time_tolerance)
+        for row, reason in regressions:
+            print(f"REGRESSION {row['source']}/{row['solver']} size={row['size']} seed={row['seed']} "
+                  f"time_limit={row['time_limit']}: {reason}")
+        if regressions:
+            sys.exit(1)
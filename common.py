@@ -7,6 +7,13 @@ import tempfile
 import json
 import re
 import ast
+import asyncio
+from preflight import StaticCheckError, check_imports, preflight_check, template_params
+from instances import downsample_params
+from sandbox import parse_objective, run_batch
+from route_evaluator import RouteEvaluator
+from dataset import LazyDataset
+from tracking import timed_sandbox
 
 class UnusedParameterError(Exception):
     def __init__(self, message):
@@ -87,6 +94,17 @@ class commented_code(BaseModel):
     code: str = Field(description="Code block with comments")
 
 
+# Time limit of the smoke run on the down-sampled instance, in seconds
+SMOKE_TIMEOUT = 10
+
+# Violations of the routes of a solution that the problem statement implies. Visits of a depot within a route and
+# the schedule of the depot resources follow from how the routing toolkit models a problem, so they are not checked.
+STATED_VIOLATIONS = ('missing', 'repeated', 'load', 'distance', 'late', 'duration', 'pairs')
+# The directory of the repository, on the import path of the harness subprocess so that the code can import
+# its modules, e.g. routing_toolkit, from its first line.
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
 class GraphState(TypedDict):
     """
     Represents the state of our graph.
@@ -96,14 +114,39 @@ class GraphState(TypedDict):
         messages : With user question, error messages, reasoning
         generation : Code solution
         iterations : Number of tries
+        profile : Model-building vs. solving time, memory and callback counts of the last execution
     """
 
     error: str
     messages: List
     generation: str
     iterations: int
+    profile: dict
+
+
+def profile_hint(profile):
+    """A note for the refine prompts when the profile shows the time is not spent in the solver, else None."""
+    if not profile:
+        return None
+    notes = []
+    if profile["build_time"] > max(1.0, profile["solve_time"]):
+        notes.append(f"building the model took {profile['build_time']:.2f}s while the solver ran for "
+                     f"{profile['solve_time']:.2f}s, so model building is the bottleneck: avoid nested Python loops "
+                     f"over all arcs and create variables and constraints only where they are needed")
+    if profile["callback_calls"] > 100000:
+        notes.append(f"the solver called Python callbacks {profile['callback_calls']} times: precompute the "
+                     f"data indexed by node and keep the callbacks as simple lookups")
+    if not notes:
+        return None
+    return "Profiling of your solution: " + "; ".join(notes) + "."
+
+def write_harness(code_string, params):
+    """
+    Write the code with a main block running 'solve' on the params to a temporary script.
 
-def write_and_run(code_string, params):
+    Returns:
+        (script path, params path, whether the params path is a temporary file)
+    """
     param_names = params.keys()
     param_assignments = "\n".join([f"    {name} = params['{name}']" for name in param_names])
     param_list = ", ".join(param_names)
@@ -113,40 +156,70 @@ if __name__ == "__main__":
     import sys
     import json
     import traceback
-    with open(sys.argv[1], 'r') as f:
-        params = json.load(f)
+    from sandbox import Profiler
+    if sys.argv[1].endswith('.json'):
+        with open(sys.argv[1], 'r') as f:
+            params = json.load(f)
+    else:
+        from instances import load_instance
+        params = load_instance(sys.argv[1])
 
 {param_assignments}
+    _profiler = Profiler()
     try:
-        result = solve({param_list})
+        result = _profiler.run(solve, {param_list})
         print('Code executed successfully, and the obj = '+ str(result))
     except Exception as e:
         print('Error:', e)
         print('Traceback:', traceback.format_exc())
+    print('Profile: ' + json.dumps(_profiler.report()))
     """
     code_string = code_string + main_code
     with tempfile.NamedTemporaryFile(delete=False, suffix='.py', mode='w') as temp_script:
         temp_script.write(code_string)
         temp_script_path = temp_script.name
 
-    # Create a temporary file to hold the JSON parameters
+    # Params loaded from an instance are read by the subprocess from the same files,
+    # otherwise a temporary file holds the JSON parameters
+    instance_path = getattr(params, 'path', None)
+    if instance_path is not None:
+        return temp_script_path, os.path.abspath(instance_path), False
     with tempfile.NamedTemporaryFile(delete=False, suffix='.json', mode='w') as temp_params:
         json.dump(params, temp_params)
-        temp_params_path = temp_params.name
+    return temp_script_path, temp_params.name, True
+
+
+def harness_env():
+    """The environment of the harness subprocess: the current one, with REPO_DIR first on its import path."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([REPO_DIR] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    return env
+
+
+def read_output(stdout, profile=None):
+    """The objective printed by the harness (-1 if missing), or the whole output when the code failed."""
+    match = re.search(r'^Profile: (.*)$', stdout, re.MULTILINE)
+    if profile is not None and match is not None:
+        profile.update(json.loads(match.group(1)))
+    if 'Code executed successfully' in stdout:
+        pattern = r'obj = \s*([\d.]+)'
+        match = re.search(pattern, stdout)
+        if match is not None:
+            return match.group(1)
+        else:
+            return -1
+    else:
+        return stdout
 
+
+def write_and_run(code_string, params, timeout=60, profile=None):
+    """Run the code in a subprocess; the execution profile is written into the 'profile' dict when given."""
+    temp_script_path, temp_params_path, temp_params = write_harness(code_string, params)
     try:
         # Run the temporary script as a subprocess
         result = subprocess.run(['python', temp_script_path, temp_params_path], capture_output=True, text=True,
-                                check=True, timeout=60)
-        if 'Code executed successfully' in result.stdout:
-            pattern = r'obj = \s*([\d.]+)'
-            match = re.search(pattern, result.stdout)
-            if match is not None:
-                return match.group(1)
-            else:
-                return -1
-        else:
-            return result.stdout
+                                check=True, timeout=timeout, env=harness_env())
+        return read_output(result.stdout, profile)
     except subprocess.TimeoutExpired as e:
         print(f"Subprocess timed out after {e.timeout} seconds")
         return e
@@ -156,22 +229,46 @@ if __name__ == "__main__":
     finally:
         # Optionally, delete the temporary script and parameters file if you don't need them anymore
         os.remove(temp_script_path)
-        os.remove(temp_params_path)
+        if temp_params:
+            os.remove(temp_params_path)
 
 
-def code_check(state: GraphState, param_dict: dict, optimal:float):
+async def awrite_and_run(code_string, params, timeout=60, profile=None):
+    """Async variant of write_and_run, running the subprocess without blocking the event loop."""
+    temp_script_path, temp_params_path, temp_params = write_harness(code_string, params)
+    cmd = ['python', temp_script_path, temp_params_path]
+    try:
+        process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE, env=harness_env())
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            print(f"Subprocess timed out after {timeout} seconds")
+            return subprocess.TimeoutExpired(cmd, timeout)
+        if process.returncode != 0:
+            print(f"Subprocess failed with exit code {process.returncode}")
+            return subprocess.CalledProcessError(process.returncode, cmd, stdout.decode(), stderr.decode())
+        return read_output(stdout.decode(), profile)
+    finally:
+        os.remove(temp_script_path)
+        if temp_params:
+            os.remove(temp_params_path)
+
+
+def precheck(state: GraphState, param_dict: dict, template: str = None):
     """
-    Check code
+    Checks that run before the full-size execution of the code
 
     Args:
         state (dict): The current graph state
+        template (str): The code template of the problem, used to check the signature of 'solve'
 
     Returns:
-        state (dict): New key added to state, error
+        state (dict): The failed state, or None if all checks pass
     """
 
-    print("---CHECKING CODE---")
-
     # State
     messages = state["messages"]
     code_solution = state["generation"]
@@ -181,9 +278,9 @@ def code_check(state: GraphState, param_dict: dict, optimal:float):
     imports = code_solution.imports
     code = code_solution.code
 
-    # Check imports
+    # Check imports, resolving the modules without executing them in this process
     try:
-        exec(imports)
+        check_imports(imports)
     except Exception as e:
         print("---CODE IMPORT CHECK: FAILED---")
         error_message = [("user", f"Your solution failed the import test: {e}")]
@@ -218,25 +315,65 @@ def code_check(state: GraphState, param_dict: dict, optimal:float):
             }
         else:
             pass
-    # Check execution
+
+    # Static analysis, so that broken candidates never reach the solver subprocess
     try:
-        sol = write_and_run(imports + "\n" + code, param_dict)
-        print(imports + "\n" + code)
-        print(sol)
-        if type(sol) != float:
-            if type(sol) == str:
-                if 'Error' in sol:
-                    error_message = [("user", f"The solution failed the code execution test: {sol}" )]
-                    print("---CODE BLOCK CHECK: FAILED---")
-                    messages += error_message
-                    return {
-                        "generation": code_solution,
-                        "messages": messages,
-                        "iterations": iterations,
-                        "error": "yes",
-                    }
-            else:
-                error_message = [("user", f"The generated code cannot run or time out." )]
+        expected_params = template_params(template) if template else None
+        if expected_params is None:
+            expected_params = list(param_dict.keys())
+        preflight_check(imports + "\n" + code, expected_params)
+    except StaticCheckError as e:
+        print("---STATIC CHECK: FAILED---")
+        error_message = [("user", f"Your solution failed the static check: {e.message}")]
+        messages += error_message
+        return {
+            "generation": code_solution,
+            "messages": messages,
+            "iterations": iterations,
+            "error": "yes",
+        }
+
+    # Smoke run on a small instance, so that candidates failing on any input skip the full-size run
+    smoke_params = downsample_params(param_dict)
+    if smoke_params is not None:
+        smoke_sol = write_and_run(imports + "\n" + code, smoke_params, timeout=SMOKE_TIMEOUT)
+        if isinstance(smoke_sol, subprocess.CalledProcessError):
+            smoke_sol = smoke_sol.stderr
+        if type(smoke_sol) == str and 'Error' in smoke_sol:
+            print("---SMOKE RUN CHECK: FAILED---")
+            error_message = [("user", f"The solution failed the code execution test on a small instance: {smoke_sol}")]
+            messages += error_message
+            return {
+                "generation": code_solution,
+                "messages": messages,
+                "iterations": iterations,
+                "error": "yes",
+            }
+
+    return None
+
+
+def check_result(state: GraphState, sol, optimal: float):
+    """
+    Check the result of executing the code on the full-size instance
+
+    Args:
+        state (dict): The current graph state
+        sol: The result returned by write_and_run
+
+    Returns:
+        state (dict): New key added to state, error
+    """
+
+    # State
+    messages = state["messages"]
+    code_solution = state["generation"]
+    iterations = state["iterations"]
+
+    if type(sol) != float:
+        if type(sol) == str:
+            if 'Error' in sol:
+                error_message = [("user", f"The solution failed the code execution test: {sol}" )]
                 print("---CODE BLOCK CHECK: FAILED---")
                 messages += error_message
                 return {
@@ -245,16 +382,16 @@ def code_check(state: GraphState, param_dict: dict, optimal:float):
                     "iterations": iterations,
                     "error": "yes",
                 }
-    except Exception as e:
-        print("---CODE BLOCK CHECK: FAILED---")
-        error_message = [("user", f"The solution failed the code execution test: {e}, and the stack trace is {traceback.format_exc()}" )]
-        messages += error_message
-        return {
-            "generation": code_solution,
-            "messages": messages,
-            "iterations": iterations,
-            "error": "yes",
-        }
+        else:
+            error_message = [("user", f"The generated code cannot run or time out." )]
+            print("---CODE BLOCK CHECK: FAILED---")
+            messages += error_message
+            return {
+                "generation": code_solution,
+                "messages": messages,
+                "iterations": iterations,
+                "error": "yes",
+            }
     if sol is None or float(sol) == 0.:
         print("---CODE BLOCK CHECK: NOTHING RETURN---")
         error_message = [("user", f"You solution returns nothing or 0. The program may be incomplete or your solution does not work for the task." )]
@@ -285,6 +422,7 @@ def code_check(state: GraphState, param_dict: dict, optimal:float):
             "messages": messages,
             "iterations": iterations,
             "error": "yes",
+            "solution": sol
         }
 
     # No errors
@@ -297,7 +435,164 @@ def code_check(state: GraphState, param_dict: dict, optimal:float):
         "solution": sol
     }
 
-def get_dataset(dir='./problems'):
+
+@timed_sandbox()
+def code_check(state: GraphState, param_dict: dict, optimal:float, template: str = None, hint: bool = False):
+    """
+    Check code
+
+    Args:
+        state (dict): The current graph state
+        template (str): The code template of the problem, used to check the signature of 'solve'
+        hint (bool): Tell the LLM when the profile shows that the time is not spent in the solver
+
+    Returns:
+        state (dict): New key added to state, error
+    """
+
+    print("---CHECKING CODE---")
+
+    failed = precheck(state, param_dict, template)
+    if failed is not None:
+        return failed
+
+    # State
+    messages = state["messages"]
+    code_solution = state["generation"]
+    iterations = state["iterations"]
+
+    # Get solution components
+    imports = code_solution.imports
+    code = code_solution.code
+
+    # Check execution
+    profile = {}
+    try:
+        sol = write_and_run(imports + "\n" + code, param_dict, profile=profile)
+        print(imports + "\n" + code)
+        print(sol)
+        print(f"---PROFILE: {profile}---")
+    except Exception as e:
+        print("---CODE BLOCK CHECK: FAILED---")
+        error_message = [("user", f"The solution failed the code execution test: {e}, and the stack trace is {traceback.format_exc()}" )]
+        messages += error_message
+        return {
+            "generation": code_solution,
+            "messages": messages,
+            "iterations": iterations,
+            "error": "yes",
+        }
+    return add_profile(check_routes(check_result(state, sol, optimal), profile, param_dict), profile, hint)
+
+
+async def acode_check(state: GraphState, param_dict: dict, optimal: float, template: str = None, hint: bool = False):
+    """
+    Async variant of code_check: the checks before execution run in a thread, and the code in an asyncio subprocess
+
+    Returns:
+        state (dict): New key added to state, error
+    """
+
+    print("---CHECKING CODE---")
+
+    # a decorator would only time the creation of the coroutine
+    with timed_sandbox():
+        failed = await asyncio.to_thread(precheck, state, param_dict, template)
+        if failed is not None:
+            return failed
+
+        code_solution = state["generation"]
+        profile = {}
+        try:
+            sol = await awrite_and_run(code_solution.imports + "\n" + code_solution.code, param_dict, profile=profile)
+            print(sol)
+            print(f"---PROFILE: {profile}---")
+        except Exception as e:
+            print("---CODE BLOCK CHECK: FAILED---")
+            state["messages"] += [("user", f"The solution failed the code execution test: {e}, and the stack trace is {traceback.format_exc()}")]
+            return {
+                "generation": code_solution,
+                "messages": state["messages"],
+                "iterations": state["iterations"],
+                "error": "yes",
+            }
+        return add_profile(check_routes(check_result(state, sol, optimal), profile, param_dict), profile, hint)
+
+
+def check_routes(state: GraphState, profile: dict, param_dict: dict):
+    """
+    Check the routes of a solution that passed the objective check against the constraints of the problem.
+
+    The routes are those of the last routing solve of the code (see sandbox.Profiler), checked for the
+    STATED_VIOLATIONS only; problems whose params route_evaluator cannot read (e.g. without a distance or
+    time matrix) are not checked.
+    """
+    routes = (profile or {}).get("routes")
+    if state["error"] == "yes" or not routes:
+        return state
+    try:
+        violations = RouteEvaluator.from_params(param_dict).check(routes, STATED_VIOLATIONS)
+    except (KeyError, ValueError, TypeError, IndexError):
+        return state
+    if violations:
+        print("---CODE BLOCK CHECK: ROUTES VIOLATE THE CONSTRAINTS---")
+        state["error"] = "yes"
+        state["messages"] += [("user", "The routes of your solution violate the constraints of the problem: "
+                                       + "; ".join(violations) + ". You may have modeled a constraint wrongly.")]
+    return state
+
+
+def add_profile(state: GraphState, profile: dict, hint: bool = False):
+    """Store the execution profile in the state, and explain it to the LLM if the code has to be refined."""
+    state["profile"] = profile
+    note = profile_hint(profile) if hint and state["error"] == "yes" else None
+    if note is not None:
+        state["messages"] += [("user", note)]
+    return state
+
+
+@timed_sandbox()
+def code_check_batch(states: List[GraphState], param_dict: dict, optimal: float, template: str = None, fork: bool = True,
+                     hint: bool = False, timeout: int = 60):
+    """
+    Check several candidates for the same problem, executing all of them in a single sandbox process
+
+    Args:
+        states (list): The graph states of the candidates
+        fork (bool): Run each candidate in a forked child of the sandbox worker
+        hint (bool): Tell the LLM when the profile shows that the time is not spent in the solver
+        timeout (int): The time limit of each candidate, in seconds
+
+    Returns:
+        states (list): The checked state of each candidate, in order
+    """
+
+    print("---CHECKING " + str(len(states)) + " CODES---")
+
+    results = [precheck(state, param_dict, template) for state in states]
+    pending = [i for i, result in enumerate(results) if result is None]
+    sources = [states[i]["generation"].imports + "\n" + states[i]["generation"].code for i in pending]
+    verdicts = run_batch(sources, param_dict, timeout, fork=fork) if sources else []
+
+    for i, verdict in zip(pending, verdicts):
+        if verdict["status"] == "ok":
+            sol = parse_objective(verdict["obj"])
+        elif verdict["status"] == "error":
+            sol = verdict["error"]
+        else:
+            sol = subprocess.TimeoutExpired("solve", timeout)
+        print(sol)
+        profile = verdict.get("profile", {})
+        state = check_routes(check_result(states[i], sol, optimal), profile, param_dict)
+        results[i] = add_profile(state, profile, hint)
+    return results
+
+def get_dataset(dir='./problems', lazy=False):
+    if lazy:
+        # Only the manifest is read here, the params of a problem are loaded when it is evaluated
+        dataset = LazyDataset(dir)
+        return dataset.names, dataset.params, dataset.inputs, dataset.optimums
+
     files = glob.glob(os.path.join(dir, '*.py'))
     names = []
     param_lists = []
@@ -0,0 +1,171 @@
+import ast
+import io
+import math
+import re
+import tokenize
+
+# Tokens a prompt may spend on its retrieved context and on the error messages of the last check,
+# besides its fixed fields (problem, template, code to refine).
+PROMPT_TOKEN_BUDGET = 12000
+MESSAGE_TOKEN_BUDGET = 2000
+# Tokens the instructions of a prompt take, and the least tokens left to the context whatever the other fields.
+PROMPT_OVERHEAD = 500
+MIN_CONTEXT_TOKENS = 1000
+# A snippet cut to fit the budget is dropped instead when less than this many tokens would be left of it.
+MIN_SNIPPET_TOKENS = 200
+# Innermost frames kept of each traceback.
+TRACEBACK_FRAMES = 3
+# Rough size of a token of code and English text for the hosted models, to avoid a tokenizer per provider.
+CHARS_PER_TOKEN = 4
+
+TRACEBACK_HEADER = 'Traceback (most recent call last):\n'
+# Parts of an error that differ between runs of the same error: object addresses and temporary files
+_VOLATILE = re.compile(r'0x[0-9a-fA-F]+|/tmp/[^\s"\']+')
+
+
+def count_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _remove_spans(source, spans):
+    """The source without the ((row, col), (row, col)) spans of its tokens and the lines left blank."""
+    offsets = [0]
+    for line in source.splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+    for start, end in sorted(spans, reverse=True):
+        start, end = offsets[start[0] - 1] + start[1], offsets[end[0] - 1] + end[1]
+        source = source[:start] + source[end:]
+    return '\n'.join(line.rstrip() for line in source.splitlines() if line.strip())
+
+
+def _parses(source):
+    try:
+        ast.parse(source)
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def strip_code(source):
+    """
+    Strip the comments, docstrings and license headers of Python code, and its blank lines.
+
+    Text that is not Python (e.g. the markdown docs) only loses its blank lines. The code is only
+    tokenized, not parsed, as some examples are Python 2 (the flp ones of Gurobi).
+    """
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+    except (SyntaxError, tokenize.TokenError):
+        tokens = None
+    if tokens is None or any(t.type == tokenize.ERRORTOKEN for t in tokens):
+        return '\n'.join(line.rstrip() for line in source.splitlines() if line.strip())
+
+    docstrings = []
+    significant = [t for t in tokens if t.type not in (tokenize.NL, tokenize.COMMENT)]
+    for i, token in enumerate(significant):
+        # a string alone in its statement: docstrings, and the license headers quoted at the top of a module
+        if (token.type == tokenize.STRING
+                and (i == 0 or significant[i - 1].type in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT))
+                and significant[i + 1].type in (tokenize.NEWLINE, tokenize.ENDMARKER)):
+            docstrings.append((token.start, token.end))
+    comments = [(t.start, t.end) for t in tokens if t.type == tokenize.COMMENT]
+
+    stripped = _remove_spans(source, comments + docstrings)
+    if _parses(source) and not _parses(stripped):
+        # a block whose only statement was its docstring
+        stripped = _remove_spans(source, comments)
+    return stripped
+
+
+def truncate(text, tokens):
+    """Cut the middle of a text down to about this many tokens, keeping its start and its end."""
+    if count_tokens(text) <= tokens:
+        return text
+    keep = tokens * CHARS_PER_TOKEN // 2
+    omitted = len(text) - 2 * keep
+    return f"{text[:keep]}\n... {omitted} characters omitted ...\n{text[-keep:]}"
+
+
+def _head(text, tokens):
+    """The first lines of a text within this many tokens."""
+    lines, used = [], 0
+    for line in text.splitlines():
+        used += count_tokens(line + '\n')
+        if used > tokens:
+            break
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def truncate_traceback(text, frames=TRACEBACK_FRAMES):
+    """Keep only the innermost frames of the tracebacks in a text, where the error is raised."""
+    parts = text.split(TRACEBACK_HEADER)
+    for i in range(1, len(parts)):
+        lines = parts[i].split('\n')
+        starts = [j for j, line in enumerate(lines) if line.startswith('  File ')]
+        if len(starts) <= frames:
+            continue
+        omitted = len(starts) - frames
+        parts[i] = '\n'.join([f"  ... {omitted} frames omitted"] + lines[starts[-frames]:])
+    return TRACEBACK_HEADER.join(parts)
+
+
+def compact_messages(messages, budget=MESSAGE_TOKEN_BUDGET):
+    """
+    The error messages of a state, deduplicated, with their tracebacks truncated, within a token budget.
+
+    Args:
+        messages: the (role, text) messages of a state
+        budget: the tokens the messages may take
+
+    Returns:
+        a list of (role, text), the latest messages when they do not all fit
+    """
+    seen = set()
+    compacted = []
+    for role, text in reversed(messages):
+        key = _VOLATILE.sub('', text)
+        if key in seen:
+            continue
+        seen.add(key)
+        compacted.append((role, truncate_traceback(text)))
+
+    kept, used = [], 0
+    for role, text in compacted:
+        if used >= budget:
+            break
+        text = truncate(text, budget - used)
+        used += count_tokens(text)
+        kept.append((role, text))
+    return kept[::-1]
+
+
+def compact_context(context, budget=PROMPT_TOKEN_BUDGET):
+    """
+    The text of the retrieved context of a prompt within a token budget.
+
+    The example codes are stripped of comments and docstrings, and kept in their order of rank
+    (the order of the dict) while they fit; the first one that does not fit is cut to its first lines.
+
+    Args:
+        context: {constraint keyword: example code}, highest ranked first
+
+    Returns:
+        the context text of the prompts
+    """
+    c, used = "", 0
+    for keyword, example in context.items():
+        text = "Constraint/Feature: " + keyword + "\nExample code: " + strip_code(example) + "\n===============\n"
+        tokens = count_tokens(text)
+        if used + tokens > budget:
+            if budget - used >= MIN_SNIPPET_TOKENS:
+                c += _head(text, budget - used) + "\n===============\n"
+            break
+        c += text
+        used += tokens
+    return c
+
+
+def context_budget(*fields, budget=PROMPT_TOKEN_BUDGET):
+    """The tokens left to the context of a prompt once its other fields are in."""
+    return max(budget - PROMPT_OVERHEAD - sum(count_tokens(str(field)) for field in fields), MIN_CONTEXT_TOKENS)
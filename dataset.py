@@ -0,0 +1,146 @@
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+from collections.abc import Sequence
+
+from instances import load_instance, save_instance
+
+# Generated files (manifest and params in the instance format) live next to the problems,
+# and are rebuilt when a problem changes
+CACHE_DIR = '.cache'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 2
+
+
+def file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_module(file_path):
+    module_name = os.path.splitext(os.path.basename(file_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def param_sizes(params):
+    """Shape of each parameter: [] for scalars, [n] for lists, [n, m] for lists of lists."""
+    sizes = {}
+    for key, value in params.items():
+        if isinstance(value, (list, tuple)):
+            if value and isinstance(value[0], (list, tuple)):
+                sizes[key] = [len(value), len(value[0])]
+            else:
+                sizes[key] = [len(value)]
+        else:
+            sizes[key] = []
+    return sizes
+
+
+def params_cache_path(dir, entry):
+    stem = os.path.splitext(entry['file'])[0]
+    return os.path.join(dir, CACHE_DIR, f"{stem}-{entry['hash'][:16]}.inst")
+
+
+def build_entry(dir, file_path, digest):
+    """Execute a problem module once, save its params as an instance and describe it for the manifest."""
+    module = load_module(file_path)
+    for attr in ('input', 'params_dict', 'optimal'):
+        if not hasattr(module, attr):
+            print(f"Warning: Module '{os.path.basename(file_path)}' does not have an '{attr}' variable.")
+            return None
+    entry = {
+        'name': module.input['problem'],
+        'file': os.path.basename(file_path),
+        'hash': digest,
+        'bytes': os.path.getsize(file_path),
+        'sizes': param_sizes(module.params_dict),
+        'input': module.input,
+        'optimal': module.optimal,
+    }
+    save_instance(params_cache_path(dir, entry), module.params_dict, {'name': entry['name'], 'optimal': entry['optimal']})
+    return entry
+
+
+def load_manifest(dir='./problems'):
+    """
+    Load the manifest of the problems in dir, rebuilding the entries of new or modified files.
+
+    Returns:
+        the list of entries (name, file, hash, bytes, sizes, input, optimal), in glob order like get_dataset
+    """
+    cache_dir = os.path.join(dir, CACHE_DIR)
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            previous = {entry['file']: entry for entry in manifest['problems']}
+
+    entries = []
+    changed = False
+    for file_path in glob.glob(os.path.join(dir, '*.py')):
+        digest = file_hash(file_path)
+        entry = previous.get(os.path.basename(file_path))
+        if entry is None or entry['hash'] != digest or not os.path.exists(params_cache_path(dir, entry)):
+            if entry is not None and os.path.exists(params_cache_path(dir, entry)):
+                shutil.rmtree(params_cache_path(dir, entry))
+            entry = build_entry(dir, file_path, digest)
+            changed = True
+        if entry is not None:
+            entries.append(entry)
+    if changed or len(entries) != len(previous):
+        with open(manifest_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'problems': entries}, f, indent=1)
+    return entries
+
+
+class LazyParams(Sequence):
+    """The params_dict of each problem, loaded from its instance only when it is accessed."""
+
+    def __init__(self, dir, entries):
+        self.dir = dir
+        self.entries = entries
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i not in self.cache:
+            # only the last problem is kept, evaluations go through the problems one by one
+            self.cache = {i: load_instance(params_cache_path(self.dir, self.entries[i]))}
+        return self.cache[i]
+
+
+class LazyDataset:
+    """Problem names, inputs and optima from the manifest; params are loaded when a problem is evaluated."""
+
+    def __init__(self, dir='./problems'):
+        self.dir = dir
+        self.entries = load_manifest(dir)
+        self.names = [entry['name'] for entry in self.entries]
+        self.inputs = [entry['input'] for entry in self.entries]
+        self.optimums = [entry['optimal'] for entry in self.entries]
+        self.params = LazyParams(dir, self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+if __name__ == "__main__":
+    for entry in load_manifest():
+        print(f"{entry['name']}: {entry['file']} ({entry['bytes']} bytes) {entry['sizes']}")
@@ -0,0 +1,368 @@
+import argparse
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from insertion import RoutePlan
+from local_search import NEIGHBORS, LocalSearch
+from portfolio import available_cores
+from route_evaluator import RouteEvaluator
+from routing_toolkit import model_from_params
+
+# Customers of each part an instance is split into, unless the number of parts is given: few enough
+# for the routing solver to search them well in a share of the time limit.
+PART_SIZE = 200
+# Share of the time limit the parts are solved in; the rest repairs and improves their joined routes.
+SOLVE_SHARE = 0.6
+# Nodes the coordinates of an instance without them are computed from (see embed).
+LANDMARKS = 64
+# Most iterations of k-means.
+KMEANS_ITERATIONS = 50
+
+
+def embed(matrix, dims=2, landmarks=LANDMARKS):
+    """
+    Coordinates of the nodes whose distances approximate a matrix, for instances without coordinates.
+
+    Landmark multidimensional scaling: landmark nodes, spread out by farthest-point selection, are
+    placed by classical scaling of their distances, and every node from its distances to them. The
+    matrix is made symmetric by averaging each arc with its reverse.
+
+    Args:
+        matrix: the distance or time matrix, as an array
+        dims: the number of coordinates of each node
+        landmarks: the number of landmark nodes
+
+    Returns:
+        a float array (nodes, dims)
+    """
+    matrix = np.asarray(matrix)
+    chosen = [0]
+    nearest = (matrix[0] + matrix[:, 0]) / 2.
+    for _ in range(min(landmarks, len(matrix)) - 1):
+        chosen.append(int(nearest.argmax()))
+        nearest = np.minimum(nearest, (matrix[chosen[-1]] + matrix[:, chosen[-1]]) / 2.)
+    # the squared distances from each landmark to each node
+    squared = ((matrix[chosen] + matrix[:, chosen].T) / 2.) ** 2
+    between = squared[:, chosen]
+    centering = np.eye(len(chosen)) - 1. / len(chosen)
+    values, vectors = np.linalg.eigh(-0.5 * centering @ between @ centering)
+    top = np.argsort(values)[::-1][:dims]
+    values, vectors = np.maximum(values[top], 1e-9), vectors[:, top]
+    return -0.5 * (squared - between.mean(axis=1)[:, None]).T @ (vectors / np.sqrt(values))
+
+
+def sweep(coordinates, center, weights, parts):
+    """
+    Split points into parts of consecutive angles around a center, of about the same total weight.
+
+    Args:
+        coordinates: the coordinates of the points, an array (points, 2 or more); the first two are used
+        center: the coordinates of the center, e.g. of the depot
+        weights: the weight of each point, e.g. its demand
+        parts: the number of parts
+
+    Returns:
+        the part of each point, an int array
+    """
+    offsets = np.asarray(coordinates)[:, :2] - np.asarray(center)[:2]
+    angles = np.arctan2(offsets[:, 1], offsets[:, 0])
+    order = np.argsort(angles, kind='stable')
+    # the sweep starts after the widest angle without points, so that no part spans it
+    gaps = np.diff(np.concatenate([angles[order], [angles[order[0]] + 2 * np.pi]]))
+    order = np.roll(order, -(int(gaps.argmax()) + 1))
+    weights = np.asarray(weights, dtype=float)[order]
+    if weights.sum() <= 0:
+        weights = np.ones(len(order))
+    middles = np.cumsum(weights) - weights / 2
+    labels = np.empty(len(order), dtype=np.int64)
+    labels[order] = np.minimum(middles * parts // weights.sum(), parts - 1)
+    return labels
+
+
+def kmeans(coordinates, parts, seed=0, iterations=KMEANS_ITERATIONS):
+    """
+    Split points into parts of nearby points, by k-means from a k-means++ seeding.
+
+    Args:
+        coordinates: the coordinates of the points, an array (points, dims)
+        parts: the number of parts
+        seed: the seed of the seeding
+        iterations: the most iterations
+
+    Returns:
+        the part of each point, an int array; a part may be empty
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    rng = np.random.default_rng(seed)
+    centers = [coordinates[rng.integers(len(coordinates))]]
+    nearest = ((coordinates - centers[0]) ** 2).sum(axis=1)
+    for _ in range(parts - 1):
+        point = rng.choice(len(coordinates), p=nearest / nearest.sum()) if nearest.sum() > 0 else 0
+        centers.append(coordinates[point])
+        nearest = np.minimum(nearest, ((coordinates - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+    labels = np.zeros(len(coordinates), dtype=np.int64)
+    for _ in range(iterations):
+        labels = ((coordinates[:, None] - centers[None]) ** 2).sum(axis=2).argmin(axis=1)
+        sizes = np.bincount(labels, minlength=parts)[:, None]
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, coordinates)
+        moved = np.where(sizes > 0, sums / np.maximum(sizes, 1), centers)
+        if np.allclose(moved, centers):
+            break
+        centers = moved
+    return labels
+
+
+def late_customers(model):
+    """
+    The customers no vehicle reaches before their window closes from its start (e.g. the matrix is rounded,
+    and a detour is shorter than the arc), with the customers to serve before them to reach them in time,
+    through the fewest of them.
+
+    Each pass relaxes the arcs from the customers reached earlier at the previous one, waiting at each
+    customer until its window opens, so that pass k finds the earliest times through k customers.
+
+    Returns:
+        {customer: the customers before it, in their order}, without those not reached in time even so;
+        empty without time windows
+    """
+    if model.time_windows is None:
+        return {}
+    transits = model._transits()
+    windows = np.array(model.time_windows, dtype=np.int64)
+    starts = sorted(set(model.starts))
+    customers = np.array([node not in model.depots for node in range(model.num_nodes)])
+    arrival = (windows[starts, 0][:, None] + transits[starts]).min(axis=0).astype(float)
+    late = customers & (arrival > windows[:, 1])
+    arrival[late] = np.inf
+    # the predecessor of each customer at each pass, and the pass each late customer is first reached at
+    parents = [np.full(model.num_nodes, -1)]
+    reached = {}
+    frontier = np.flatnonzero(customers & np.isfinite(arrival))
+    while len(frontier) and len(reached) < late.sum():
+        through = np.maximum(arrival[frontier], windows[frontier, 0])[:, None] + transits[frontier]
+        best = through.argmin(axis=0)
+        earliest = through[best, np.arange(model.num_nodes)]
+        improved = customers & (earliest < arrival) & (earliest <= windows[:, 1])
+        arrival[improved] = earliest[improved]
+        parents.append(parents[-1].copy())
+        parents[-1][improved] = frontier[best[improved]]
+        for node in np.flatnonzero(improved & late).tolist():
+            reached.setdefault(node, len(parents) - 1)
+        frontier = np.flatnonzero(improved)
+    chains = {}
+    for node, k in sorted(reached.items()):
+        chains[node], previous = [], parents[k][node]
+        while previous >= 0:
+            chains[node].insert(0, int(previous))
+            k -= 1
+            previous = parents[k][previous]
+    return chains
+
+
+def allocate_vehicles(model, groups):
+    """
+    The vehicles of each group of customers: a share of the fleet in proportion to the demand of the
+    group (to its customers, without capacities), at least one, those that start and end nearest first.
+    """
+    if model.capacities:
+        weights = np.array([model.capacities[0][1][group].sum() for group in groups], dtype=float)
+    else:
+        weights = np.array([len(group) for group in groups], dtype=float)
+    shares = weights / max(weights.sum(), 1) * model.num_vehicles
+    counts = np.maximum(np.floor(shares).astype(np.int64), 1)
+    # the vehicles left go to the largest remainders, and the groups with too many give theirs back
+    for k in np.argsort(counts - shares, kind='stable')[:max(model.num_vehicles - counts.sum(), 0)]:
+        counts[k] += 1
+    while counts.sum() > model.num_vehicles:
+        counts[np.argmax(counts - shares)] -= 1
+
+    costs = model._transits()
+    starts, ends = np.array(model.starts), np.array(model.ends)
+    free = np.ones(model.num_vehicles, dtype=bool)
+    vehicles = [None] * len(groups)
+    for k in np.argsort(-weights, kind='stable'):
+        group = groups[k]
+        distance = costs[np.ix_(starts, group)].mean(axis=1) + costs[np.ix_(group, ends)].mean(axis=0)
+        candidates = np.flatnonzero(free)
+        vehicles[k] = sorted(int(v) for v in candidates[np.argsort(distance[candidates], kind='stable')[:counts[k]]])
+        free[vehicles[k]] = False
+    return vehicles
+
+
+def _solve_part(part, profile, time_limit):
+    """Solve the model of a part, in a worker process: its objective, and its routes without their depots."""
+    obj = part.solve(profile=profile, time_limit=time_limit)
+    return obj, [route[1:-1] for route in part.routes()] if obj >= 0 else None
+
+
+def _route_apart(plan, route):
+    """
+    Give a route of customers to a vehicle without one, the customers taken out of their routes; whether it
+    succeeded (the routes they leave, and the new one, meet the constraints).
+    """
+    left = {vehicle: [node for node in nodes if node not in route]
+            for vehicle, nodes in enumerate(plan.routes) if set(route).intersection(nodes)}
+    empty = [vehicle for vehicle, nodes in enumerate(plan.routes) if not nodes and plan.fits(vehicle, route)]
+    if not empty or not all(plan.fits(vehicle, nodes) for vehicle, nodes in left.items()):
+        return False
+    for vehicle, nodes in left.items():
+        plan.replace(vehicle, nodes)
+    plan.replace(empty[0], route)
+    return True
+
+
+def solve_decomposed(model, time_limit, parts=None, method='kmeans', coordinates=None, workers=None, profile='gls',
+                     seed=0):
+    """
+    Solve a large routing problem by parts: cluster its customers, solve the part of each cluster with
+    its share of the vehicles in parallel processes, then join their routes, insert the customers
+    they miss and improve the routes across the borders of the parts until the time limit.
+
+    The parts are solved with RoutingModelBuilder.solve in SOLVE_SHARE of the time limit. The joined
+    routes are improved by local_search.LocalSearch when it handles the problem, or else by the
+    routing solver started from them on the whole model, with neighbor arcs. The customers no vehicle
+    reaches in time from its start (see late_customers) are left out of the parts and inserted with the
+    others, or else served in a route of their own, after the customers they are reached through.
+
+    Args:
+        model: the RoutingModelBuilder of the problem; it is not built
+        time_limit: seconds of the whole solve
+        parts: the number of parts, by default one per PART_SIZE customers (at most one per vehicle)
+        method: 'kmeans' or 'sweep' (around the depots, in parts of about the same demand)
+        coordinates: the coordinates of the nodes, an array (nodes, 2); computed from the matrix by
+            embed when not given
+        workers: the number of processes, by default one per core
+        profile: the search profile of the parts and of the routing solver improvement
+        seed: the seed of k-means and of the local search
+
+    Returns:
+        {"obj": the objective of the routes, -1 when some customers could not be routed, "routes": the
+        node sequence of each vehicle, depots included, "parts": the customers, vehicles and objective
+        of each part, "repaired": the customers inserted after the parts, "seconds": the time of each
+        step: cluster, solve, repair and improve}
+
+    Raises:
+        ValueError: the model has depot resources, which the vehicles of all the parts share
+    """
+    if model.depot_resource is not None:
+        raise ValueError("depot resources are shared by all the routes, solve the model instead")
+    if method not in ('kmeans', 'sweep'):
+        raise ValueError(f"unknown clustering method '{method}', expected 'kmeans' or 'sweep'")
+    started = time.monotonic()
+    deadline = started + time_limit
+    seconds = {}
+    customers = np.array([node for node in range(model.num_nodes) if node not in model.depots], dtype=np.int64)
+    count = max(min(parts or math.ceil(len(customers) / PART_SIZE), model.num_vehicles, len(customers)), 1)
+    workers = max(workers or available_cores(), 1)
+
+    # cluster the customers, a delivery with its pickup; those no vehicle reaches in time from its start are
+    # left to the repair, a part with one of them would have no solution unless its first solution heuristic
+    # happened to serve it after the customers it is reached in time through
+    points = embed(model.matrix) if coordinates is None else np.asarray(coordinates, dtype=float)
+    if method == 'sweep':
+        weights = model.capacities[0][1][customers] if model.capacities else np.ones(len(customers))
+        labels = sweep(points[customers], points[sorted(model.depots)].mean(axis=0), weights, count)
+    else:
+        labels = kmeans(points[customers], count, seed)
+    part_of = np.full(model.num_nodes, -1)
+    part_of[customers] = labels
+    late = late_customers(model)
+    part_of[list(late)] = -1
+    for pickup, delivery in model.pickups_deliveries:
+        part_of[delivery] = part_of[pickup]
+    groups = [group for group in (customers[part_of[customers] == k] for k in range(count)) if len(group)]
+    vehicles = allocate_vehicles(model, groups)
+    seconds['cluster'] = time.monotonic() - started
+
+    # solve the parts, as many at once as there are workers
+    begin = time.monotonic()
+    waves = math.ceil(len(groups) / workers)
+    part_limit = max((started + SOLVE_SHARE * time_limit - begin) / waves, 0.1)
+    nodes = [list(dict.fromkeys([model.starts[v] for v in vs] + [model.ends[v] for v in vs] + group.tolist()))
+             for group, vs in zip(groups, vehicles)]
+    models = [model.sub_model(part_nodes, vs) for part_nodes, vs in zip(nodes, vehicles)]
+    arguments = (models, itertools.repeat(profile), itertools.repeat(part_limit))
+    if workers > 1 and len(models) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(models))) as executor:
+            results = list(executor.map(_solve_part, *arguments))
+    else:
+        results = list(map(_solve_part, *arguments))
+    routes = [[] for _ in range(model.num_vehicles)]
+    for part_nodes, vs, (_, part_routes) in zip(nodes, vehicles, results):
+        for vehicle, route in zip(vs, part_routes or []):
+            routes[vehicle] = [part_nodes[k] for k in route]
+    seconds['solve'] = time.monotonic() - begin
+
+    # insert the customers of the parts without a solution, and those their solutions left out
+    begin = time.monotonic()
+    plan = RoutePlan(model, routes)
+    repaired = 0
+    if model.prizes is None:
+        delivery_of = dict(model.pickups_deliveries)
+        deliveries = set(delivery_of.values())
+        for node in customers.tolist():
+            if node not in plan.visited and node not in deliveries:
+                repaired += 1 + (node in delivery_of)
+                if node in late and node not in delivery_of and (plan.insert(node, reoptimize=False)
+                                                                 or _route_apart(plan, late[node] + [node])):
+                    continue
+                plan.insert(node, delivery_of.get(node), reoptimize=time.monotonic() < deadline)
+    routes = plan.routes
+    seconds['repair'] = time.monotonic() - begin
+
+    # improve the routes across the borders of the parts
+    begin = time.monotonic()
+    if not model.pickups_deliveries and model.prizes is None:
+        search = LocalSearch(model, seed=seed)
+        if search.polish(routes, deadline=deadline) >= 0:
+            routes = search.solution
+    else:
+        whole = model.sub_model(range(model.num_nodes), range(model.num_vehicles))
+        whole.add_initial_routes(routes).add_neighbor_arcs(NEIGHBORS)
+        if whole.solve(profile=profile, deadline=max(deadline, time.monotonic() + 1)) >= 0:
+            routes = [route[1:-1] for route in whole.routes()]
+    seconds['improve'] = time.monotonic() - begin
+
+    evaluator = RouteEvaluator(model)
+    result = evaluator.evaluate(evaluator.pack([routes]))
+    return {'obj': int(result['objective'][0]) if result['feasible'][0] else -1,
+            'routes': [[model.starts[v]] + route + [model.ends[v]] for v, route in enumerate(routes)],
+            'parts': [{'customers': len(group), 'vehicles': vs, 'obj': obj}
+                      for group, vs, (obj, _) in zip(groups, vehicles, results)],
+            'repaired': repaired, 'seconds': {step: round(s, 2) for step, s in seconds.items()}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Solve instances by parts and compare with the solve of the whole '
+                                                 'model in the same time')
+    parser.add_argument('instances', type=str, nargs='+', help='instance directories, e.g. of generator.py')
+    parser.add_argument('--time_limit', type=float, default=60, help='seconds of each solve')
+    parser.add_argument('--parts', type=int, default=None, help=f'parts, by default one per {PART_SIZE} customers')
+    parser.add_argument('--method', type=str, default='kmeans', choices=['kmeans', 'sweep'])
+    parser.add_argument('--workers', type=int, default=None, help='processes, by default one per core')
+    parser.add_argument('--profile', type=str, default='gls', help='search profile of the routing solver')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from instances import load_instance
+    print(f"{'instance':<36} {'whole':>10} {'by parts':>10} {'gap':>8}   parts  repaired   seconds (whole / by parts)")
+    for instance in args.instances:
+        params = load_instance(instance, as_lists=False)
+        begin = time.perf_counter()
+        whole = model_from_params(params).solve(profile=args.profile, time_limit=args.time_limit)
+        whole_time = time.perf_counter() - begin
+        begin = time.perf_counter()
+        result = solve_decomposed(model_from_params(params), args.time_limit, args.parts, args.method,
+                                  workers=args.workers, profile=args.profile, seed=args.seed)
+        parts_time = time.perf_counter() - begin
+        gap = f"{(result['obj'] - whole) / whole:+.1%}" if whole > 0 and result['obj'] >= 0 else '-'
+        print(f"{os.path.basename(os.path.normpath(instance)):<36} {whole:>10} {result['obj']:>10} {gap:>8}   "
+              f"{len(result['parts']):>5} {result['repaired']:>9}   {whole_time:.1f} / {parts_time:.1f} "
+              f"{result['seconds']}")
@@ -1,67 +1,31 @@
 # Prize Collecting Travelling Salesman Problem (PCTSP)
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
+from routing_toolkit import RoutingModelBuilder
 
-def solve(distance_matrix: list, prizes: list, max_distance: int, depot: int):
+def solve(distance_matrix: list, prizes: list, max_distance: int, depot: int, initial_routes: list = None):
     """
     Args:
         distance_matrix: contains the integer distance between customers
         prizes: the value of prize that a vehicle can collect at each node
         max_distance: maximum distance that a vehicle can travel
         depot: the index of the depot node
+        initial_routes: the routes of a previous solution, one list of nodes per vehicle, to start the
+            search from when the problem is solved again after a change
 
     Returns:
         obj: a number representing the objective value of the solution
     """
-    # Create the routing index manager.
-    manager = pywrapcp.RoutingIndexManager(
-        len(distance_matrix),
-        1,  # single vehicle
-        depot)
+    # Build the routing model over the distances, with a single vehicle
+    model = RoutingModelBuilder(distance_matrix, depot=depot)
 
-    # Create routing model.
-    routing = pywrapcp.RoutingModel(manager)
+    # Each route travels at most this distance
+    model.add_distance_limit(max_distance)
 
-    # Create and register a transit callback.
-    def distance_callback(from_index, to_index):
-        """Returns the distance between the two nodes."""
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return distance_matrix[from_node][to_node]
+    # Nodes may be skipped, at the cost of their prize
+    model.add_prizes(prizes)
 
-    # Register the distance callback with the routing model
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    # Start from the routes of the previous solution, if any
+    model.add_initial_routes(initial_routes)
 
-    # Define cost of each arc.
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-    # Limit Vehicle distance.
-    dimension_name = 'Distance'
-    routing.AddDimension(
-        transit_callback_index,
-        0,  # no slack
-        max_distance,  # vehicle maximum travel distance
-        True,  # start cumul to zero
-        dimension_name)
-
-    # Allow to drop nodes.
-    for node in range(1, len(distance_matrix)):
-        routing.AddDisjunction([manager.NodeToIndex(node)], prizes[node])
-
-    # Setting first solution heuristic.
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-    search_parameters.local_search_metaheuristic = (
-        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
-
-    search_parameters.time_limit.FromSeconds(15)
-
-    # Solve the problem.
-    assignment = routing.SolveWithParameters(search_parameters)
-
-    # Return the objective value.
-    if assignment:
-        return assignment.ObjectiveValue()
-    else:
-        return -1
\ No newline at end of file
+    # Solve the problem with guided local search for 15 seconds and return the objective value,
+    # -1 if no solution is found
+    return model.solve(profile='gls', time_limit=15)
@@ -1,46 +1,24 @@
 # Simple Vehicle Routing Problem (VRP)
-from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from routing_toolkit import RoutingModelBuilder
 
-def solve(distance_matrix: list, num_vehicle: int, depot: int):
+def solve(distance_matrix: list, num_vehicle: int, depot: int, initial_routes: list = None):
     """
     Args:
         distance_matrix: contains the integer distance between customers
         num_vehicle: the number of the vehicle
         depot: the index of the depot node
+        initial_routes: the routes of a previous solution, one list of nodes per vehicle, to start the
+            search from when the problem is solved again after a change
 
     Returns:
         obj: a number representing the objective value of the solution
     """
-    # Create the routing index manager
-    manager = pywrapcp.RoutingIndexManager(len(distance_matrix), num_vehicle, depot)
+    # Build the routing model over the distances
+    model = RoutingModelBuilder(distance_matrix, num_vehicle, depot=depot)
 
-    # Create Routing Model
-    routing = pywrapcp.RoutingModel(manager)
+    # Start from the routes of the previous solution, if any
+    model.add_initial_routes(initial_routes)
 
-    # Create and register a transit callback
-    def distance_callback(from_index, to_index):
-        # Returns the distance between the two nodes
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return distance_matrix[from_node][to_node]
-
-    # Register the distance callback with the routing model
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-
-    # Define cost of each arc using the distance callback
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-    # Setting first solution heuristic
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-
-    # Solve the problem
-    solution = routing.SolveWithParameters(search_parameters)
-
-    # Return the objective value if a solution is found, otherwise return -1
-    if solution:
-        obj = solution.ObjectiveValue()
-    else:
-        obj = -1
-    return obj
+    # Solve the problem with the PATH_CHEAPEST_ARC first solution heuristic and return the objective
+    # value, -1 if no solution is found
+    return model.solve()
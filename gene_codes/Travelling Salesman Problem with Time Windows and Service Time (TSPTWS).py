@@ -1,71 +1,31 @@
 # Travelling Salesman Problem with Time Windows and Service Time (TSPTWS)
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
+from routing_toolkit import RoutingModelBuilder
 
-def solve(time_matrix: list, time_windows: list, depot: int, service_time: list):
+def solve(time_matrix: list, time_windows: list, depot: int, service_time: list, initial_routes: list = None):
     """
     Args:
         time_matrix: contains the integer travel times between locations
         time_windows: the list of tuples for time windows of the customers
         depot: the index of the depot node
         service_time: service time for each customer node
+        initial_routes: the routes of a previous solution, one list of nodes per vehicle, to start the
+            search from when the problem is solved again after a change
 
     Returns:
         obj: a number representing the objective value of the solution
     """
-    # Create the routing index manager.
-    manager = pywrapcp.RoutingIndexManager(len(time_matrix), 1, depot)
+    # Build the routing model over the travel times, with a single vehicle
+    model = RoutingModelBuilder(time_matrix, depot=depot)
 
-    # Create Routing Model.
-    routing = pywrapcp.RoutingModel(manager)
+    # The service time of a node is spent before leaving it
+    model.add_service_times(service_time)
 
-    # Create and register a transit callback.
-    def time_callback(from_index, to_index):
-        """Returns the travel time between the two nodes."""
-        # Convert from routing variable Index to time matrix NodeIndex.
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return time_matrix[from_node][to_node] + service_time[from_node]
+    # Each location is visited within its time window
+    model.add_time_windows(time_windows)
 
-    # Register the transit callback with the routing model.
-    transit_callback_index = routing.RegisterTransitCallback(time_callback)
+    # Start from the routes of the previous solution, if any
+    model.add_initial_routes(initial_routes)
 
-    # Define cost of each arc.
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-    # Add Time Windows constraint.
-    time = 'Time'
-    routing.AddDimension(
-        transit_callback_index,
-        30,  # allow waiting time
-        300,  # maximum time per vehicle
-        False,  # Don't force start cumul to zero.
-        time)
-    time_dimension = routing.GetDimensionOrDie(time)
-
-    # Add time window constraints for each location except depot.
-    for location_idx, time_window in enumerate(time_windows):
-        if location_idx == depot:
-            continue
-        index = manager.NodeToIndex(location_idx)
-        time_dimension.CumulVar(index).SetRange(time_window[0], time_window[1])
-
-    # Add time window constraints for the depot.
-    depot_idx = depot
-    index = routing.Start(0)
-    time_dimension.CumulVar(index).SetRange(
-        time_windows[depot_idx][0], time_windows[depot_idx][1])
-
-    # Setting first solution heuristic.
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-
-    # Solve the problem.
-    solution = routing.SolveWithParameters(search_parameters)
-
-    # Return the objective value of the solution.
-    if solution:
-        return solution.ObjectiveValue()
-    else:
-        return -1
\ No newline at end of file
+    # Solve the problem with the PATH_CHEAPEST_ARC first solution heuristic and return the objective
+    # value, -1 if no solution is found
+    return model.solve()
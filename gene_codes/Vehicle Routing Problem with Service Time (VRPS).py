@@ -1,58 +1,28 @@
 # Vehicle Routing Problem with Service Time (VRPS)
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
+from routing_toolkit import RoutingModelBuilder
 
-def solve(time_matrix: list, num_vehicle: int, depot: int, service_time: list):
+def solve(time_matrix: list, num_vehicle: int, depot: int, service_time: list, initial_routes: list = None):
     """
     Args:
         time_matrix: contains the integer travel times between locations
         num_vehicle: the number of the vehicle
         depot: the index of the depot node
         service_time: service time for each customer node 
+        initial_routes: the routes of a previous solution, one list of nodes per vehicle, to start the
+            search from when the problem is solved again after a change
 
     Returns:
         obj: a number representing the objective value of the solution
     """
-    # Create the routing index manager.
-    manager = pywrapcp.RoutingIndexManager(len(time_matrix), num_vehicle, depot)
+    # Build the routing model over the travel times
+    model = RoutingModelBuilder(time_matrix, num_vehicle, depot=depot)
 
-    # Create Routing Model.
-    routing = pywrapcp.RoutingModel(manager)
+    # The service time of a node is spent before leaving it
+    model.add_service_times(service_time)
 
-    # Create and register a transit callback.
-    def time_callback(from_index, to_index):
-        """Returns the travel time between the two nodes including service time."""
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return time_matrix[from_node][to_node] + service_time[from_node]
+    # Start from the routes of the previous solution, if any
+    model.add_initial_routes(initial_routes)
 
-    # Register the transit callback with the routing model.
-    transit_callback_index = routing.RegisterTransitCallback(time_callback)
-
-    # Define cost of each arc.
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-    # Add Time Windows constraint.
-    time = 'Time'
-    routing.AddDimension(
-        transit_callback_index,
-        0,  # no slack
-        3000,  # maximum time per vehicle
-        False,  # Don't force start cumul to zero.
-        time)
-    # Get the time dimension to add constraints later if needed.
-    time_dimension = routing.GetDimensionOrDie(time)
-
-    # Setting first solution heuristic.
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-
-    # Solve the problem.
-    solution = routing.SolveWithParameters(search_parameters)
-
-    # Return the objective value of the solution.
-    if solution:
-        return solution.ObjectiveValue()
-    else:
-        return -1
\ No newline at end of file
+    # Solve the problem with the PATH_CHEAPEST_ARC first solution heuristic and return the objective
+    # value, -1 if no solution is found
+    return model.solve()
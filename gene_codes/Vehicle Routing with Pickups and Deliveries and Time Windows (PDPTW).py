@@ -1,8 +1,7 @@
 # Vehicle Routing with Pickups and Deliveries and Time Windows (PDPTW)
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
+from routing_toolkit import RoutingModelBuilder
 
-def solve(time_matrix: list, time_windows: list, pickups_deliveries: list, num_vehicle: int, depot: int):
+def solve(time_matrix: list, time_windows: list, pickups_deliveries: list, num_vehicle: int, depot: int, initial_routes: list = None):
     """
     Args:
         time_matrix: contains the integer travel times between locations
@@ -10,85 +9,24 @@ def solve(time_matrix: list, time_windows: list, pickups_deliveries: list, num_v
         pickups_deliveries: a list of pairs of pickup and delivery locations
         num_vehicle: the number of the vehicle
         depot: the index of the depot node
+        initial_routes: the routes of a previous solution, one list of nodes per vehicle, to start the
+            search from when the problem is solved again after a change
 
     Returns:
         obj: a number representing the objective value of the solution
     """
-    # Create the routing index manager.
-    manager = pywrapcp.RoutingIndexManager(len(time_matrix), num_vehicle, depot)
+    # Build the routing model over the travel times
+    model = RoutingModelBuilder(time_matrix, num_vehicle, depot=depot)
 
-    # Create Routing Model.
-    routing = pywrapcp.RoutingModel(manager)
+    # Each location is visited within its time window
+    model.add_time_windows(time_windows)
 
-    # Create and register a transit callback.
-    def time_callback(from_index, to_index):
-        """Returns the travel time between the two nodes."""
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return time_matrix[from_node][to_node]
+    # Each pickup is delivered by the same vehicle, after the pickup
+    model.add_pickups_deliveries(pickups_deliveries)
 
-    # Register the transit callback with the routing model.
-    transit_callback_index = routing.RegisterTransitCallback(time_callback)
+    # Start from the routes of the previous solution, if any
+    model.add_initial_routes(initial_routes)
 
-    # Define cost of each arc.
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-    # Add Time Windows constraint.
-    time = "Time"
-    routing.AddDimension(
-        transit_callback_index,
-        30,  # allow waiting time
-        100,  # maximum time per vehicle
-        False,  # Don't force start cumul to zero.
-        time,
-    )
-    # Get the time dimension to add constraints.
-    time_dimension = routing.GetDimensionOrDie(time)
-
-    # Add time window constraints for each location except depot.
-    for location_idx, time_window in enumerate(time_windows):
-        if location_idx == depot:
-            continue
-        index = manager.NodeToIndex(location_idx)
-        time_dimension.CumulVar(index).SetRange(time_window[0], time_window[1])
-
-    # Add time window constraints for each vehicle start node.
-    for vehicle_id in range(num_vehicle):
-        index = routing.Start(vehicle_id)
-        time_dimension.CumulVar(index).SetRange(
-            time_windows[depot][0],
-            time_windows[depot][1]
-        )
-
-    # Instantiate route start and end times to produce feasible times.
-    for i in range(num_vehicle):
-        routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.Start(i)))
-        routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(i)))
-
-    # Add Pickup and Delivery constraints.
-    for request in pickups_deliveries:
-        pickup_index = manager.NodeToIndex(request[0])
-        delivery_index = manager.NodeToIndex(request[1])
-        routing.AddPickupAndDelivery(pickup_index, delivery_index)
-        # Ensure that pickup and delivery are performed by the same vehicle.
-        routing.solver().Add(
-            routing.VehicleVar(pickup_index) == routing.VehicleVar(delivery_index)
-        )
-        # Ensure that delivery happens after pickup.
-        routing.solver().Add(
-            time_dimension.CumulVar(pickup_index) <= time_dimension.CumulVar(delivery_index)
-        )
-
-    # Setting first solution heuristic.
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-
-    # Solve the problem.
-    solution = routing.SolveWithParameters(search_parameters)
-
-    # Return the objective value of the solution.
-    if solution:
-        return solution.ObjectiveValue()
-    else:
-        return -1
\ No newline at end of file
+    # Solve the problem with the PATH_CHEAPEST_ARC first solution heuristic and return the objective
+    # value, -1 if no solution is found
+    return model.solve()
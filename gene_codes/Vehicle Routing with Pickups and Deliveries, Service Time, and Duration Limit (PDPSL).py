@@ -1,7 +1,7 @@
 # Vehicle Routing with Pickups and Deliveries, Service Time, and Duration Limit (PDPSL)
-from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+from routing_toolkit import RoutingModelBuilder
 
-def solve(time_matrix: list, pickups_deliveries: list, num_vehicle: int, depot: int, service_time: list, duration_limit: int):
+def solve(time_matrix: list, pickups_deliveries: list, num_vehicle: int, depot: int, service_time: list, duration_limit: int, initial_routes: list = None):
     """
     Args:
         time_matrix: contains the integer travel times between customers
@@ -10,59 +10,27 @@ def solve(time_matrix: list, pickups_deliveries: list, num_vehicle: int, depot:
         depot: the index of the depot node
         service_time: service time for each customer node
         duration_limit: the time duration of each route is upper bounded by the duration limit
+        initial_routes: the routes of a previous solution, one list of nodes per vehicle, to start the
+            search from when the problem is solved again after a change
 
     Returns:
         obj: a number representing the objective value of the solution
     """
-    # Create the routing index manager
-    manager = pywrapcp.RoutingIndexManager(len(time_matrix), num_vehicle, depot)
+    # Build the routing model over the travel times
+    model = RoutingModelBuilder(time_matrix, num_vehicle, depot=depot)
 
-    # Create Routing Model
-    routing = pywrapcp.RoutingModel(manager)
+    # The service time of a node is spent before leaving it
+    model.add_service_times(service_time)
 
-    # Create and register a transit callback
-    def time_callback(from_index, to_index):
-        # Convert from routing variable Index to time matrix NodeIndex
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return time_matrix[from_node][to_node] + service_time[from_node]
+    # Each route lasts at most this long
+    model.add_duration_limit(duration_limit)
 
-    # Register the transit callback with the routing model
-    transit_callback_index = routing.RegisterTransitCallback(time_callback)
+    # Each pickup is delivered by the same vehicle, after the pickup
+    model.add_pickups_deliveries(pickups_deliveries)
 
-    # Define cost of each arc
-    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    # Start from the routes of the previous solution, if any
+    model.add_initial_routes(initial_routes)
 
-    # Add Time Dimension
-    time = 'Time'
-    routing.AddDimension(
-        transit_callback_index,
-        30,  # allow waiting time
-        duration_limit,  # maximum time per vehicle
-        False,  # Don't force start cumul to zero.
-        time)
-    time_dimension = routing.GetDimensionOrDie(time)
-
-    # Add Pickup and Delivery constraints
-    for request in pickups_deliveries:
-        pickup_index = manager.NodeToIndex(request[0])
-        delivery_index = manager.NodeToIndex(request[1])
-        routing.AddPickupAndDelivery(pickup_index, delivery_index)
-        routing.solver().Add(
-            routing.VehicleVar(pickup_index) == routing.VehicleVar(delivery_index))
-        routing.solver().Add(
-            time_dimension.CumulVar(pickup_index) <= time_dimension.CumulVar(delivery_index))
-
-    # Setting first solution heuristic
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-
-    # Solve the problem
-    solution = routing.SolveWithParameters(search_parameters)
-
-    # Return the objective value
-    if solution:
-        return solution.ObjectiveValue()
-    else:
-        return -1
\ No newline at end of file
+    # Solve the problem with the PATH_CHEAPEST_ARC first solution heuristic and return the objective
+    # value, -1 if no solution is found
+    return model.solve()
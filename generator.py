@@ -0,0 +1,376 @@
+import argparse
+import ast
+import glob
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+from instances import euclidean_matrix, load_instance, save_instance, select_params
+from routing_toolkit import describe
+
+# The solved problem families: one 'solve' per file, named "<problem name> (<abbreviation>).py".
+FAMILY_DIR = './gene_codes'
+
+# The shared module building the routing evaluators, whose imports the templates keep.
+TOOLKIT_MODULE = 'routing_toolkit'
+
+# Descriptions of the generated parameters, for the templates of the gene codes without a docstring.
+PARAM_DOCS = {
+    'distance_matrix': 'contains the integer distance between customers',
+    'time_matrix': 'contains the integer travel times between locations',
+    'time_windows': 'the list of tuples for time windows of the customers',
+    'demands': 'the list of integer customer demands',
+    'vehicle_capacities': 'the capacity of each vehicle',
+    'vehicle_capacity': 'the capacity of each vehicle',
+    'num_vehicle': 'the number of the vehicle',
+    'num_vehicles': 'the number of the vehicle',
+    'depot': 'the index of the depot node',
+    'starts': 'the index of the starting depot for vehicles',
+    'ends': 'the index of the ending depot for vehicles',
+    'pickups_deliveries': 'a list of pairs of pickup and delivery locations',
+    'prizes': 'the value of prize that a vehicle can collect at each node',
+    'max_distance': 'maximum distance that a vehicle can travel',
+    'distance_limit': 'maximum distance that a vehicle can travel',
+    'duration_limit': 'the maximum duration of each route',
+    'service_time': 'service time for each customer node',
+    'vehicle_load_time': 'the time required to load a vehicle at depot',
+    'vehicle_unload_time': 'the time required to unload a vehicle at depot',
+    'depot_capacity': 'the maximum number of vehicles that can load or unload at the same time',
+}
+
+
+def load_families(dir=FAMILY_DIR):
+    """
+    Read the 'solve' signature of every problem family.
+
+    Args:
+        dir: a directory of solvers, one 'solve' per file (e.g. gene_codes or data/Gurobi)
+
+    Returns:
+        {abbreviation or name: {"name", "file", "params", "options", "template"}}: the params are the
+        arguments of 'solve' an instance gives, the options those with a default (e.g. initial_routes);
+        the template is the 'solve' signature and docstring with an empty body and without the options,
+        as in the code_example of the problems, after the imports of the routing toolkit the solver
+        uses and a description of what they import
+    """
+    families = {}
+    for file_path in sorted(glob.glob(os.path.join(dir, '*.py'))):
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        match = re.search(r'\(([^()]+)\)$', name)
+        with open(file_path, 'r') as f:
+            tree = ast.parse(f.read())
+        solve = next((node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == 'solve'), None)
+        if solve is None:
+            continue
+        arguments = solve.args.args
+        required = arguments[:len(arguments) - len(solve.args.defaults)]
+        # files without an abbreviation (e.g. data/Gurobi) are keyed by their name
+        families[match.group(1) if match else name] = {
+            'name': name,
+            'file': file_path,
+            'params': [arg.arg for arg in required],
+            'options': [arg.arg for arg in arguments[len(required):]],
+            'template': solve_template(solve, [node for node in tree.body if isinstance(node, ast.ImportFrom)
+                                               and node.module == TOOLKIT_MODULE]),
+        }
+    return families
+
+
+def solve_template(solve, imports=()):
+    """
+    The code_example of a 'solve' function: its signature and docstring, returning -1.
+
+    The arguments with a default value are left out, with their docstring entries. The given ast.ImportFrom of the routing toolkit come first, each followed by comments describing
+    the functions and classes it imports, so generated code can call them.
+    """
+    required = solve.args.args[:len(solve.args.args) - len(solve.args.defaults)]
+    options = [arg.arg for arg in solve.args.args[len(required):]]
+    args = ', '.join(f"{arg.arg}: {ast.unparse(arg.annotation)}" if arg.annotation else arg.arg
+                     for arg in required)
+    docstring = ast.get_docstring(solve)
+    if docstring is None:
+        lines = ['Args:'] + [f"    {arg.arg}: {PARAM_DOCS.get(arg.arg, '')}" for arg in required]
+        lines += ['', 'Returns:', '    obj: a number representing the objective value of the solution']
+    else:
+        lines, skipping = [], False
+        for line in docstring.splitlines():
+            # an Args entry starts at its name and goes on over the lines indented further
+            if line.startswith('    ') and not line.startswith('     '):
+                skipping = line.strip().split(':')[0] in options
+            elif not line.startswith('     '):
+                skipping = False
+            if not skipping:
+                lines.append(line)
+    body = '\n'.join(f"    {line}" if line else '' for line in lines)
+    header = ''
+    for node in imports:
+        header += '\n'.join([ast.unparse(node)] + describe(alias.name for alias in node.names)) + '\n'
+    header += '\n\n' if imports else ''
+    return f'{header}def solve({args}):\n    """\n{body}\n    """\n    obj = -1\n    return obj'
+
+
+def _nearest_neighbor_order(matrix, start, nodes):
+    """Order nodes as a nearest neighbor path from start."""
+    order = []
+    remaining = np.array(nodes, dtype=np.int64)
+    current = start
+    while len(remaining):
+        k = int(np.argmin(matrix[current, remaining]))
+        current = int(remaining[k])
+        order.append(current)
+        remaining = np.delete(remaining, k)
+    return order
+
+
+def _sweep_routes(coordinates, matrix, depot, customers, num_routes):
+    """Split the customers around a depot into num_routes angular sectors, each ordered by nearest neighbor."""
+    if not customers:
+        return [[] for _ in range(num_routes)]
+    offsets = coordinates[customers] - coordinates[depot]
+    angles = np.arctan2(offsets[:, 1], offsets[:, 0])
+    swept = [customers[i] for i in np.argsort(angles, kind='stable')]
+    return [_nearest_neighbor_order(matrix, depot, list(chunk)) for chunk in np.array_split(swept, num_routes)]
+
+
+def _route_length(matrix, start, route, end, service=None):
+    path = [start] + route + [end]
+    length = int(sum(matrix[i][j] for i, j in zip(path, path[1:])))
+    if service is not None:
+        length += int(sum(service[i] for i in path[:-1]))
+    return length
+
+
+def _schedule_ends(starts, arrivals, load_time, unload_time, capacity):
+    """
+    Depot times of the planted routes under the depot resource constraint.
+
+    The loading intervals are staggered by the caller; each unloading interval starts at the earliest
+    time after the arrival where fewer than capacity intervals overlap it.
+    """
+    intervals = [(s, s + load_time) for s in starts]
+    ends = [None] * len(arrivals)
+    for v in sorted(range(len(arrivals)), key=lambda v: arrivals[v]):
+        candidates = sorted({arrivals[v]} | {b for a, b in intervals if b >= arrivals[v]})
+        for t in candidates:
+            if sum(1 for a, b in intervals if a < t + unload_time and t < b) < capacity:
+                ends[v] = t
+                intervals.append((t, t + unload_time))
+                break
+    return ends
+
+
+def generate(family, n, seed=0, num_vehicle=None, num_depots=None, side=1000, customers_per_vehicle=10,
+             slack=0.2, families=None):
+    """
+    Generate a random instance of a problem family with a planted feasible solution.
+
+    Nodes are uniform in a side x side square. Customers are split into routes by a sweep around their
+    depot; capacities, time windows, pickup/delivery pairs and the distance, duration and depot limits
+    are then derived from these planted routes, so the instance is always feasible.
+
+    Args:
+        family: the abbreviation of the family, e.g. 'CVRPTW'
+        n: the number of nodes, depots included
+        seed: the seed of the random generator, the same seed gives the same instance
+        num_vehicle: the number of vehicles, by default one per customers_per_vehicle customers
+        num_depots: the number of depots of the multiple depot families, by default n // 50 within [2, 4]
+        side: the size of the square, which sets the scale of distances and times
+        slack: relative slack of the capacities and limits over the planted solution
+
+    Returns:
+        (params, meta): the parameters of every 'solve' signature (see select_params), and the meta with
+        the family, seed and the planted routes and objective
+    """
+    spec = (families or load_families())[family]
+    names = set(spec['params'])
+    rng = np.random.default_rng(seed)
+    single_vehicle = not names & {'num_vehicle', 'num_vehicles'}
+    multi_depot = 'starts' in names
+    with_service = 'service_time' in names
+    with_resources = 'depot_capacity' in names
+
+    d = (num_depots or min(4, max(2, n // 50))) if multi_depot else 1
+    if n <= d:
+        raise ValueError(f"{family} needs more than {d} nodes")
+    depots = list(range(d))
+    customers = list(range(d, n))
+    coordinates = rng.uniform(0, side, size=(n, 2))
+    matrix_list = euclidean_matrix(coordinates)
+    matrix = np.array(matrix_list)
+
+    if single_vehicle:
+        vehicles = 1
+    else:
+        vehicles = max(num_vehicle or math.ceil(len(customers) / customers_per_vehicle), d)
+    starts = [v % d for v in range(vehicles)]
+
+    # planted routes: customers go to their nearest depot, then each depot's customers are swept
+    nearest = np.argmin(matrix[np.ix_(customers, depots)], axis=1)
+    routes = [None] * vehicles
+    for depot in depots:
+        depot_vehicles = [v for v in range(vehicles) if starts[v] == depot]
+        depot_customers = [c for c, k in zip(customers, nearest) if k == depot]
+        for v, route in zip(depot_vehicles, _sweep_routes(coordinates, matrix, depot, depot_customers,
+                                                          len(depot_vehicles))):
+            routes[v] = route
+
+    pairs = []
+    for route in routes:
+        pairs += [[route[i], route[i + 1]] for i in range(0, len(route) - 1, 2)]
+
+    service = [0] * n
+    if with_service:
+        service = [0 if i in depots else int(s) for i, s in enumerate(rng.integers(1, max(2, side // 50), size=n))]
+    demands = [0 if i in depots else int(q) for i, q in enumerate(rng.integers(1, 10, size=n))]
+    capacity = math.ceil(max(sum(demands[c] for c in route) for route in routes) * (1 + slack))
+    distances = [_route_length(matrix, starts[v], routes[v], starts[v]) for v in range(vehicles)]
+
+    # prize collecting routes stop where the remaining distance budget ends, the rest is dropped
+    prizes = [0 if i in depots else int(p) for i, p in enumerate(rng.integers(1, max(2, side // 2), size=n))]
+    max_distance = max(1, int(max(distances) * (1 - slack)))
+    dropped = []
+    if 'prizes' in names:
+        for v, route in enumerate(routes):
+            keep = len(route)
+            while keep and _route_length(matrix, starts[v], route[:keep], starts[v]) > max_distance:
+                keep -= 1
+            dropped += route[keep:]
+            routes[v] = route[:keep]
+
+    # planted schedule: vehicles leave in waves of depot_capacity when the depot is a resource
+    load_time = unload_time = max(1, side // 100)
+    depot_capacity = max(1, vehicles // 2) if with_resources else vehicles
+    departures = [(v // depot_capacity) * load_time if with_resources else 0 for v in range(vehicles)]
+    arrival = {}
+    returns = []
+    for v, route in enumerate(routes):
+        t, previous = departures[v], starts[v]
+        for node in route:
+            t += int(matrix[previous][node]) + service[previous]
+            arrival[node] = t
+            previous = node
+        returns.append(t + int(matrix[previous][starts[v]]) + service[previous])
+    if with_resources:
+        returns = _schedule_ends(departures, returns, load_time, unload_time, depot_capacity)
+    horizon = max(returns) + unload_time
+
+    width = max(1, side // 5)
+    time_windows = []
+    for i in range(n):
+        if i in arrival:
+            early, late = rng.integers(0, width, size=2)
+            time_windows.append([max(0, arrival[i] - int(early)), arrival[i] + int(late)])
+        else:
+            # depots and customers dropped by the planted solution
+            time_windows.append([0, horizon])
+
+    objective = sum(_route_length(matrix, starts[v], routes[v], starts[v], service if with_service else None)
+                    for v in range(vehicles)) + sum(prizes[c] for c in dropped)
+    params = {
+        'distance_matrix': matrix_list,
+        'time_matrix': matrix_list,
+        'time_windows': time_windows,
+        'demands': demands,
+        'vehicle_capacities': [capacity] * vehicles,
+        'num_vehicle': vehicles,
+        'depot': 0,
+        'starts': starts,
+        'ends': list(starts),
+        'pickups_deliveries': pairs,
+        'prizes': prizes,
+        'max_distance': max_distance,
+        'distance_limit': math.ceil(max(distances) * (1 + slack)),
+        'duration_limit': math.ceil(horizon * (1 + slack)),
+        'service_time': service,
+        'vehicle_load_time': load_time,
+        'vehicle_unload_time': unload_time,
+        'depot_capacity': depot_capacity,
+    }
+    meta = {
+        'name': spec['name'],
+        'family': family,
+        'seed': seed,
+        'num_nodes': n,
+        'format': 'generated',
+        'planted_routes': [[starts[v]] + routes[v] + [starts[v]] for v in range(vehicles)],
+        'planted_objective': objective,
+    }
+    return params, meta
+
+
+def reference_objective(family, params, time_limit=60, metaheuristic='GUIDED_LOCAL_SEARCH', families=None):
+    """
+    Objective of a long run of the family's solver on params, with its search limits overridden.
+
+    Returns:
+        the objective as a float, or None when the solver failed or found no solution
+    """
+    from sandbox import run_batch
+    spec = (families or load_families())[family]
+    with open(spec['file'], 'r') as f:
+        source = f.read()
+    verdict = run_batch([source], params, timeout=2 * time_limit + 60,
+                        limits={'time_limit': time_limit, 'metaheuristic': metaheuristic})[0]
+    if verdict['status'] != 'ok':
+        return None
+    try:
+        obj = float(verdict['obj'])
+    except ValueError:
+        return None
+    return obj if obj >= 0 else None
+
+
+def make_problem(family, n, seed=0, time_limit=60, path=None, families=None, **kwargs):
+    """
+    Generate a problem usable directly by code_check.
+
+    The reference objective is the best of the planted solution and a long run of the family's solver.
+
+    Args:
+        family, n, seed, **kwargs: see generate
+        time_limit: time limit of the reference solve in seconds, 0 to only use the planted solution
+        path: save the problem in the instance format there, and return the params loaded from it
+
+    Returns:
+        (input, params_dict, optimal), like the problems modules
+    """
+    families = families or load_families()
+    spec = families[family]
+    superset, meta = generate(family, n, seed, families=families, **kwargs)
+    params = select_params(superset, spec['params'])
+    problem_input = {'problem': spec['name'], 'code_example': spec['template'], 'solver': 'OR-tools'}
+    meta['input'] = problem_input
+    if path is not None:
+        save_instance(path, params, meta)
+        params = load_instance(path)
+
+    optimal = meta['planted_objective']
+    solved = reference_objective(family, params, time_limit, families=families) if time_limit else None
+    if solved is not None:
+        optimal = min(optimal, solved)
+    if path is not None:
+        meta.update(solved_objective=solved, optimal=optimal)
+        save_instance(path, params, meta)
+        params = load_instance(path)
+    return problem_input, params, optimal
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate instances of the gene_codes problem families')
+    parser.add_argument('families', nargs='*', help='family abbreviations, all families by default')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200], help='numbers of nodes')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--time_limit', type=int, default=60, help='seconds of the reference solve, 0 to skip it')
+    parser.add_argument('--output_dir', type=str, default='./data/generated')
+    args = parser.parse_args()
+
+    families = load_families()
+    for family in args.families or list(families):
+        for n in args.sizes:
+            for seed in args.seeds:
+                path = os.path.join(args.output_dir, f"{family}-{n}-{seed}.inst")
+                _, _, optimal = make_problem(family, n, seed, args.time_limit, path, families)
+                print(json.dumps({'family': family, 'size': n, 'seed': seed, 'optimal': optimal, 'path': path}))
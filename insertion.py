@@ -0,0 +1,300 @@
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from routing_toolkit import cheapest_insertions, insert_request, model_from_params
+
+# Routes re-solved together with a request that fits nowhere in the plan: those where it is cheapest to insert.
+REOPTIMIZED_ROUTES = 3
+# Seconds the re-solve of those routes may take.
+REOPTIMIZATION_TIME_LIMIT = 1.
+
+
+class RoutePlan:
+    """
+    The routes of a routing problem, into which new requests are inserted without solving it again.
+
+    A request (a node, or a pickup and its delivery) goes where it adds the least cost and its route
+    still meets the capacities, the distance limit, the time windows and the duration limit; each
+    route keeps its earliest schedule, so most insertions are rejected from the arrival times alone
+    before the route is checked. Only when the request fits nowhere are the few routes where it is
+    cheapest re-solved with it by the routing solver.
+
+    Example:
+        model = RoutingModelBuilder(time_matrix, num_vehicle, depot=depot)
+        model.add_time_windows(time_windows)
+        model.add_pickups_deliveries(pickups_deliveries)
+        model.solve()
+        plan = RoutePlan(model, model.routes())
+        plan.insert(pickup, delivery)  # the vehicles whose routes changed
+    """
+
+    def __init__(self, model, routes):
+        """
+        Args:
+            model: the RoutingModelBuilder of the problem, whose matrix has the nodes of the new requests
+                too; it does not need to be built
+            routes: the node sequence of each vehicle, with or without its depots, e.g. model.routes()
+
+        Raises:
+            ValueError: the model shares depot resources between the routes, or the routes are not
+                one per vehicle or visit a node twice
+        """
+        if model.depot_resource is not None:
+            raise ValueError("depot resources are shared by all the routes, solve the model instead")
+        if len(routes) != model.num_vehicles:
+            raise ValueError(f"expected a route for each of the {model.num_vehicles} vehicles, got {len(routes)}")
+        self.model = model
+        self.costs = model.matrix if model.service_time is None else model.matrix + model.service_time[:, None]
+        self.pairs = list(model.pickups_deliveries)
+        self.timed = (model.time_windows is not None or model.duration_limit is not None)
+        if model.time_windows is not None:
+            self.windows = np.array(model.time_windows, dtype=np.int64)
+        else:
+            # without windows, a route starts at 0 and has no deadline
+            self.windows = np.tile(np.array([0, np.iinfo(np.int64).max // 4]), (model.num_nodes, 1))
+        # the routes end by the horizon of the model, unless the windows of their end depots apply
+        self.horizon = model._horizon()
+        self.routes = [[int(node) for node in route if node not in model.depots] for route in routes]
+        visits = [node for route in self.routes for node in route]
+        if len(set(visits)) != len(visits):
+            raise ValueError("a node is visited more than once")
+        self.visited = set(visits)
+        self.times = [self._schedule(vehicle, route) for vehicle, route in enumerate(self.routes)]
+
+    def path(self, vehicle, route=None):
+        """The node sequence of a vehicle's route, its start and end included."""
+        route = self.routes[vehicle] if route is None else route
+        return [self.model.starts[vehicle]] + route + [self.model.ends[vehicle]]
+
+    def cost(self):
+        """The total cost of the routes."""
+        return int(sum(self.costs[path[:-1], path[1:]].sum()
+                       for path in (np.array(self.path(vehicle)) for vehicle in range(len(self.routes)))))
+
+    def _schedule(self, vehicle, route):
+        """
+        The earliest time each node of a vehicle's path is served, or None when a window is missed.
+
+        The vehicle leaves when its start window opens and waits at the nodes it reaches early.
+        """
+        path = self.path(vehicle, route)
+        times = np.empty(len(path), dtype=np.int64)
+        time = self.windows[path[0]][0]
+        times[0] = time
+        for k in range(1, len(path)):
+            opens, closes = self.windows[path[k]]
+            if k == len(path) - 1 and not self.model.end_windows:
+                opens, closes = 0, self.horizon
+            time = max(time + self.costs[path[k - 1], path[k]], opens)
+            if time > closes:
+                return None
+            times[k] = time
+        return times
+
+    def fits(self, vehicle, route):
+        """Whether a vehicle's route meets the capacities, the distance limit, the time windows and the duration limit."""
+        model = self.model
+        path = np.array(self.path(vehicle, route))
+        for _, demands, capacities in model.capacities:
+            # the load on arrival at each node: the demands of the nodes before it
+            loads = np.cumsum(demands[path[:-1]])
+            if loads.min() < 0 or loads.max() > capacities[vehicle]:
+                return False
+        transits = self.costs[path[:-1], path[1:]]
+        if model.distance_limit is not None and transits.sum() > model.distance_limit:
+            return False
+        if not self.timed:
+            return True
+        times = self._schedule(vehicle, route)
+        if times is None:
+            return False
+        if model.duration_limit is not None:
+            # leave as late as the route allows without coming back later
+            latest = times[-1]
+            for k in range(len(path) - 2, -1, -1):
+                latest = min(self.windows[path[k]][1], latest - transits[k])
+            if times[-1] - latest > model.duration_limit:
+                return False
+        return True
+
+    def _set_route(self, vehicle, route):
+        self.visited.difference_update(self.routes[vehicle])
+        self.visited.update(route)
+        self.routes[vehicle] = route
+        self.times[vehicle] = self._schedule(vehicle, route)
+
+    def _reachable(self, node, delivery, vehicles, positions, deliveries):
+        """
+        Which insertions reach their node, and delivery, within its window, from the earliest schedules.
+
+        Inserting only delays the nodes after, so an insertion that misses a window here misses it anyway.
+        """
+        starts = np.cumsum([0] + [len(times) for times in self.times[:-1]])
+        times = np.concatenate(self.times)
+        nodes = np.concatenate([self.path(vehicle) for vehicle in range(len(self.routes))])
+        before = starts[vehicles] + positions
+        arrival = np.maximum(times[before] + self.costs[nodes[before], node], self.windows[node][0])
+        reachable = arrival <= self.windows[node][1]
+        if delivery is not None:
+            after = starts[vehicles] + deliveries
+            # right after the node, or after a later node of the route
+            arrival = np.where(deliveries == positions, arrival + self.costs[node, delivery],
+                               times[after] + self.costs[nodes[after], delivery])
+            reachable &= arrival <= self.windows[delivery][1]
+        return reachable
+
+    def insert(self, node, delivery=None, reoptimize=True, time_limit=REOPTIMIZATION_TIME_LIMIT):
+        """
+        Insert a request into the plan: a node, or a pickup and its delivery served by the same vehicle, pickup first.
+
+        The request goes where it adds the least cost and its route still meets the constraints. When it
+        fits nowhere, the REOPTIMIZED_ROUTES routes where it is cheapest to insert are re-solved with it,
+        starting from their current routes, for at most time_limit seconds.
+
+        Args:
+            node: the node of the request, or its pickup
+            delivery: the delivery of the pickup
+            reoptimize: re-solve the cheapest routes when the request fits nowhere
+            time_limit: seconds of the re-solve
+
+        Returns:
+            the vehicles whose routes changed, none when the request could not be inserted
+
+        Raises:
+            ValueError: a node of the request is a depot or is already in the plan
+        """
+        self._add_request(node, delivery)
+        paths = [self.path(vehicle) for vehicle in range(len(self.routes))]
+        _, vehicles, positions, deliveries = cheapest_insertions(self.costs, paths, node, delivery)
+        # routes that already miss a window cannot be checked from their schedule
+        if self.timed and all(times is not None for times in self.times):
+            reachable = self._reachable(node, delivery, vehicles, positions, deliveries)
+        else:
+            reachable = np.ones(len(vehicles), dtype=bool)
+        for vehicle, i, j in zip(vehicles[reachable], positions[reachable], deliveries[reachable]):
+            route = insert_request(self.routes[vehicle], node, i, delivery, j)
+            if self.fits(vehicle, route):
+                self._set_route(vehicle, route)
+                return [int(vehicle)]
+
+        if not reoptimize:
+            return []
+        return self.reoptimize(node, delivery, time_limit=time_limit)
+
+    def reoptimize(self, node, delivery=None, routes=REOPTIMIZED_ROUTES, time_limit=REOPTIMIZATION_TIME_LIMIT,
+                   profile='fast'):
+        """
+        Insert a request by re-solving it with the routes where it is cheapest to insert, from their current routes.
+
+        Args:
+            node: the node of the request, or its pickup
+            delivery: the delivery of the pickup
+            routes: the number of routes re-solved
+            time_limit: seconds of the re-solve
+            profile: the search profile of the re-solve, e.g. 'gls' to move the other nodes of the routes
+                out of the way of a request that fits nowhere
+
+        Returns:
+            the vehicles whose routes changed, none when the request could not be inserted
+
+        Raises:
+            ValueError: a node of the request is a depot or is already in the plan
+        """
+        request = self._add_request(node, delivery)
+        paths = [self.path(vehicle) for vehicle in range(len(self.routes))]
+        _, vehicles, _, _ = cheapest_insertions(self.costs, paths, node, delivery)
+        # the routes where the request is cheapest, in order, whether it fits there or not
+        nearest = list(dict.fromkeys(int(vehicle) for vehicle in vehicles))[:routes]
+        return nearest if self._reoptimize(nearest, request, time_limit, profile) else []
+
+    def _add_request(self, node, delivery):
+        """The nodes of a request, checked, its pair recorded."""
+        request = [node] if delivery is None else [node, delivery]
+        for n in request:
+            if n in self.model.depots or n in self.visited or not 0 <= n < self.model.num_nodes:
+                raise ValueError(f"node {n} is a depot, is already in the plan or is not a node of the model")
+        if delivery is not None and (node, delivery) not in self.pairs:
+            self.pairs.append((node, delivery))
+        return request
+
+    def replace(self, vehicle, route):
+        """
+        Give a vehicle a new route, e.g. one a search found; the nodes its old route leaves out leave the plan.
+
+        Raises:
+            ValueError: the route visits a depot, a node twice or a node of another route, or does not meet
+                the constraints
+        """
+        route = [int(node) for node in route]
+        others = self.visited.difference(self.routes[vehicle])
+        if (len(set(route)) != len(route) or others.intersection(route)
+                or any(node in self.model.depots for node in route)):
+            raise ValueError("the route visits a depot, a node twice or a node of another route")
+        if not self.fits(vehicle, route):
+            raise ValueError(f"the route does not meet the constraints of vehicle {vehicle}")
+        self._set_route(vehicle, route)
+
+    def _reoptimize(self, vehicles, request, time_limit, profile='fast'):
+        """Re-solve the routes of some vehicles with a request, from their current routes; whether it succeeded."""
+        model = self.model
+        nodes = sorted({model.starts[v] for v in vehicles} | {model.ends[v] for v in vehicles}
+                       | {node for v in vehicles for node in self.routes[v]} | set(request))
+        index = {node: k for k, node in enumerate(nodes)}
+        sub = model.sub_model(nodes, vehicles)
+        # the plan keeps every node it has, and the pairs inserted since the model was made
+        sub.prizes = None
+        pairs = [(index[p], index[d]) for p, d in self.pairs[len(model.pickups_deliveries):]
+                 if p in index and d in index]
+        if pairs:
+            sub.add_pickups_deliveries(pairs)
+        sub.add_initial_routes([[index[node] for node in self.routes[v]] for v in vehicles])
+        if sub.solve(profile=profile, time_limit=time_limit) < 0:
+            return False
+        for vehicle, route in zip(vehicles, sub.routes()):
+            self._set_route(vehicle, [nodes[k] for k in route[1:-1]])
+        return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Insert requests one at a time into the solution of an instance, '
+                                                 'timing each insertion')
+    parser.add_argument('instance', type=str, help='an instance directory, e.g. of generator.py')
+    parser.add_argument('--requests', type=int, default=20, help='requests taken out of the solution and inserted back')
+    parser.add_argument('--time_limit', type=float, default=10, help='seconds of the solve of the instance')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from instances import load_instance, read_meta
+    params = load_instance(args.instance)
+    model = model_from_params(params)
+    begin = time.perf_counter()
+    obj = model.solve(time_limit=args.time_limit)
+    solve_time = time.perf_counter() - begin
+    # without a solution, the plan is the planted solution of the generator
+    routes = model.routes() if obj >= 0 else read_meta(args.instance)['meta']['planted_routes']
+    print(f"{os.path.basename(os.path.normpath(args.instance))}: solve {obj} in {solve_time:.2f}s")
+
+    delivery_of = dict(model.pickups_deliveries)
+    pickups = [node for route in routes for node in route if node in delivery_of] if delivery_of else None
+    customers = pickups or [node for route in routes for node in route if node not in model.depots]
+    requests = random.Random(args.seed).sample(customers, min(args.requests, len(customers)))
+    removed = {node for pickup in requests for node in (pickup, delivery_of.get(pickup, pickup))}
+    plan = RoutePlan(model, [[node for node in route if node not in removed] for route in routes])
+    before = plan.cost()
+    timings, reoptimized, failed = [], 0, 0
+    for pickup in requests:
+        begin = time.perf_counter()
+        changed = plan.insert(pickup, delivery_of.get(pickup), reoptimize=False)
+        if not changed:
+            changed = plan.insert(pickup, delivery_of.get(pickup))
+            reoptimized += 1
+        failed += not changed
+        timings.append(time.perf_counter() - begin)
+    timings = np.array(timings) * 1000
+    print(f"{len(requests)} requests inserted into a plan of cost {before}: cost {plan.cost()}, "
+          f"median {np.median(timings):.2f}ms, max {timings.max():.2f}ms per request, "
+          f"{reoptimized} re-solved, {failed} not inserted")
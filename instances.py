@@ -0,0 +1,385 @@
+import copy
+import json
+import math
+import os
+import re
+import shutil
+import sys
+
+import numpy as np
+
+# Parameters holding a node x node matrix, which identifies a routing instance.
+MATRIX_KEYS = ['time_matrix', 'distance_matrix']
+# Parameters holding node indices.
+DEPOT_KEYS = ['depot']
+DEPOT_LIST_KEYS = ['starts', 'ends']
+PAIR_KEYS = ['pickups_deliveries']
+
+# Version of the on-disk instance layout written by save_instance.
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+# Names used by the solve signatures for the same data, mapped to the names used in instances.
+PARAM_ALIASES = {
+    'vehicle_capacity': 'vehicle_capacities',
+    'num_vehicles': 'num_vehicle',
+}
+
+
+def _is_square_matrix(value):
+    return (isinstance(value, (list, tuple)) and len(value) > 0
+            and all(isinstance(row, (list, tuple)) and len(row) == len(value) for row in value))
+
+
+def num_nodes(params):
+    """Number of nodes of a routing instance, or None when params do not describe one."""
+    sizes = {len(params[key]) for key in MATRIX_KEYS if key in params and _is_square_matrix(params[key])}
+    if len(sizes) != 1:
+        return None
+    return sizes.pop()
+
+
+def _is_node_vector(key, value, n):
+    # Per-vehicle lists can have the same length as the node list, so they are never remapped.
+    if 'vehicle' in key or 'capacit' in key or key in DEPOT_LIST_KEYS:
+        return False
+    return isinstance(value, (list, tuple)) and len(value) == n
+
+
+def smoke_nodes(params, size):
+    """Deterministically choose which nodes to keep: depots first, then whole pickup/delivery pairs, then the lowest indices."""
+    n = num_nodes(params)
+    keep = []
+    for key in DEPOT_KEYS:
+        if isinstance(params.get(key), int) and params[key] not in keep:
+            keep.append(params[key])
+    for key in DEPOT_LIST_KEYS:
+        for node in params.get(key, []):
+            if node not in keep:
+                keep.append(node)
+    pairs = [pair for key in PAIR_KEYS for pair in params.get(key, [])]
+    for i, (pickup, delivery) in enumerate(pairs):
+        # keep at least one pair so the precedence constraints are exercised
+        if i > 0 and len(keep) + 2 > size:
+            break
+        keep += [node for node in (pickup, delivery) if node not in keep]
+    paired = {node for pair in pairs for node in pair}
+    for node in range(n):
+        if len(keep) >= size:
+            break
+        if node not in keep and node not in paired:
+            keep.append(node)
+    return sorted(keep)
+
+
+def downsample_params(params, size=6):
+    """
+    Derive a small instance from the params of a routing problem, for a quick smoke run.
+
+    Matrices, node-indexed lists (demands, time windows, service times, prizes...), depots and
+    pickup/delivery pairs are restricted to a subset of nodes and re-indexed consistently.
+
+    Args:
+        params: the params_dict of the problem
+        size: the number of nodes to keep (depots and pairs may push it slightly above)
+
+    Returns:
+        the down-sampled params, or None if the params are not a routing instance or already small
+    """
+    n = num_nodes(params)
+    if n is None or n <= size:
+        return None
+    keep = smoke_nodes(params, size)
+    index = {node: i for i, node in enumerate(keep)}
+
+    small = {}
+    for key, value in params.items():
+        if key in MATRIX_KEYS:
+            small[key] = [[value[i][j] for j in keep] for i in keep]
+        elif key in DEPOT_KEYS and isinstance(value, int):
+            small[key] = index[value]
+        elif key in DEPOT_LIST_KEYS:
+            small[key] = [index[node] for node in value]
+        elif key in PAIR_KEYS:
+            small[key] = [[index[p], index[d]] for p, d in value if p in index and d in index]
+        elif _is_node_vector(key, value, n):
+            small[key] = [copy.deepcopy(value[i]) for i in keep]
+        elif (isinstance(value, int) and not isinstance(value, bool) and key.startswith('num_')
+              and 'vehicle' not in key and value == n):
+            small[key] = len(keep)
+        else:
+            small[key] = copy.deepcopy(value)
+    return small
+
+
+class InstanceParams(dict):
+    """A params_dict loaded from an instance directory, which sandbox workers can load from the same files."""
+
+    def __init__(self, params, path):
+        super().__init__(params)
+        self.path = path
+
+
+def _as_array(value):
+    """A compact numeric array for rectangular lists of numbers, None for anything else."""
+    if not isinstance(value, (list, tuple)) or len(value) == 0:
+        return None
+    try:
+        array = np.asarray(value)
+    except ValueError:
+        return None
+    if array.dtype.kind == 'b':
+        return None
+    if array.dtype.kind in 'iu':
+        if array.min() >= np.iinfo(np.int32).min and array.max() <= np.iinfo(np.int32).max:
+            return array.astype(np.int32)
+        return array.astype(np.int64)
+    if array.dtype.kind == 'f':
+        return array.astype(np.float64)
+    return None
+
+
+def save_instance(path, params, meta=None):
+    """
+    Save params in the instance format: a directory with meta.json and one .npy file per numeric array.
+
+    Arrays are stored uncompressed so they can be memory-mapped; scalars and ragged lists stay in meta.json.
+
+    Args:
+        path: the instance directory, replaced if it exists
+        params: the params_dict of the problem, in the order of the 'solve' arguments
+        meta: extra JSON-serializable information (name, optimum, source...)
+    """
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    description = {'version': FORMAT_VERSION, 'keys': list(params.keys()), 'arrays': {}, 'values': {},
+                   'meta': meta or {}}
+    saved = {}
+    for key, value in params.items():
+        # the same list under several names (e.g. distance_matrix and time_matrix) is stored once
+        if id(value) in saved:
+            description['arrays'][key] = saved[id(value)]
+            continue
+        array = _as_array(value)
+        if array is None:
+            description['values'][key] = value
+        else:
+            file_name = f"{len(saved)}.npy"
+            np.save(os.path.join(tmp_path, file_name), array, allow_pickle=False)
+            description['arrays'][key] = saved[id(value)] = file_name
+    with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+        json.dump(description, f)
+
+    # the directory is swapped in at once, readers never see a partially written instance
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE), 'r') as f:
+        description = json.load(f)
+    if description.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported instance format version {description.get('version')} in {path}")
+    return description
+
+
+def load_instance(path, as_lists=True):
+    """
+    Load an instance saved by save_instance.
+
+    Args:
+        path: the instance directory
+        as_lists: convert arrays to (nested) Python lists as the 'solve' functions expect; otherwise
+            arrays are read-only memory maps shared with every process loading the same files
+
+    Returns:
+        InstanceParams with the params in their original order
+    """
+    description = read_meta(path)
+    params = {}
+    for key in description['keys']:
+        if key in description['arrays']:
+            array = np.load(os.path.join(path, description['arrays'][key]), mmap_mode='r', allow_pickle=False)
+            params[key] = array.tolist() if as_lists else array
+        else:
+            params[key] = description['values'][key]
+    return InstanceParams(params, path)
+
+
+def select_params(instance, names):
+    """Pick the params of a 'solve' signature from an instance holding a superset of them, in signature order."""
+    params = {}
+    for name in names:
+        key = name if name in instance else PARAM_ALIASES.get(name, name)
+        if key not in instance:
+            raise KeyError(f"The instance has no parameter '{name}'")
+        params[name] = instance[key]
+    return params
+
+
+def from_problem_module(file_path):
+    """Import a problems/*.py module: returns (params, meta)."""
+    import importlib.util
+    module_name = os.path.splitext(os.path.basename(file_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    meta = {'source': os.path.basename(file_path), 'format': 'problem_module'}
+    if hasattr(module, 'input'):
+        meta['name'] = module.input['problem']
+    if hasattr(module, 'optimal'):
+        meta['optimal'] = module.optimal
+    return module.params_dict, meta
+
+
+def euclidean_matrix(coordinates, scale=1, rounding=round):
+    """Integer distance matrix of 2D coordinates, multiplied by scale before rounding."""
+    points = np.asarray(coordinates, dtype=np.float64)
+    distances = np.sqrt(((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=-1)) * scale
+    if rounding is round:
+        return np.rint(distances).astype(np.int64).tolist()
+    return np.vectorize(rounding, otypes=[np.int64])(distances).tolist()
+
+
+def _routing_params(coordinates, demands, time_windows, service_times, num_vehicle, capacity, scale):
+    """The superset of parameters the routing 'solve' signatures draw from."""
+    matrix = euclidean_matrix(coordinates, scale)
+    n = len(coordinates)
+    return {
+        'distance_matrix': matrix,
+        'time_matrix': matrix,
+        'time_windows': [[int(round(a * scale)), int(round(b * scale))] for a, b in time_windows],
+        'demands': [int(d) for d in demands],
+        'service_time': [int(round(s * scale)) for s in service_times],
+        'vehicle_capacities': [int(capacity)] * num_vehicle,
+        'num_vehicle': num_vehicle,
+        'depot': 0,
+        'coordinates': [[float(x), float(y)] for x, y in coordinates],
+        'num_nodes': n,
+    }
+
+
+def from_solomon(file_path, scale=1):
+    """Import a Solomon VRPTW instance (VEHICLE / CUSTOMER sections): returns (params, meta)."""
+    with open(file_path, 'r') as f:
+        lines = [line.split() for line in f if line.strip()]
+    name = ' '.join(lines[0])
+    vehicle_row = next(i for i, line in enumerate(lines) if line[0].upper() == 'VEHICLE')
+    num_vehicle, capacity = int(lines[vehicle_row + 2][0]), int(lines[vehicle_row + 2][1])
+    rows = [list(map(float, line)) for line in lines if re.fullmatch(r'\d+', line[0]) and len(line) >= 7]
+    coordinates = [(r[1], r[2]) for r in rows]
+    params = _routing_params(coordinates, [r[3] for r in rows], [(r[4], r[5]) for r in rows],
+                             [r[6] for r in rows], num_vehicle, capacity, scale)
+    return params, {'name': name, 'source': os.path.basename(file_path), 'format': 'solomon', 'scale': scale}
+
+
+def from_lilim(file_path, scale=1):
+    """Import a Li & Lim PDPTW instance (K Q S header, then task lines with pickup/delivery siblings)."""
+    with open(file_path, 'r') as f:
+        lines = [line.split() for line in f if line.strip()]
+    num_vehicle, capacity = int(lines[0][0]), int(lines[0][1])
+    rows = [list(map(float, line)) for line in lines[1:]]
+    coordinates = [(r[1], r[2]) for r in rows]
+    params = _routing_params(coordinates, [r[3] for r in rows], [(r[4], r[5]) for r in rows],
+                             [r[6] for r in rows], num_vehicle, capacity, scale)
+    # a pickup has a positive demand and the index of its delivery in the last column
+    params['pickups_deliveries'] = [[int(r[0]), int(r[8])] for r in rows if r[3] > 0 and r[8] > 0]
+    return params, {'name': os.path.splitext(os.path.basename(file_path))[0],
+                    'source': os.path.basename(file_path), 'format': 'lilim', 'scale': scale}
+
+
+def _explicit_matrix(weights, n, weight_format):
+    matrix = [[0] * n for _ in range(n)]
+    values = iter(weights)
+    for i in range(n):
+        if weight_format == 'FULL_MATRIX':
+            columns = range(n)
+        elif weight_format == 'LOWER_ROW':
+            columns = range(i)
+        elif weight_format == 'LOWER_DIAG_ROW':
+            columns = range(i + 1)
+        elif weight_format == 'UPPER_ROW':
+            columns = range(i + 1, n)
+        elif weight_format == 'UPPER_DIAG_ROW':
+            columns = range(i, n)
+        else:
+            raise ValueError(f"Unsupported EDGE_WEIGHT_FORMAT {weight_format}")
+        for j in columns:
+            matrix[i][j] = matrix[j][i] = int(round(float(next(values))))
+    return matrix
+
+
+def from_cvrplib(file_path, num_vehicle=None):
+    """Import a CVRPLIB (TSPLIB-style) .vrp instance: returns (params, meta)."""
+    header, sections, current = {}, {}, None
+    with open(file_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line == 'EOF':
+                continue
+            if ':' in line and not line[0].isdigit() and not line[0] == '-':
+                key, value = line.split(':', 1)
+                header[key.strip().upper()] = value.strip()
+                current = None
+            elif line.endswith('SECTION'):
+                current = line.upper()
+                sections[current] = []
+            elif current is not None:
+                sections[current] += line.split()
+
+    n = int(header['DIMENSION'])
+    if 'NODE_COORD_SECTION' in sections:
+        values = sections['NODE_COORD_SECTION']
+        coordinates = [(float(values[3 * i + 1]), float(values[3 * i + 2])) for i in range(n)]
+    else:
+        coordinates = None
+    if header.get('EDGE_WEIGHT_TYPE', 'EUC_2D') == 'EXPLICIT':
+        matrix = _explicit_matrix(sections['EDGE_WEIGHT_SECTION'], n, header.get('EDGE_WEIGHT_FORMAT', 'FULL_MATRIX'))
+    else:
+        # TSPLIB EUC_2D rounds to the nearest integer
+        matrix = euclidean_matrix(coordinates, rounding=lambda d: int(math.floor(d + 0.5)))
+
+    values = sections.get('DEMAND_SECTION', [])
+    demands = [int(values[2 * i + 1]) for i in range(n)] if values else [0] * n
+    depots = [int(v) - 1 for v in sections.get('DEPOT_SECTION', ['1']) if int(v) > 0]
+    if num_vehicle is None:
+        match = re.search(r'-k(\d+)', header.get('NAME', '')) or re.search(r'trucks:\s*(\d+)', header.get('COMMENT', ''))
+        num_vehicle = int(match.group(1)) if match else 1
+    capacity = int(header.get('CAPACITY', sum(demands) or 1))
+    params = {
+        'distance_matrix': matrix,
+        'time_matrix': matrix,
+        'demands': demands,
+        'vehicle_capacities': [capacity] * num_vehicle,
+        'num_vehicle': num_vehicle,
+        'depot': depots[0],
+        'num_nodes': n,
+    }
+    if coordinates is not None:
+        params['coordinates'] = [[x, y] for x, y in coordinates]
+    return params, {'name': header.get('NAME', os.path.basename(file_path)), 'source': os.path.basename(file_path),
+                    'format': 'cvrplib'}
+
+
+def import_instance(file_path, **kwargs):
+    """Import a problem module, Solomon, Li & Lim or CVRPLIB file, detecting the format from its content."""
+    if file_path.endswith('.py'):
+        return from_problem_module(file_path)
+    if file_path.endswith('.vrp'):
+        return from_cvrplib(file_path, **kwargs)
+    with open(file_path, 'r') as f:
+        text = f.read()
+    if re.search(r'^\s*VEHICLE\s*$', text, re.MULTILINE):
+        return from_solomon(file_path, **kwargs)
+    return from_lilim(file_path, **kwargs)
+
+
+if __name__ == "__main__":
+    # python instances.py <source file> <instance directory>
+    params, meta = import_instance(sys.argv[1])
+    save_instance(sys.argv[2], params, meta)
+    print(f"Saved {meta.get('name', sys.argv[1])} to {sys.argv[2]}: {list(params.keys())}")
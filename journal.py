@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+
+
+class Journal:
+    """
+    Append-only JSONL journal of an evaluation run.
+
+    Two kinds of records are written:
+        checkpoint : the state of a problem after each checked candidate, to resume it mid-way
+        outcome : the final result of a problem (status, iterations, LLM calls, tokens, wall time, objective)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # the last checkpoint written by this process for each problem
+        self.latest = {}
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # terminate a line truncated by a killed run, so the next record starts on its own line
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb+') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+    def append(self, record):
+        record = dict(record, time=time.time())
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def records(self):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a run killed while writing leaves a truncated last line
+                    continue
+        return records
+
+    def outcomes(self):
+        """The last outcome of each finished problem."""
+        return {r['problem']: r for r in self.records() if r['type'] == 'outcome'}
+
+    def checkpoints(self):
+        """The last checkpoint of each problem that has no outcome after it."""
+        checkpoints = {}
+        for r in self.records():
+            if r['type'] == 'checkpoint':
+                checkpoints[r['problem']] = r
+            elif r['type'] == 'outcome':
+                checkpoints.pop(r['problem'], None)
+        return checkpoints
+
+    def checkpoint(self, problem, iteration, state, no_run_time_error, context=None, usage=None):
+        self.latest[problem] = {
+            "type": "checkpoint",
+            "problem": problem,
+            "iteration": iteration,
+            "state": dump_state(state),
+            "no_run_time_error": no_run_time_error,
+            "context": context,
+            "usage": usage,
+        }
+        self.append(self.latest[problem])
+
+
+def dump_state(state):
+    """JSON-serializable copy of a GraphState."""
+    generation = state["generation"]
+    return {
+        "error": state["error"],
+        "messages": [list(m) if isinstance(m, tuple) else m for m in state["messages"]],
+        "generation": generation.dict() if hasattr(generation, 'dict') else generation,
+        "iterations": state["iterations"],
+        "solution": state.get("solution"),
+        "profile": state.get("profile"),
+    }
+
+
+def load_state(record, generation_cls):
+    """Rebuild a GraphState from dump_state, with the generation as an instance of generation_cls."""
+    state = {
+        "error": record["error"],
+        "messages": [tuple(m) if isinstance(m, list) else m for m in record["messages"]],
+        "generation": generation_cls(**record["generation"]),
+        "iterations": record["iterations"],
+    }
+    for key in ("solution", "profile"):
+        if record.get(key) is not None:
+            state[key] = record[key]
+    return state
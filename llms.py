@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import anthropic
+import openai
+from langchain_anthropic import ChatAnthropic
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+from langchain_ollama import ChatOllama
+from langchain_openai import ChatOpenAI
+
+from tracking import token_usage
+
+# Requests and tokens per minute allowed for each provider, or for a model when its name is a key,
+# shared by every model of the provider (or that model) in the process (None for no limit).
+# The defaults stay under the lowest published tiers of the hosted APIs.
+RATE_LIMITS = {
+    'anthropic': {'requests_per_minute': 50, 'tokens_per_minute': 40000},
+    'openai': {'requests_per_minute': 500, 'tokens_per_minute': 30000},
+    'ollama': None,
+}
+
+# Errors worth retrying: rate limits, server errors and lost connections (timeouts included)
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError,
+                    anthropic.RateLimitError, anthropic.InternalServerError, anthropic.APIConnectionError)
+MAX_ATTEMPTS = 5
+# Seconds a limiter waits after a rate limit error without a retry-after header
+RATE_LIMIT_PAUSE = 5.
+
+# Priorities of the calls waiting for a limiter: the highest is served first, and in arrival order among equals.
+GRADING_PRIORITY = 0
+GENERATION_PRIORITY = 1
+
+_priority = ContextVar("llm_priority", default=GENERATION_PRIORITY)
+_rate_limiters = {}
+
+
+@contextmanager
+def call_priority(priority):
+    """Queue the LLM calls made inside the context (and the tasks it starts) with this priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """A bucket of capacity units per minute, refilled continuously. Its level may go negative when overdrawn."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+
+class TokenBucketRateLimiter(BaseRateLimiter, BaseCallbackHandler):
+    """
+    Limits the requests and tokens per minute of the models sharing it, serving the waiting calls by priority.
+
+    A call takes one request from the request bucket before it is sent. The tokens of a call are only
+    known from its response, so they are drawn from the token bucket afterwards, through the callbacks
+    of the models; once it is overdrawn the next calls wait for it to refill. A rate limit error from
+    the provider pauses every call for the retry-after time it gives.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, check_every_n_seconds=0.05):
+        super().__init__()
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.check_every_n_seconds = check_every_n_seconds
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.arrivals = itertools.count()
+        self.paused_until = 0.
+
+    def _enqueue(self):
+        ticket = (-_priority.get(), next(self.arrivals))
+        with self.lock:
+            heapq.heappush(self.waiting, ticket)
+        return ticket
+
+    def _consume(self, ticket):
+        """Take a request for the ticket if it is first in line and the buckets allow it."""
+        with self.lock:
+            now = time.monotonic()
+            if self.waiting[0] != ticket or now < self.paused_until:
+                return False
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.refill(now)
+            if (self.requests is not None and self.requests.level < 1) or (
+                    self.tokens is not None and self.tokens.level <= 0):
+                return False
+            if self.requests is not None:
+                self.requests.level -= 1
+            heapq.heappop(self.waiting)
+            return True
+
+    def _dequeue(self, ticket):
+        with self.lock:
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+
+    def acquire(self, *, blocking=True):
+        ticket = self._enqueue()
+        try:
+            while not self._consume(ticket):
+                if not blocking:
+                    return False
+                time.sleep(self.check_every_n_seconds)
+            return True
+        finally:
+            self._dequeue(ticket)
+
+    async def aacquire(self, *, blocking=True):
+        ticket = self._enqueue()
+        try:
+            while not self._consume(ticket):
+                if not blocking:
+                    return False
+                await asyncio.sleep(self.check_every_n_seconds)
+            return True
+        finally:
+            self._dequeue(ticket)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def on_llm_end(self, response, **kwargs):
+        if self.tokens is not None:
+            with self.lock:
+                self.tokens.level -= sum(token_usage(response))
+
+    def on_llm_error(self, error, **kwargs):
+        if getattr(error, 'status_code', None) == 429:
+            headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+            try:
+                self.pause(float(headers.get('retry-after')))
+            except (TypeError, ValueError):
+                self.pause(RATE_LIMIT_PAUSE)
+
+
+def provider(llm):
+    """The provider serving a model name."""
+    if llm.startswith("gpt"):
+        return 'openai'
+    if llm.startswith("claude"):
+        return 'anthropic'
+    if llm.startswith("llama"):
+        return 'ollama'
+    raise NotImplementedError("llm not supported!")
+
+
+def set_rate_limit(name, requests_per_minute, tokens_per_minute=None):
+    """Change the rate limit of a provider, or of a single model, for the models created from now on."""
+    RATE_LIMITS[name] = {'requests_per_minute': requests_per_minute, 'tokens_per_minute': tokens_per_minute}
+    _rate_limiters.pop(name, None)
+
+
+def rate_limiter(llm):
+    """The rate limiter shared by a model with the others of its provider (or its own), or None when not limited."""
+    name = llm if llm in RATE_LIMITS else provider(llm)
+    limits = RATE_LIMITS.get(name)
+    if not limits:
+        return None
+    if name not in _rate_limiters:
+        _rate_limiters[name] = TokenBucketRateLimiter(limits.get('requests_per_minute'),
+                                                      limits.get('tokens_per_minute'))
+    return _rate_limiters[name]
+
+
+def chat_model(llm, max_tokens=5000):
+    """
+    The chat model of a model name, rate limited with the other models of its provider.
+
+    The clients do not retry by themselves, so the waits of a retry go through the limiter: wrap the
+    chains built on the model with retrying.
+    """
+    name = provider(llm)
+    limiter = rate_limiter(llm)
+    callbacks = [limiter] if limiter is not None else None
+    if name == 'openai':
+        return ChatOpenAI(model=llm, temperature=0.0, verbose=True, max_retries=0, rate_limiter=limiter,
+                          callbacks=callbacks)
+    if name == 'anthropic':
+        return ChatAnthropic(model=llm, temperature=0.0, max_tokens=max_tokens, max_retries=0,
+                             rate_limiter=limiter, callbacks=callbacks)
+    return ChatOllama(model=llm, temperature=0, rate_limiter=limiter, callbacks=callbacks)
+
+
+def retrying(chain):
+    """Retry a chain on rate limit, server and connection errors, with exponential backoff and jitter."""
+    return chain.with_retry(retry_if_exception_type=RETRYABLE_ERRORS, wait_exponential_jitter=True,
+                            stop_after_attempt=MAX_ATTEMPTS)
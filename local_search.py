@@ -0,0 +1,554 @@
+import argparse
+import itertools
+import os
+import random
+import time
+
+import numpy as np
+
+from insertion import RoutePlan
+from route_evaluator import RouteEvaluator
+from routing_toolkit import model_from_params, nearest_neighbors
+
+# Nearest customers of each customer that the moves pair it with.
+NEIGHBORS = 20
+# Improving moves checked against the constraints at once, cheapest first: the routes they make are
+# evaluated in one call of the route evaluator.
+MOVES_CHECKED = 64
+# Lengths of the segments of consecutive customers that Or-opt moves.
+SEGMENT_LENGTHS = (2, 3)
+# Customers a perturbation takes out around a random customer and inserts back, once the search is at
+# a local optimum: this share of the customers, and at least RUIN_MIN.
+RUIN_SHARE = 0.03
+RUIN_MIN = 5
+# Times each customer that fits nowhere may take the place of others before the search gives up
+# routing it (see LocalSearch._eject).
+EJECTIONS = 50
+# Customers the ejections may leave out for the routing solver to insert them: it re-solves, for each, the
+# routes nearest to it, for some seconds (see LocalSearch._repair). More are left to the perturbations.
+REPAIRED_CUSTOMERS = 2
+REPAIR_ROUTES = 4
+REPAIR_TIME_LIMIT = 2.
+# Seconds of the routing solver on the whole problem when the ejections leave customers out of the first
+# routes, from these routes and else from scratch (see LocalSearch._solver_routes).
+SOLVER_TIME_LIMIT = 5.
+
+# Kinds of moves: u goes after or before v; u and v swap; the route of u and v is reversed between
+# them; the routes of u and v exchange their ends after them; the segment from u goes after or before v.
+RELOCATE_AFTER, RELOCATE_BEFORE, SWAP, TWO_OPT, TWO_OPT_STAR, OR_OPT_AFTER, OR_OPT_BEFORE = range(7)
+# Route violations that make a move infeasible.
+_ROUTE_VIOLATIONS = ('depot_visits', 'load', 'distance', 'late', 'duration')
+
+
+class LocalSearch:
+    """
+    A local search over the routes of a routing problem on NumPy arrays, without the routing solver.
+
+    Each round computes the cost change of every relocate, swap, 2-opt, 2-opt* and Or-opt move between
+    a customer and its nearest neighbors at once, from arrays of the predecessor, successor and route
+    of each customer. The improving moves are then checked cheapest first, a batch at a time, by
+    evaluating the routes they make with RouteEvaluator, and those on routes no other move of the round
+    changed are applied. Capacities are checked on the route loads before that, so most infeasible
+    moves never reach the evaluator.
+
+    solve() builds routes by cheapest feasible insertion (see insertion.RoutePlan) and improves them
+    to a local optimum; with a deadline it then perturbs the best routes (a few nearby customers taken
+    out and inserted back) and improves them again until the deadline. polish() does the same from
+    given routes, e.g. those of the routing solver. The customers that fit nowhere take the place of
+    others, which then look for a place in turn, until all are routed (an ejection search); the last
+    few are inserted by re-solving the routes nearest to them with the routing solver. When some are
+    still left out of the first routes, the search starts from the routes of the routing solver instead.
+
+    It covers the problems without pickups and deliveries, prizes or depot resources: TSP, CVRP,
+    VRPTW and their variants with service times, distance and duration limits and multiple depots
+    (2-opt* only when the vehicles share their end).
+
+    Example:
+        search = LocalSearch(model_from_params(params))
+        obj = search.solve(time_limit=10)  # -1 when some customers could not be routed
+        search.routes()
+    """
+
+    def __init__(self, model, neighbors=NEIGHBORS, seed=0):
+        """
+        Args:
+            model: the RoutingModelBuilder of the problem; it is not built
+            neighbors: the number of nearest customers the moves pair each customer with
+            seed: the seed of the perturbations
+
+        Raises:
+            ValueError: the model has pickups and deliveries, prizes or depot resources
+        """
+        if model.pickups_deliveries or model.prizes is not None or model.depot_resource is not None:
+            raise ValueError("the local search does not handle pickups and deliveries, prizes or depot resources, "
+                             "solve the model instead")
+        self.model = model
+        self.evaluator = RouteEvaluator(model)
+        self.costs = self.evaluator.costs
+        self.customers = np.flatnonzero(~self.evaluator.is_depot)
+        self.neighbors = np.full((model.num_nodes, max(min(neighbors, len(self.customers) - 1), 0)), -1)
+        self.neighbors[self.customers] = nearest_neighbors(self.costs, neighbors, self.customers)
+        self.shared_end = len(set(model.ends)) == 1
+        self.random = random.Random(seed)
+        # how often each customer fitted nowhere, so the search takes out those that rarely do
+        self.failures = np.zeros(model.num_nodes, dtype=np.int64)
+        self.solution = None
+        self.missing = []
+        self.incumbents = []
+        self.moves = 0
+        self._started = None
+
+    def routes(self):
+        """The node sequence of each vehicle in the best solution, its start and end included."""
+        return [[self.model.starts[vehicle]] + route + [self.model.ends[vehicle]]
+                for vehicle, route in enumerate(self.solution)]
+
+    def cost(self, routes):
+        """The objective of routes of customers, one per vehicle."""
+        return int(self.evaluator.evaluate(self._pad([routes]))['objective'][0])
+
+    def _pad(self, route_sets):
+        """The route sets of customers as the array of RouteEvaluator.pack."""
+        width = max((len(route) for routes in route_sets for route in routes), default=0)
+        packed = np.full((len(route_sets), self.model.num_vehicles, max(width, 1)), -1, dtype=np.int64)
+        for s, routes in enumerate(route_sets):
+            for vehicle, route in enumerate(routes):
+                packed[s, vehicle, :len(route)] = route
+        return packed
+
+    def _index(self, routes):
+        """The arrays of the moves: the route, position, neighbors, cost and load so far of each customer."""
+        num_nodes, model = self.model.num_nodes, self.model
+        lengths = np.array([len(route) for route in routes])
+        flat = np.array([node for route in routes for node in route], dtype=np.int64)
+        vehicle = np.repeat(np.arange(len(routes)), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        position = np.arange(len(flat)) - offsets[vehicle]
+        before = np.empty_like(flat)
+        after = np.empty_like(flat)
+        before[1:], after[:-1] = flat[:-1], flat[1:]
+        first, last = position == 0, position == lengths[vehicle] - 1
+        before[first] = np.array(model.starts)[vehicle[first]]
+        after[last] = np.array(model.ends)[vehicle[last]]
+
+        def along(values):
+            # the sum of values along each route, up to each customer
+            sums = np.cumsum(values)
+            return sums - np.concatenate([[0], sums])[offsets][vehicle]
+
+        index = {'flat': flat, 'lengths': lengths, 'offsets': offsets}
+        for name, values in (('route', vehicle), ('position', position), ('prev', before), ('next', after),
+                             ('forward', along(self.costs[before, flat])),
+                             ('backward', along(self.costs[flat, before]))):
+            index[name] = np.full(num_nodes, -1, dtype=np.int64)
+            index[name][flat] = values
+        # the load of each route and along it, and the room left in each vehicle, for each capacity
+        index['capacities'] = []
+        for _, demands, capacities in self.model.capacities:
+            prefix = np.zeros(num_nodes, dtype=np.int64)
+            prefix[flat] = along(demands[flat])
+            loads = np.bincount(vehicle, weights=demands[flat], minlength=len(routes)).astype(np.int64)
+            index['capacities'].append((demands, prefix, loads, np.array(capacities) - loads))
+        return index
+
+    def _candidates(self, index):
+        """
+        The improving moves between each customer u and its neighbors v, cheapest first.
+
+        Only the total load of the routes is checked: it is their load at the end, so no feasible move
+        is left out.
+
+        Returns:
+            (delta, kind, u, v, segment length) arrays
+        """
+        c = self.costs
+        flat = index['flat']
+        if not len(flat) or not self.neighbors.shape[1]:
+            return tuple(np.empty(0, dtype=np.int64) for _ in range(5))
+        route, position, prev, next_ = index['route'], index['position'], index['prev'], index['next']
+        u = flat[:, None]
+        v = self.neighbors[flat]
+        ru, rv = route[u], route[v]
+        pu, nu, pv, nv = prev[u], next_[u], prev[v], next_[v]
+        same = ru == rv
+        routed = rv >= 0
+        found = []
+
+        def add(kind, delta, valid, length=0):
+            i, j = np.nonzero(valid & routed & (delta < 0))
+            found.append((delta[i, j], np.full(len(i), kind), flat[i], v[i, j], np.full(len(i), length)))
+
+        def fits(loads_u, loads_v=None):
+            # whether the route of v has room for loads_u, in place of loads_v that the route of u takes then
+            room = np.ones(same.shape, dtype=bool)
+            for k, (_, _, _, left) in enumerate(index['capacities']):
+                if loads_v is None:
+                    room &= loads_u[k] <= left[rv]
+                else:
+                    room &= (loads_u[k] - loads_v[k] <= left[rv]) & (loads_v[k] - loads_u[k] <= left[ru])
+            return same | room
+
+        demands_u = [demands[u] for demands, _, _, _ in index['capacities']]
+        demands_v = [demands[v] for demands, _, _, _ in index['capacities']]
+        gain = c[pu, u] + c[u, nu] - c[pu, nu]
+        moves_in = fits(demands_u)
+        add(RELOCATE_AFTER, c[v, u] + c[u, nv] - c[v, nv] - gain, moves_in & (v != pu))
+        add(RELOCATE_BEFORE, c[pv, u] + c[u, v] - c[pv, v] - gain, moves_in & (v != nu))
+        add(SWAP, c[pu, v] + c[v, nu] + c[pv, u] + c[u, nv] - c[pu, u] - c[u, nu] - c[pv, v] - c[v, nv],
+            fits(demands_u, demands_v) & (v != nu) & (v != pu))
+        # the arcs between the successor of u and v are reversed, which changes their cost on asymmetric matrices
+        forward, backward = index['forward'], index['backward']
+        reversal = (backward[v] - backward[nu]) - (forward[v] - forward[nu])
+        add(TWO_OPT, c[u, v] + c[nu, nv] - c[u, nu] - c[v, nv] + reversal,
+            same & (position[u] < position[v]) & (v != nu))
+        if self.shared_end:
+            # the route of u takes the nodes after v, and that of v the nodes after u
+            tails_u = [loads[ru] - prefix[u] for _, prefix, loads, _ in index['capacities']]
+            tails_v = [loads[rv] - prefix[v] for _, prefix, loads, _ in index['capacities']]
+            add(TWO_OPT_STAR, c[u, nv] + c[v, nu] - c[u, nu] - c[v, nv], ~same & fits(tails_u, tails_v))
+
+        ends = np.arange(len(flat))[:, None]
+        for length in SEGMENT_LENGTHS:
+            # the segment of length nodes from u to w, followed by q
+            whole = position[u] + length <= index['lengths'][ru]
+            w = flat[np.minimum(ends + length - 1, len(flat) - 1)]
+            q = next_[w]
+            inside = same & (position[v] >= position[u]) & (position[v] < position[u] + length)
+            loads = [prefix[w] - prefix[u] + demands[u] for demands, prefix, _, _ in index['capacities']]
+            valid = whole & ~inside & fits(loads)
+            segment_gain = c[pu, u] + c[w, q] - c[pu, q]
+            add(OR_OPT_AFTER, c[v, u] + c[w, nv] - c[v, nv] - segment_gain, valid & (v != pu), length)
+            add(OR_OPT_BEFORE, c[pv, u] + c[w, v] - c[pv, v] - segment_gain, valid & (v != q), length)
+
+        delta, kind, us, vs, lengths = (np.concatenate(column) for column in zip(*found))
+        order = np.argsort(delta, kind='stable')
+        return delta[order], kind[order], us[order], vs[order], lengths[order]
+
+    @staticmethod
+    def _moved(routes, index, kind, u, v, length):
+        """The routes a move changes, {vehicle: its new route}."""
+        ru, rv = int(index['route'][u]), int(index['route'][v])
+        i, j = int(index['position'][u]), int(index['position'][v])
+        a, b = routes[ru], routes[rv]
+        if kind == SWAP:
+            if ru == rv:
+                a = list(a)
+                a[i], a[j] = v, u
+                return {ru: a}
+            return {ru: a[:i] + [v] + a[i + 1:], rv: b[:j] + [u] + b[j + 1:]}
+        if kind == TWO_OPT:
+            return {ru: a[:i + 1] + a[i + 1:j + 1][::-1] + a[j + 1:]}
+        if kind == TWO_OPT_STAR:
+            return {ru: a[:i + 1] + b[j + 1:], rv: b[:j + 1] + a[i + 1:]}
+        length = length if kind in (OR_OPT_AFTER, OR_OPT_BEFORE) else 1
+        segment, rest = a[i:i + length], a[:i] + a[i + length:]
+        target = rest if ru == rv else b
+        at = target.index(v) + (kind in (RELOCATE_AFTER, OR_OPT_AFTER))
+        target = target[:at] + segment + target[at:]
+        return {ru: target} if ru == rv else {ru: rest, rv: target}
+
+    def _evaluate(self, vehicles, routes):
+        """The cost of routes of vehicles, and whether they meet the constraints."""
+        nodes = np.full((len(routes), max(max((len(route) for route in routes), default=0), 1)), -1, dtype=np.int64)
+        for k, route in enumerate(routes):
+            nodes[k, :len(route)] = route
+        result = self.evaluator.evaluate_routes(np.array(vehicles, dtype=np.int64), nodes)
+        feasible = np.ones(len(routes), dtype=bool)
+        for name in _ROUTE_VIOLATIONS:
+            feasible &= result[name] == 0
+        return result['cost'], feasible
+
+    def improve(self, routes, deadline=None):
+        """
+        The routes improved by the moves until none improves them, or the deadline.
+
+        Args:
+            routes: the customers of each vehicle, in order, meeting the constraints
+            deadline: a time.monotonic() time to stop at
+
+        Returns:
+            the new routes
+        """
+        routes = [list(route) for route in routes]
+        while deadline is None or time.monotonic() < deadline:
+            index = self._index(routes)
+            costs, _ = self._evaluate(range(len(routes)), routes)
+            delta, kind, us, vs, lengths = self._candidates(index)
+            # moves are applied on routes no other move of the round changed, so their arrays still hold
+            touched = np.zeros(len(routes), dtype=bool)
+            for begin in range(0, len(delta), MOVES_CHECKED):
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                chunk = np.arange(begin, min(begin + MOVES_CHECKED, len(delta)))
+                chunk = chunk[~touched[index['route'][us[chunk]]] & ~touched[index['route'][vs[chunk]]]]
+                if not len(chunk):
+                    continue
+                moves = [self._moved(routes, index, kind[k], us[k], vs[k], lengths[k]) for k in chunk]
+                vehicles = [vehicle for move in moves for vehicle in move]
+                new_costs, feasible = self._evaluate(vehicles, [route for move in moves for route in move.values()])
+                k = 0
+                for move in moves:
+                    changed = list(move)
+                    ok = feasible[k:k + len(changed)].all()
+                    gain = new_costs[k:k + len(changed)].sum() - costs[changed].sum()
+                    k += len(changed)
+                    if ok and gain < 0 and not touched[changed].any():
+                        touched[changed] = True
+                        for vehicle, route in move.items():
+                            routes[vehicle] = route
+                        self.moves += 1
+            if not touched.any():
+                break
+        return routes
+
+    def _perturb(self, routes, missing):
+        """The routes with a few nearby customers taken out and inserted back, and the customers that fit nowhere."""
+        routed = [node for route in routes for node in route]
+        if not routed:
+            return routes, missing
+        size = max(RUIN_MIN, int(RUIN_SHARE * len(self.customers)))
+        # around a customer that fits nowhere yet, to make room for it
+        center = self.random.choice(missing or routed)
+        removed = {center} | {int(node) for node in self.neighbors[center][:size - 1]}
+        plan = RoutePlan(self.model, [[node for node in route if node not in removed] for route in routes])
+        removed = list(removed - set(missing))
+        self.random.shuffle(removed)
+        # the customers that fit nowhere go first, while the routes have the most room
+        return self._fill(plan, list(missing) + removed)
+
+    def _fill(self, plan, nodes):
+        """Insert nodes into a plan where each is cheapest; the routes of the plan and the nodes that fit nowhere."""
+        missing = [node for node in nodes if not plan.insert(int(node), reoptimize=False)]
+        return plan.routes, missing
+
+    def _eject(self, routes, missing, deadline=None):
+        """
+        Route the customers that fit nowhere by taking out others in their place.
+
+        A customer that fits nowhere goes next to one of its nearest customers in place of one of them, or
+        two when one is not enough: those that fitted nowhere least often so far, then the cheapest. They
+        are then inserted where they fit, or take the place of others in turn. A customer that fits nowhere
+        takes the place of others at most EJECTIONS times.
+
+        Returns:
+            the routes, and the customers that still fit nowhere
+        """
+        plan = RoutePlan(self.model, routes)
+        pool = list(missing)
+        for _ in range(EJECTIONS * len(missing)):
+            if not pool or (deadline is not None and time.monotonic() >= deadline):
+                break
+            node = pool.pop(0)
+            if plan.insert(node, reoptimize=False):
+                continue
+            self.failures[node] += 1
+            ejection = self._ejection(plan, node)
+            if ejection is None:
+                pool.append(node)
+                continue
+            vehicle, ejected, route = ejection
+            try:
+                plan.replace(vehicle, route)
+            except ValueError:
+                # the plan checks the route on its own schedule, which may be stricter
+                pool.append(node)
+                continue
+            pool += ejected
+        return plan.routes, pool
+
+    def _repair(self, routes, missing, deadline=None):
+        """
+        Route the customers that fit nowhere by re-solving, for each, the REPAIR_ROUTES routes where it is
+        cheapest to insert with it: the guided local search of the routing solver moves the other customers
+        of these routes out of its way, which one or two ejections at a time cannot.
+
+        Returns:
+            the routes, and the customers that still fit nowhere
+        """
+        plan = RoutePlan(self.model, routes)
+        left = []
+        for node in missing:
+            time_limit = REPAIR_TIME_LIMIT
+            if deadline is not None:
+                time_limit = min(time_limit, deadline - time.monotonic())
+            if time_limit <= 0 or not plan.reoptimize(node, routes=REPAIR_ROUTES, time_limit=time_limit,
+                                                      profile='gls'):
+                left.append(node)
+        return plan.routes, left
+
+    def _solver_routes(self, routes, missing, deadline=None):
+        """
+        The routes of the routing solver on the whole problem, from routes that leave customers out, or else
+        from scratch: its first solution heuristics route the customers of tight windows the ejections cannot.
+
+        Returns:
+            the routes, and the customers they leave out: those given when the solver found no solution
+        """
+        model = self.model
+        for initial_routes in (routes, None):
+            time_limit = SOLVER_TIME_LIMIT
+            if deadline is not None:
+                time_limit = min(time_limit, deadline - time.monotonic())
+            if time_limit <= 0:
+                break
+            whole = model.sub_model(range(model.num_nodes), range(model.num_vehicles))
+            if whole.add_initial_routes(initial_routes).solve(time_limit=time_limit) >= 0:
+                return [route[1:-1] for route in whole.routes()], []
+        return routes, missing
+
+    def _ejection(self, plan, node):
+        """
+        The best route a customer makes in place of one or two of its nearest customers, next to one of them.
+
+        Returns:
+            (vehicle, customers taken out, route), None when there is none that meets the constraints
+        """
+        near = {int(customer) for customer in self.neighbors[node]}
+        if plan.timed and all(times is not None for times in plan.times):
+            # and the customers served around its window, which its route must reach it after or leave it for
+            opens, closes = plan.windows[node]
+            width = closes - opens
+            for times, route in zip(plan.times, plan.routes):
+                near.update(customer for customer, served in zip(route, times[1:-1])
+                            if opens - width <= served <= closes + width)
+        current, _ = self._evaluate(range(len(plan.routes)), plan.routes)
+        for size in (1, 2):
+            candidates = []
+            for vehicle, route in enumerate(plan.routes):
+                nearby = [customer for customer in route if customer in near]
+                for ejected in itertools.combinations(nearby, size):
+                    rest = [customer for customer in route if customer not in ejected]
+                    positions = {k + after for k, customer in enumerate(rest) if customer in near for after in (0, 1)}
+                    candidates += [(vehicle, list(ejected), rest[:at] + [node] + rest[at:]) for at in sorted(positions)]
+            if not candidates:
+                return None
+            costs, feasible = self._evaluate([vehicle for vehicle, _, _ in candidates],
+                                             [route for _, _, route in candidates])
+            if feasible.any():
+                best = min(np.flatnonzero(feasible), key=lambda k: (self.failures[candidates[k][1]].sum(),
+                                                                     costs[k] - current[candidates[k][0]]))
+                return candidates[best]
+        return None
+
+    def _record(self, objective):
+        self.incumbents.append((time.monotonic() - self._started, objective))
+
+    def construct(self):
+        """
+        Routes built by inserting the customers where each is cheapest: tightest time window first with
+        time windows, farthest from the depot first otherwise.
+
+        Returns:
+            the routes, and the customers that fit nowhere
+        """
+        model = self.model
+        if model.time_windows is not None:
+            windows = np.array(model.time_windows, dtype=np.int64)[self.customers]
+            order = self.customers[np.lexsort((windows[:, 1], windows[:, 1] - windows[:, 0]))]
+        else:
+            order = self.customers[np.argsort(-self.costs[model.starts[0], self.customers], kind='stable')]
+        return self._fill(RoutePlan(model, [[] for _ in range(model.num_vehicles)]), order)
+
+    def solve(self, time_limit=None, deadline=None):
+        """
+        Build routes and improve them; with a time limit or deadline, perturb and improve the best
+        routes until then (an iterated local search). The first routes take at most half of the time,
+        the routing solver the rest when they leave customers out.
+
+        Args:
+            time_limit: seconds of the search
+            deadline: a time.monotonic() time to stop at, for searches sharing a budget
+
+        Returns:
+            the objective of the routes, -1 when some customers could not be routed
+        """
+        self._started = time.monotonic()
+        self.incumbents = []
+        if time_limit is not None:
+            deadline = min(deadline or np.inf, self._started + time_limit)
+        first = None if deadline is None else (self._started + deadline) / 2
+        routes, missing = self._complete(*self.construct(), first)
+        if missing:
+            routes, missing = self._solver_routes(routes, missing, deadline)
+        return self._search(routes, missing, None, deadline)
+
+    def polish(self, routes, time_limit=None, deadline=None):
+        """
+        Improve routes, e.g. those of RoutingModelBuilder.routes(), like solve() does its own.
+
+        Args:
+            routes: the node sequence of each vehicle, with or without its depots, meeting the constraints
+            time_limit: seconds of the search
+            deadline: a time.monotonic() time to stop at
+
+        Returns:
+            the objective of the routes, -1 when some customers could not be routed
+        """
+        self._started = time.monotonic()
+        self.incumbents = []
+        plan = RoutePlan(self.model, routes)
+        routes, missing = self._fill(plan, [node for node in self.customers if node not in plan.visited])
+        return self._search(routes, missing, time_limit, deadline)
+
+    def _search(self, routes, missing, time_limit, deadline):
+        """Improve routes to a local optimum, then perturb them until the deadline, keeping the best."""
+        if time_limit is not None:
+            deadline = min(deadline or np.inf, self._started + time_limit)
+        routes, missing = self._complete(routes, missing, deadline)
+        best = current = (len(missing), self.cost(routes), routes, missing)
+        self._record(-1 if missing else best[1])
+        while deadline is not None and time.monotonic() < deadline:
+            routes, missing = self._complete(*self._perturb(current[2], current[3]), deadline)
+            candidate = (len(missing), self.cost(routes), routes, missing)
+            # equal objectives are accepted, to move across plateaus, and any cost while customers fit nowhere
+            if candidate[:2] <= current[:2] or candidate[0] == current[0] > 0:
+                current = candidate
+            if candidate[:2] < best[:2]:
+                best = candidate
+                self._record(-1 if missing else best[1])
+        self.solution, self.missing = best[2], best[3]
+        return -1 if self.missing else best[1]
+
+    def _complete(self, routes, missing, deadline):
+        """
+        Improve routes to a local optimum, then route the customers that fit nowhere by ejections, the last
+        REPAIRED_CUSTOMERS of them by re-solving the routes nearest to them, and again.
+        """
+        routes = self.improve(routes, deadline)
+        if missing:
+            routes, missing = self._eject(routes, missing, deadline)
+            if 0 < len(missing) <= REPAIRED_CUSTOMERS:
+                routes, missing = self._repair(routes, missing, deadline)
+            routes = self.improve(routes, deadline)
+        return routes, missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the local search with the routing solver on instances: '
+                                                 'solving alone, and polishing the routes of the solver')
+    parser.add_argument('instances', type=str, nargs='+', help='instance directories, e.g. of generator.py')
+    parser.add_argument('--time_limit', type=float, default=10, help='seconds of each search')
+    parser.add_argument('--profile', type=str, default='gls', help='search profile of the routing solver')
+    parser.add_argument('--neighbors', type=int, default=NEIGHBORS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from instances import load_instance
+    print(f"{'instance':<36} {'solver':>10} {'local':>10} {'polished':>10}   seconds (solver / local / polish)")
+    for instance in args.instances:
+        params = load_instance(instance)
+        model = model_from_params(params)
+        begin = time.perf_counter()
+        solver = model.solve(profile=args.profile, time_limit=args.time_limit)
+        solver_time = time.perf_counter() - begin
+        search = LocalSearch(model_from_params(params), args.neighbors, args.seed)
+        begin = time.perf_counter()
+        local = search.solve(time_limit=args.time_limit)
+        local_time = time.perf_counter() - begin
+        polished, polish_time = -1, 0.
+        if solver >= 0:
+            begin = time.perf_counter()
+            polished = search.polish(model.routes(), time_limit=args.time_limit)
+            polish_time = time.perf_counter() - begin
+        print(f"{os.path.basename(os.path.normpath(instance)):<36} {solver:>10} {local:>10} {polished:>10}   "
+              f"{solver_time:.1f} / {local_time:.1f} / {polish_time:.1f}")
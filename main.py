@@ -1,10 +1,15 @@
 import argparse
+import asyncio
 import os
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
 from common import get_dataset
 from DRoC import System
-from utils import context_all
-from standard import run
+from utils import context_all, GENE_CODES_DIR
+from standard import run, arun
+from llms import set_rate_limit
+from journal import Journal
+from tracking import track_usage
+from report import markdown_report, problem_rows, summarize
 
 
 def parse_args() -> argparse.Namespace:
@@ -26,14 +31,32 @@ def parse_args() -> argparse.Namespace:
                         help='Ending index in the dataset')
     parser.add_argument('--skip_existing', action='store_true',
                         help='Skip problems that already have generated solutions')
+    parser.add_argument('--journal', type=str, default=None,
+                        help='JSONL journal of per-problem outcomes (default: <output_dir>/journal.jsonl)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume from the journal: skip finished problems and continue interrupted ones')
 
     # System configuration
     parser.add_argument('--output_dir', type=str, default='generated_codes',
                         help='Directory to save generated code')
     parser.add_argument('--max_iterations', type=int, default=4,
                         help='Maximum number of refinement iterations')
+    parser.add_argument('--profile_hint', action='store_true',
+                        help='Tell the LLM when building the model, not solving it, is the bottleneck')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream the generated code, checking it as it arrives and aborting it once it is malformed')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Number of problems solved concurrently on an asyncio event loop')
+    parser.add_argument('--rate_limit', type=str, action='append', default=[],
+                        help='Requests[:tokens] per minute of a provider or model, e.g. anthropic=50:40000 (repeatable)')
 
     args = parser.parse_args()
+    if args.journal is None:
+        args.journal = os.path.join(args.output_dir, 'journal.jsonl')
+    for rate_limit in args.rate_limit:
+        name, limits = rate_limit.split('=')
+        requests_per_minute, _, tokens_per_minute = limits.partition(':')
+        set_rate_limit(name, float(requests_per_minute), float(tokens_per_minute) if tokens_per_minute else None)
     return args
 
 
@@ -60,23 +83,35 @@ def get_problem_indices(args: argparse.Namespace, total_problems: int) -> Tuple[
     return start_idx, end_idx
 
 
-def run_evaluation(args: argparse.Namespace,
-                   names: List[str],
-                   params: List[Dict],
-                   inputs: List[Dict],
-                   optimums: List[float],
-                   method: str) -> Tuple[List[str], List[str], List[str]]:
-    """Run the evaluation process for the specified problems."""
-    successful_tasks = []
-    runtime_error_tasks = []
-    error_tasks = []
+def tally_outcome(record: Dict, successful_tasks: List[str], runtime_error_tasks: List[str],
+                  error_tasks: List[str]) -> None:
+    """Add a journaled outcome to the result lists."""
+    if record['status'] == 'success':
+        successful_tasks.append(record['problem'])
+    elif record['status'] == 'runtime_error':
+        runtime_error_tasks.append(record['problem'])
+    elif record['status'] == 'error':
+        runtime_error_tasks.append(record['problem'])
+        error_tasks.append(record['problem'])
+
+
+def pending_problems(args: argparse.Namespace, names: List[str], journal: Journal,
+                     successful_tasks: List[str], runtime_error_tasks: List[str],
+                     error_tasks: List[str]) -> List[Tuple[int, Optional[Dict]]]:
+    """The index and checkpoint of each problem to evaluate; problems finished in the journal are tallied."""
+    outcomes = journal.outcomes() if args.resume else {}
+    checkpoints = journal.checkpoints() if args.resume else {}
 
     existing_solutions = []
     if args.skip_existing:
-        existing_solutions = [f.split('.')[0] for f in os.listdir(args.output_dir)]
+        # generated codes are saved to GENE_CODES_DIR by write_code_to_file
+        for directory in (args.output_dir, GENE_CODES_DIR):
+            if os.path.exists(directory):
+                existing_solutions += [os.path.splitext(f)[0] for f in os.listdir(directory)]
 
     start_idx, end_idx = get_problem_indices(args, len(names))
 
+    pending = []
     for i in range(start_idx, end_idx):
         problem_name = names[i]
 
@@ -84,35 +119,158 @@ def run_evaluation(args: argparse.Namespace,
             print(f"Skipping {problem_name} - solution already exists")
             continue
 
+        if problem_name in outcomes:
+            print(f"Skipping {problem_name} - outcome already in the journal")
+            tally_outcome(outcomes[problem_name], successful_tasks, runtime_error_tasks, error_tasks)
+            continue
+
+        pending.append((i, checkpoints.get(problem_name)))
+    return pending
+
+
+def start_problem(args: argparse.Namespace, problem_name: str, input: Dict, optimum: float, method: str,
+                  checkpoint: Optional[Dict]) -> Tuple[Dict, Dict]:
+    """The input of a problem and its outcome record."""
+    if checkpoint is not None:
+        print(f"-----Resuming task: {problem_name} after iteration {checkpoint['iteration']}-----")
+    else:
         print(f"-----Testing task: {problem_name}-----")
 
-        # Prepare input
-        current_input = inputs[i].copy()
-        current_input['solver'] = args.solver
-        current_input['optimum'] = optimums[i]
+    # Prepare input
+    current_input = input.copy()
+    current_input['solver'] = args.solver
+    current_input['optimum'] = optimum
+
+    record = {"type": "outcome", "problem": problem_name, "method": method, "llm": args.llm,
+              "optimal": optimum}
+    return current_input, record
+
+
+def set_status(record: Dict, no_runtime_error: bool, accurate: bool) -> None:
+    if accurate:
+        record['status'] = 'success'
+    elif no_runtime_error:
+        record['status'] = 'inaccurate'
+    else:
+        record['status'] = 'runtime_error'
+
+
+def finish_problem(record: Dict, journal: Journal, checkpoint: Optional[Dict], usage) -> Dict:
+    """Complete the outcome record from the last checkpoint and the usage, and journal it."""
+    last = journal.latest.get(record['problem'], checkpoint)
+    record['iterations'] = last['iteration'] if last is not None else 0
+    record['objective'] = last['state']['solution'] if last is not None else None
+    record.update(usage.snapshot())
+    journal.append(record)
+    return record
 
+
+def evaluate_problem(args: argparse.Namespace, problem_name: str, params: Dict, input: Dict, optimum: float,
+                     method: str, journal: Journal, checkpoint: Optional[Dict]) -> Dict:
+    """Solve one problem with the method, and journal its outcome record."""
+    current_input, record = start_problem(args, problem_name, input, optimum, method, checkpoint)
+    with track_usage(checkpoint['usage'] if checkpoint is not None else None) as usage:
         try:
             if method == 'DRoC':
-                system = System(current_input, params[i], args.llm)
+                system = System(current_input, params, args.llm)
                 system.max_iteration = args.max_iterations
-                no_runtime_error, accurate = system.run()
+                system.profile_hint = args.profile_hint
+                system.stream = args.stream
+                system.journal = journal
+                no_runtime_error, accurate = system.run(checkpoint)
             elif method == 'standard':
-                no_runtime_error, accurate = run(params[i], current_input, optimums[i], args.llm,
-                                                 max_iterations=args.max_iterations, self_debug=False)
+                no_runtime_error, accurate = run(params, current_input, optimum, args.llm,
+                                                 max_iterations=args.max_iterations, self_debug=False,
+                                                 profile_hint=args.profile_hint, stream=args.stream,
+                                                 journal=journal, checkpoint=checkpoint)
             elif method == 'self_debug':
-                no_runtime_error, accurate = run(params[i], current_input, optimums[i], args.llm,
-                                                 max_iterations=args.max_iterations, self_debug=True)
+                no_runtime_error, accurate = run(params, current_input, optimum, args.llm,
+                                                 max_iterations=args.max_iterations, self_debug=True,
+                                                 profile_hint=args.profile_hint, stream=args.stream,
+                                                 journal=journal, checkpoint=checkpoint)
             else:
                 raise ValueError(f"Invalid method: {method}")
+            set_status(record, no_runtime_error, accurate)
+        except Exception as e:
+            print(f"Error in task {problem_name}: {str(e)}")
+            record['status'] = 'error'
+            record['error'] = str(e)
+    return finish_problem(record, journal, checkpoint, usage)
 
-            if not no_runtime_error:
-                runtime_error_tasks.append(problem_name)
-            if accurate:
-                successful_tasks.append(problem_name)
+
+async def aevaluate_problem(args: argparse.Namespace, problem_name: str, params: Dict, input: Dict,
+                            optimum: float, method: str, journal: Journal, checkpoint: Optional[Dict]) -> Dict:
+    """Async variant of evaluate_problem."""
+    current_input, record = start_problem(args, problem_name, input, optimum, method, checkpoint)
+    # each problem runs in its own task, so its tracker only sees its own LLM calls
+    with track_usage(checkpoint['usage'] if checkpoint is not None else None) as usage:
+        try:
+            if method == 'DRoC':
+                # loading the vector stores of the retriever tool blocks
+                system = await asyncio.to_thread(System, current_input, params, args.llm)
+                system.max_iteration = args.max_iterations
+                system.profile_hint = args.profile_hint
+                system.stream = args.stream
+                system.journal = journal
+                no_runtime_error, accurate = await system.arun(checkpoint)
+            elif method in ('standard', 'self_debug'):
+                no_runtime_error, accurate = await arun(params, current_input, optimum, args.llm,
+                                                        max_iterations=args.max_iterations,
+                                                        self_debug=method == 'self_debug',
+                                                        profile_hint=args.profile_hint, stream=args.stream,
+                                                        journal=journal, checkpoint=checkpoint)
+            else:
+                raise ValueError(f"Invalid method: {method}")
+            set_status(record, no_runtime_error, accurate)
         except Exception as e:
             print(f"Error in task {problem_name}: {str(e)}")
-            runtime_error_tasks.append(problem_name)
-            error_tasks.append(problem_name)
+            record['status'] = 'error'
+            record['error'] = str(e)
+    return finish_problem(record, journal, checkpoint, usage)
+
+
+def run_evaluation(args: argparse.Namespace,
+                   names: List[str],
+                   params: List[Dict],
+                   inputs: List[Dict],
+                   optimums: List[float],
+                   method: str) -> Tuple[List[str], List[str], List[str]]:
+    """Run the evaluation process for the specified problems."""
+    successful_tasks = []
+    runtime_error_tasks = []
+    error_tasks = []
+
+    journal = Journal(args.journal)
+    for i, checkpoint in pending_problems(args, names, journal, successful_tasks, runtime_error_tasks, error_tasks):
+        record = evaluate_problem(args, names[i], params[i], inputs[i], optimums[i], method, journal, checkpoint)
+        tally_outcome(record, successful_tasks, runtime_error_tasks, error_tasks)
+
+    return successful_tasks, runtime_error_tasks, error_tasks
+
+
+async def arun_evaluation(args: argparse.Namespace,
+                          names: List[str],
+                          params: List[Dict],
+                          inputs: List[Dict],
+                          optimums: List[float],
+                          method: str) -> Tuple[List[str], List[str], List[str]]:
+    """Run the evaluation of the specified problems concurrently on one event loop, args.concurrency at a time."""
+    successful_tasks = []
+    runtime_error_tasks = []
+    error_tasks = []
+
+    journal = Journal(args.journal)
+    pending = pending_problems(args, names, journal, successful_tasks, runtime_error_tasks, error_tasks)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def evaluate(i, checkpoint):
+        async with semaphore:
+            # the params are only loaded once the problem starts
+            return await aevaluate_problem(args, names[i], params[i], inputs[i], optimums[i], method, journal,
+                                           checkpoint)
+
+    for record in await asyncio.gather(*[evaluate(i, checkpoint) for i, checkpoint in pending]):
+        tally_outcome(record, successful_tasks, runtime_error_tasks, error_tasks)
 
     return successful_tasks, runtime_error_tasks, error_tasks
 
@@ -125,12 +283,17 @@ def main():
     setup_environment(args)
 
     # Load dataset
-    names, params, inputs, optimums = get_dataset()
+    names, params, inputs, optimums = get_dataset(lazy=True)
 
     # Run evaluation
-    successful_tasks, runtime_error_tasks, error_tasks = run_evaluation(
-        args, names, params, inputs, optimums, args.method
-    )
+    if args.concurrency > 1:
+        successful_tasks, runtime_error_tasks, error_tasks = asyncio.run(arun_evaluation(
+            args, names, params, inputs, optimums, args.method
+        ))
+    else:
+        successful_tasks, runtime_error_tasks, error_tasks = run_evaluation(
+            args, names, params, inputs, optimums, args.method
+        )
 
     # Print results
     total_problems = len(names)
@@ -145,6 +308,13 @@ def main():
     if runtime_error_tasks:
         print("\nTasks with runtime errors:", runtime_error_tasks)
 
+    # Latency, token and gap metrics of every problem in the journal
+    rows = problem_rows(args.journal)
+    report_path = os.path.join(args.output_dir, 'report.md')
+    with open(report_path, 'w') as f:
+        f.write(markdown_report(rows, summarize(rows)) + '\n')
+    print(f"\nReport written to {report_path}")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sandbox import run_batch
+
+# Search strategies of the portfolio, in the order the workers get them: each pairs a first solution
+# strategy with a metaheuristic (names of routing_enums_pb2), so the workers start from different
+# solutions and explore differently. The routing search has no random seed, so two workers with the
+# same strategy would find the same solutions: there are at most as many workers as strategies.
+PORTFOLIO = [
+    {'first_solution': 'PATH_CHEAPEST_ARC', 'metaheuristic': 'GUIDED_LOCAL_SEARCH'},
+    {'first_solution': 'PARALLEL_CHEAPEST_INSERTION', 'metaheuristic': 'GUIDED_LOCAL_SEARCH'},
+    {'first_solution': 'SAVINGS', 'metaheuristic': 'SIMULATED_ANNEALING'},
+    {'first_solution': 'PATH_CHEAPEST_ARC', 'metaheuristic': 'TABU_SEARCH'},
+    {'first_solution': 'LOCAL_CHEAPEST_INSERTION', 'metaheuristic': 'GUIDED_LOCAL_SEARCH'},
+    {'first_solution': 'CHRISTOFIDES', 'metaheuristic': 'SIMULATED_ANNEALING'},
+    {'first_solution': 'GLOBAL_CHEAPEST_ARC', 'metaheuristic': 'GUIDED_LOCAL_SEARCH'},
+    {'first_solution': 'PATH_MOST_CONSTRAINED_ARC', 'metaheuristic': 'TABU_SEARCH'},
+]
+# Seconds a worker may take past the deadline to build its model and report, before it is killed.
+GRACE_PERIOD = 30
+
+
+def available_cores():
+    """The cores this process may run on (fewer than the machine's in a container or under taskset)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def objective(verdict):
+    """The objective of a worker's verdict, or None when it failed or found no solution."""
+    if verdict['status'] != 'ok':
+        return None
+    try:
+        obj = float(verdict['obj'])
+    except ValueError:
+        return None
+    return obj if obj >= 0 else None
+
+
+def merge_incumbents(runs):
+    """The incumbents of the portfolio: the better solutions found by any worker, in time order."""
+    found = sorted(incumbent for run in runs for incumbent in (run.get('profile') or {}).get('incumbents') or [])
+    merged = []
+    for at, obj in found:
+        if not merged or obj < merged[-1][1]:
+            merged.append([at, obj])
+    return merged
+
+
+def solve_portfolio(source, params, time_limit, workers=None, portfolio=PORTFOLIO):
+    """
+    Run a routing solver in parallel processes with different search strategies, up to a shared deadline.
+
+    Each worker runs the solver in its own sandbox process, with the first solution strategy, the
+    metaheuristic and the time limit of its routing searches overridden (see sandbox.SearchLimits).
+    The workers start together and stop at the same deadline; the best objective any of them found
+    is returned.
+
+    Args:
+        source: the code of a solver whose 'solve' uses the routing solver, e.g. a gene_codes file
+        params: the params_dict of the problem; when loaded with instances.load_instance, the workers
+            read the same files instead of a copy each
+        time_limit: seconds from now to the deadline
+        workers: the number of processes, by default one per core, at most one per strategy
+        portfolio: the strategies, see PORTFOLIO
+
+    Returns:
+        {"obj": the best objective or None, "strategy": the strategy that found it, "incumbents": the
+        merged incumbents of the workers, "runs": the verdict of each worker, with its "strategy"}
+    """
+    workers = min(workers or available_cores(), len(portfolio))
+    deadline = time.monotonic() + time_limit
+
+    def run(strategy):
+        limits = dict(strategy, time_limit=max(deadline - time.monotonic(), 0.1))
+        verdict = run_batch([source], params, timeout=time_limit + GRACE_PERIOD, limits=limits)[0]
+        verdict['strategy'] = strategy
+        return verdict
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        runs = list(executor.map(run, portfolio[:workers]))
+
+    solved = [run for run in runs if objective(run) is not None]
+    best = min(solved, key=objective) if solved else None
+    return {
+        'obj': objective(best) if best else None,
+        'strategy': best['strategy'] if best else None,
+        'incumbents': merge_incumbents(runs),
+        'runs': runs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Solve a problem with a portfolio of parallel routing searches')
+    parser.add_argument('solver', type=str, help='the file of the solver, e.g. a gene_codes file')
+    parser.add_argument('instance', type=str, help='the problem params, as an instance directory or a JSON file')
+    parser.add_argument('--time_limit', type=float, default=10)
+    parser.add_argument('--workers', type=int, help='number of processes, one per core by default')
+    args = parser.parse_args()
+
+    with open(args.solver, 'r') as f:
+        code = f.read()
+    if os.path.isdir(args.instance):
+        from instances import load_instance
+        params = load_instance(args.instance)
+    else:
+        with open(args.instance, 'r') as f:
+            params = json.load(f)
+    result = solve_portfolio(code, params, args.time_limit, args.workers)
+    for run in result['runs']:
+        print(f"{run['strategy']['first_solution']} + {run['strategy']['metaheuristic']}: "
+              f"{objective(run) if objective(run) is not None else run['status']}")
+    print(f"Best objective: {result['obj']} ({result['strategy']})")
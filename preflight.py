@@ -0,0 +1,377 @@
+import ast
+import builtins
+import difflib
+import functools
+import importlib
+import importlib.machinery
+import importlib.util
+import sys
+
+
+class StaticCheckError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return f'StaticCheckError: {self.message}'
+
+
+# Solver modules whose attributes are checked against the installed package.
+API_MODULES = [
+    'ortools.constraint_solver.pywrapcp',
+    'ortools.constraint_solver.routing_enums_pb2',
+    'ortools.sat.python.cp_model',
+    'ortools.linear_solver.pywraplp',
+]
+
+# Classes whose instances are tracked, so method calls on them can be checked.
+API_CLASSES = {
+    'ortools.constraint_solver.pywrapcp': ['RoutingIndexManager', 'RoutingModel', 'RoutingDimension', 'Assignment'],
+    'ortools.sat.python.cp_model': ['CpModel', 'CpSolver'],
+    'ortools.linear_solver.pywraplp': ['Solver'],
+}
+
+# Factory methods returning an instance of a tracked class: (module, class, method) -> class.
+API_FACTORIES = {
+    ('ortools.linear_solver.pywraplp', 'Solver', 'CreateSolver'): 'Solver',
+    ('ortools.constraint_solver.pywrapcp', 'RoutingModel', 'GetDimensionOrDie'): 'RoutingDimension',
+    ('ortools.constraint_solver.pywrapcp', 'RoutingModel', 'SolveWithParameters'): 'Assignment',
+    ('ortools.constraint_solver.pywrapcp', 'RoutingModel', 'Solve'): 'Assignment',
+}
+
+MODULE_GLOBALS = {'__name__', '__file__', '__doc__', '__builtins__', '__spec__', '__loader__', '__package__'}
+
+
+def _routing_instances(module):
+    """Throwaway instances of the routing classes, made on a model of 2 nodes."""
+    manager = module.RoutingIndexManager(2, 1, 0)
+    routing = module.RoutingModel(manager)
+    routing.AddConstantDimension(1, 10, True, 'time')
+    return {'RoutingIndexManager': manager, 'RoutingModel': routing,
+            'RoutingDimension': routing.GetDimensionOrDie('time'), 'Assignment': routing.Solve()}
+
+
+# Makers of throwaway instances of the tracked classes: instances get attributes their class does not list
+# (set in __init__, or resolved dynamically), so the attributes of tracked objects are looked up on them.
+API_INSTANCES = {
+    'ortools.constraint_solver.pywrapcp': _routing_instances,
+    'ortools.sat.python.cp_model': lambda module: {'CpModel': module.CpModel(), 'CpSolver': module.CpSolver()},
+    'ortools.linear_solver.pywraplp': lambda module: {'Solver': module.Solver.CreateSolver('GLOP')},
+}
+
+
+@functools.lru_cache(maxsize=None)
+def api_table(module_path):
+    """
+    Introspect a solver module once; returns None when it is not installed.
+
+    Returns:
+        a dict of the module ('__module__'), its tracked classes ('classes') and an instance of each of them
+        ('instances'), without the classes whose instances could not be made
+    """
+    try:
+        module = importlib.import_module(module_path)
+    except Exception:
+        return None
+    classes = {name: getattr(module, name) for name in API_CLASSES.get(module_path, []) if hasattr(module, name)}
+    try:
+        instances = API_INSTANCES[module_path](module) if module_path in API_INSTANCES else {}
+    except Exception:
+        instances = {}
+    return {'__module__': module, 'classes': classes,
+            'instances': {name: instance for name, instance in instances.items() if instance is not None}}
+
+
+def _missing(obj, name):
+    """Whether an object certainly has no attribute of a name: looking it up raises AttributeError."""
+    try:
+        getattr(obj, name)
+    except AttributeError:
+        return True
+    except Exception:
+        return False
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def find_module(name):
+    """Resolve a dotted module name to a spec without executing any package code."""
+    if name in sys.modules:
+        return True
+    parts = name.split('.')
+    try:
+        spec = importlib.util.find_spec(parts[0])
+        for i in range(1, len(parts)):
+            if spec is None or spec.submodule_search_locations is None:
+                return False
+            spec = importlib.machinery.PathFinder.find_spec('.'.join(parts[:i + 1]), spec.submodule_search_locations)
+    except (ImportError, ValueError):
+        return False
+    return spec is not None
+
+
+def check_imports(imports):
+    """
+    Validate the import block of a candidate without executing it.
+
+    Modules are resolved with find_spec, so nothing is imported into the orchestrator;
+    the imports themselves only run inside the sandbox subprocess.
+
+    Raises:
+        SyntaxError: the import block cannot be parsed
+        ImportError: a module cannot be found
+    """
+    tree = ast.parse(imports)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if not find_module(alias.name):
+                    raise ModuleNotFoundError(f"No module named '{alias.name}'", name=alias.name)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                raise ImportError("attempted relative import, use absolute imports only")
+            if not find_module(node.module):
+                raise ModuleNotFoundError(f"No module named '{node.module}'", name=node.module)
+            module = sys.modules.get(node.module)
+            if module is None:
+                continue
+            # Only modules the orchestrator already imported can have their names checked for free
+            for alias in node.names:
+                if (alias.name != '*' and not hasattr(module, alias.name)
+                        and not find_module(node.module + '.' + alias.name)):
+                    raise ImportError(f"cannot import name '{alias.name}' from '{node.module}'")
+
+
+def _suggest(name, obj):
+    matches = difflib.get_close_matches(name, [c for c in dir(obj) if not c.startswith('_')], n=1)
+    return f" Did you mean '{matches[0]}'?" if matches else ""
+
+
+def _module_aliases(tree):
+    """Map local names to the API modules they are bound to by import statements."""
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name in API_MODULES and alias.asname:
+                    aliases[alias.asname] = alias.name
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                full_name = node.module + '.' + alias.name
+                if full_name in API_MODULES:
+                    aliases[alias.asname or alias.name] = full_name
+    return aliases
+
+
+def _call_type(node, aliases, types):
+    """Return (module, class) of the object a call expression creates, if it is tracked."""
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+        return None
+    func = node.func
+    # module.Class(...)
+    if isinstance(func.value, ast.Name) and func.value.id in aliases:
+        module_path = aliases[func.value.id]
+        if func.attr in API_CLASSES.get(module_path, []):
+            return module_path, func.attr
+        return None
+    # module.Class.factory(...)
+    if (isinstance(func.value, ast.Attribute) and isinstance(func.value.value, ast.Name)
+            and func.value.value.id in aliases):
+        key = (aliases[func.value.value.id], func.value.attr, func.attr)
+        if key in API_FACTORIES:
+            return key[0], API_FACTORIES[key]
+        return None
+    # instance.factory(...)
+    if isinstance(func.value, ast.Name) and types.get(func.value.id):
+        module_path, cls_name = types[func.value.id]
+        key = (module_path, cls_name, func.attr)
+        if key in API_FACTORIES:
+            return module_path, API_FACTORIES[key]
+    return None
+
+
+def _instance_types(tree, aliases):
+    """Infer the tracked class of names that are only ever assigned from one constructor."""
+    types = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, (ast.AnnAssign, ast.AugAssign)) and node.value is not None:
+            targets, value = [node.target], node.value
+        else:
+            continue
+        inferred = _call_type(value, aliases, types)
+        for target in targets:
+            if not isinstance(target, ast.Name):
+                for sub in ast.walk(target):
+                    if isinstance(sub, ast.Name):
+                        types[sub.id] = None
+                continue
+            if target.id in types and types[target.id] != inferred:
+                types[target.id] = None
+            else:
+                types[target.id] = inferred
+    return {name: t for name, t in types.items() if t is not None}
+
+
+def _stored_attributes(tree):
+    """The attributes the code itself sets on names, e.g. 'solver.verbose = True', as (name, attribute) pairs."""
+    return {(node.value.id, node.attr) for node in ast.walk(tree)
+            if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+            and not isinstance(node.ctx, ast.Load)}
+
+
+def check_api_usage(tree):
+    """
+    Check attribute access on solver modules and tracked solver objects.
+
+    Only the attributes that certainly do not exist are reported: those the module, the class, or an
+    instance of the class made in api_table fails to look up; objects of classes without an instance
+    are not checked.
+    """
+    problems = []
+    aliases = _module_aliases(tree)
+    if not aliases:
+        return problems
+    types = _instance_types(tree, aliases)
+    stored = _stored_attributes(tree)
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Attribute) or not isinstance(node.value, (ast.Name, ast.Attribute)):
+            continue
+        value = node.value
+        if isinstance(value, ast.Name) and value.id in aliases:
+            table = api_table(aliases[value.id])
+            if table is not None and _missing(table['__module__'], node.attr):
+                problems.append(f"line {node.lineno}: '{value.id}.{node.attr}' does not exist in "
+                                f"{aliases[value.id]}.{_suggest(node.attr, table['__module__'])}")
+        elif isinstance(value, ast.Name) and value.id in types:
+            module_path, cls_name = types[value.id]
+            table = api_table(module_path)
+            instance = table['instances'].get(cls_name) if table is not None else None
+            if (instance is not None and (value.id, node.attr) not in stored
+                    and _missing(instance, node.attr)):
+                problems.append(f"line {node.lineno}: '{value.id}.{node.attr}' is not an attribute of "
+                                f"{cls_name}.{_suggest(node.attr, instance)}")
+        elif (isinstance(value, ast.Attribute) and isinstance(value.value, ast.Name)
+              and value.value.id in aliases and value.attr in API_CLASSES.get(aliases[value.value.id], [])):
+            table = api_table(aliases[value.value.id])
+            cls = table['classes'].get(value.attr) if table is not None else None
+            if cls is not None and _missing(cls, node.attr):
+                problems.append(f"line {node.lineno}: '{value.value.id}.{value.attr}.{node.attr}' is not an "
+                                f"attribute of {value.attr}.{_suggest(node.attr, cls)}")
+    return problems
+
+
+def _bound_names(tree):
+    """Collect every name bound anywhere in the module (scopes are flattened on purpose)."""
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                bound.add(alias.asname or alias.name.split('.')[0])
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name == '*':
+                    return None
+                bound.add(alias.asname or alias.name)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bound.add(node.id)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            bound.add(node.rest)
+    return bound
+
+
+def check_unresolved_names(tree):
+    bound = _bound_names(tree)
+    if bound is None:
+        return []
+    known = bound | set(dir(builtins)) | MODULE_GLOBALS
+    problems = []
+    reported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known:
+            if node.id not in reported:
+                reported.add(node.id)
+                problems.append(f"line {node.lineno}: name '{node.id}' is not defined or imported.")
+    return problems
+
+
+def _returns_value(func_def):
+    """Whether a function body (excluding nested functions) returns a value."""
+    stack = list(func_def.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(node, ast.Return) and node.value is not None:
+            return True
+        stack.extend(ast.iter_child_nodes(node))
+    return False
+
+
+def find_solve(tree):
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'solve':
+            return node
+    return None
+
+
+def template_params(template):
+    """Parameter names of the 'solve' function in a code template, or None if it cannot be parsed."""
+    try:
+        solve = find_solve(ast.parse(template))
+    except (SyntaxError, ValueError, TypeError):
+        return None
+    if solve is None:
+        return None
+    return [arg.arg for arg in solve.args.posonlyargs + solve.args.args]
+
+
+def check_solve(tree, expected_params=None):
+    solve = find_solve(tree)
+    if solve is None:
+        return ["You did not define a top-level 'solve' function; the solution must be returned by 'solve'."]
+    problems = []
+    if expected_params is not None:
+        args = solve.args.posonlyargs + solve.args.args
+        names = [arg.arg for arg in args]
+        required = names[:len(names) - len(solve.args.defaults)]
+        if names[:len(expected_params)] != list(expected_params) or len(required) > len(expected_params):
+            problems.append(f"The signature of 'solve' does not match the template: expected "
+                            f"solve({', '.join(expected_params)}), got solve({', '.join(names)}).")
+    if not _returns_value(solve):
+        problems.append("The 'solve' function never returns a value; return the objective value at the end.")
+    return problems
+
+
+def preflight_check(source, expected_params=None):
+    """
+    Static analysis of a candidate program before it is executed.
+
+    Args:
+        source: the imports and code of the candidate
+        expected_params: parameter names 'solve' must accept, in order (skipped when None)
+
+    Raises:
+        StaticCheckError: listing every problem found
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        raise StaticCheckError(f"Syntax error at line {e.lineno}: {e.msg}: {(e.text or '').strip()}")
+
+    problems = check_solve(tree, expected_params)
+    problems += check_unresolved_names(tree)
+    problems += check_api_usage(tree)
+    if problems:
+        raise StaticCheckError("\n".join(problems))
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import json
+import math
+from collections import Counter
+
+from journal import Journal
+
+# Per-problem fields of the outcome records, in the order of the CSV columns.
+FIELDS = ['problem', 'status', 'iterations', 'objective', 'optimal', 'gap', 'llm_calls', 'input_tokens',
+          'output_tokens', 'wall_time', 'llm_time', 'retrieval_time', 'sandbox_time', 'other_time']
+# Times whose distribution over the problems is reported.
+TIMES = ['wall_time', 'llm_time', 'retrieval_time', 'sandbox_time', 'other_time']
+STATUSES = ['success', 'inaccurate', 'runtime_error', 'error']
+
+
+def gap(objective, optimal):
+    """Relative gap of an objective to the optimum, or None when either is missing or not a number."""
+    try:
+        objective, optimal = float(objective), float(optimal)
+    except (TypeError, ValueError):
+        return None
+    if optimal == 0:
+        return None
+    return abs(objective - optimal) / abs(optimal)
+
+
+def problem_rows(path):
+    """One row per problem of a journal, from its last outcome record."""
+    rows = []
+    for record in Journal(path).outcomes().values():
+        row = {field: record.get(field) for field in FIELDS}
+        row['gap'] = gap(record.get('objective'), record.get('optimal'))
+        measured = sum(record.get(key) or 0. for key in ('llm_time', 'retrieval_time', 'sandbox_time'))
+        # the time left is spent in prompts, parsing and the journal
+        row['other_time'] = round(max((record.get('wall_time') or 0.) - measured, 0.), 3)
+        rows.append(row)
+    return rows
+
+
+def percentile(values, q):
+    """The q-th percentile of values, linearly interpolated."""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    low, high = math.floor(position), math.ceil(position)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def distribution(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {
+        'mean': round(sum(values) / len(values), 4),
+        'p50': round(percentile(values, 50), 4),
+        'p90': round(percentile(values, 90), 4),
+        'p99': round(percentile(values, 99), 4),
+        'max': round(max(values), 4),
+        'total': round(sum(values), 4),
+    }
+
+
+def summarize(rows):
+    """Aggregate metrics of the problems of a run."""
+    statuses = Counter(row['status'] for row in rows)
+    successes = statuses['success']
+    total = len(rows)
+    per_success = None
+    if successes:
+        per_success = {key: round(sum(row[key] or 0 for row in rows) / successes, 1)
+                       for key in ('llm_calls', 'input_tokens', 'output_tokens')}
+    return {
+        'problems': total,
+        'statuses': {status: statuses[status] for status in STATUSES},
+        'success_rate': round(successes / total, 4) if total else None,
+        'times': {key: distribution(row[key] for row in rows) for key in TIMES},
+        'per_success': per_success,
+        'iterations_to_success': dict(sorted(Counter(row['iterations'] for row in rows
+                                                     if row['status'] == 'success').items())),
+        'gap': distribution(row['gap'] for row in rows),
+    }
+
+
+def diff(rows, baseline_rows):
+    """
+    Compare a run with a baseline run.
+
+    Returns:
+        {"changed": problems whose status changed, "summary": the difference of the aggregate metrics}
+    """
+    baseline = {row['problem']: row for row in baseline_rows}
+    changed = []
+    for row in rows:
+        old = baseline.get(row['problem'])
+        if old is not None and old['status'] != row['status']:
+            changed.append({'problem': row['problem'], 'before': old['status'], 'after': row['status']})
+    summary, baseline_summary = summarize(rows), summarize(baseline_rows)
+    delta = {
+        'success_rate': _delta(summary['success_rate'], baseline_summary['success_rate']),
+        'statuses': {s: summary['statuses'][s] - baseline_summary['statuses'][s] for s in STATUSES},
+        'times': {key: _delta((summary['times'][key] or {}).get('p50'), (baseline_summary['times'][key] or {}).get('p50'))
+                  for key in TIMES},
+        'per_success': {key: _delta((summary['per_success'] or {}).get(key),
+                                    (baseline_summary['per_success'] or {}).get(key))
+                        for key in ('llm_calls', 'input_tokens', 'output_tokens')},
+        'gap': _delta((summary['gap'] or {}).get('mean'), (baseline_summary['gap'] or {}).get('mean')),
+    }
+    return {'changed': changed, 'summary': delta}
+
+
+def _delta(value, baseline):
+    if value is None or baseline is None:
+        return None
+    return round(value - baseline, 4)
+
+
+def _cell(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def markdown_report(rows, summary, comparison=None):
+    lines = ["# Evaluation report", '',
+             f"Problems: {summary['problems']}, success rate: {_cell(summary['success_rate'])}", '',
+             '| status | problems |', '|---|---|']
+    lines += [f"| {status} | {count} |" for status, count in summary['statuses'].items()]
+
+    lines += ['', '## Latency (seconds per problem)', '', '| time | mean | p50 | p90 | p99 | max | total |',
+              '|---|---|---|---|---|---|---|']
+    for key, stats in summary['times'].items():
+        stats = stats or {}
+        lines.append(f"| {key} | " + ' | '.join(_cell(stats.get(s)) for s in ('mean', 'p50', 'p90', 'p99', 'max', 'total'))
+                     + ' |')
+
+    if summary['per_success']:
+        lines += ['', '## Cost per success', '', '| llm_calls | input_tokens | output_tokens |', '|---|---|---|',
+                  '| ' + ' | '.join(_cell(summary['per_success'][k])
+                                    for k in ('llm_calls', 'input_tokens', 'output_tokens')) + ' |']
+
+    lines += ['', '## Iterations to success', '', '| iterations | problems |', '|---|---|']
+    lines += [f"| {iterations} | {count} |" for iterations, count in summary['iterations_to_success'].items()]
+
+    if summary['gap']:
+        lines += ['', '## Optimality gap', '', '| mean | p50 | p90 | max |', '|---|---|---|---|',
+                  '| ' + ' | '.join(_cell(summary['gap'][s]) for s in ('mean', 'p50', 'p90', 'max')) + ' |']
+
+    lines += ['', '## Problems', '', '| ' + ' | '.join(FIELDS) + ' |', '|' + '---|' * len(FIELDS)]
+    lines += ['| ' + ' | '.join(_cell(row[field]) for field in FIELDS) + ' |' for row in rows]
+
+    if comparison is not None:
+        lines += ['', '## Compared with the baseline', '',
+                  f"Success rate: {_cell(comparison['summary']['success_rate'])}, "
+                  f"mean gap: {_cell(comparison['summary']['gap'])}", '',
+                  '| problem | before | after |', '|---|---|---|']
+        lines += [f"| {c['problem']} | {c['before']} | {c['after']} |" for c in comparison['changed']]
+    return '\n'.join(lines)
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report the metrics of an evaluation run from its journal')
+    parser.add_argument('journal', type=str, help='the journal of the run')
+    parser.add_argument('--baseline', type=str, help='the journal of another run to compare with')
+    parser.add_argument('--json', type=str, help='write the summary (and comparison) as JSON')
+    parser.add_argument('--csv', type=str, help='write the per-problem metrics as CSV')
+    parser.add_argument('--markdown', type=str, help='write the report as Markdown instead of printing it')
+    args = parser.parse_args()
+
+    rows = problem_rows(args.journal)
+    summary = summarize(rows)
+    comparison = diff(rows, problem_rows(args.baseline)) if args.baseline else None
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summary, 'problems': rows, 'comparison': comparison}, f, indent=1)
+    if args.csv:
+        write_csv(args.csv, rows)
+    report = markdown_report(rows, summary, comparison)
+    if args.markdown:
+        with open(args.markdown, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
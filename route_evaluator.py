@@ -0,0 +1,352 @@
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from routing_toolkit import model_from_params, search_profile
+
+# Violations of a route set that evaluate() reports, each the total amount by which it is violated.
+VIOLATIONS = ('missing', 'repeated', 'depot_visits', 'load', 'distance', 'late', 'duration', 'pairs', 'depot_conflicts')
+
+
+class RouteEvaluator:
+    """
+    The objective and the constraint violations of route sets, computed with NumPy, without the routing solver.
+
+    A batch of route sets is evaluated at once: the routes are padded into one array, and the arrival
+    times come from the closed form of the earliest schedule (each arrival is the latest of the window
+    openings before it, plus the travel since), so there is no loop over the nodes of the routes. It
+    covers every constraint of RoutingModelBuilder, with the solver's semantics: the objective counts
+    the arcs with their service times and the prizes of the nodes left out, an empty route costs
+    nothing, loads start at 0, vehicles wait for windows to open, a route may come back to its end depot
+    after its window closed unless the model has end_windows, and the duration of a route is its
+    shortest span over its possible departure times.
+
+    Example:
+        evaluator = RouteEvaluator(model)  # or RouteEvaluator.from_params(params)
+        result = evaluator.evaluate([routes, other_routes])
+        result['objective'], result['feasible']
+        evaluator.check(routes)  # the violations of one route set, described
+    """
+
+    def __init__(self, model):
+        """
+        Args:
+            model: the RoutingModelBuilder of the problem; it does not need to be built
+        """
+        self.num_nodes = model.num_nodes
+        self.num_vehicles = model.num_vehicles
+        self.starts = np.array(model.starts)
+        self.ends = np.array(model.ends)
+        self.is_depot = np.zeros(self.num_nodes, dtype=bool)
+        self.is_depot[sorted(model.depots)] = True
+        self.costs = model._transits()
+        self.capacities = [(name, demands, np.array(capacities)) for name, demands, capacities in model.capacities]
+        self.distance_limit = model.distance_limit
+        self.duration_limit = model.duration_limit
+        self.timed = model._timed()
+        if model.time_windows is not None:
+            self.opens, self.closes = (np.array(bound, dtype=np.int64) for bound in zip(*model.time_windows))
+        else:
+            self.opens = np.zeros(self.num_nodes, dtype=np.int64)
+            self.closes = np.full(self.num_nodes, np.iinfo(np.int64).max // 4)
+        if model.end_windows:
+            self.end_opens, self.end_closes = self.opens[self.ends], self.closes[self.ends]
+        else:
+            # a route comes back to its end by the horizon of the model, whatever the window of its end depot
+            self.end_opens = np.zeros(self.num_vehicles, dtype=np.int64)
+            self.end_closes = np.full(self.num_vehicles, model._horizon() if model.time_windows is not None
+                                      else self.closes.max())
+        self.pairs = np.array(model.pickups_deliveries, dtype=np.int64).reshape(-1, 2)
+        self.prizes = model.prizes
+        self.depot_resource = model.depot_resource
+
+    @classmethod
+    def from_params(cls, params):
+        """The evaluator of a problem given by the params of the gene_codes solvers (see model_from_params)."""
+        return cls(model_from_params(params))
+
+    def pack(self, route_sets):
+        """
+        The route sets as one array of nodes.
+
+        Args:
+            route_sets: a list of route sets, each the node sequence of every vehicle (missing vehicles
+                have empty routes), with or without the start and end of the vehicle
+
+        Returns:
+            an int array (sets, vehicles, longest route) of the nodes of the routes without their start
+            and end, padded with -1
+        """
+        routes = []
+        for routes_of_set in route_sets:
+            if len(routes_of_set) > self.num_vehicles:
+                raise ValueError(f"expected at most {self.num_vehicles} routes, got {len(routes_of_set)}")
+            for vehicle in range(self.num_vehicles):
+                route = list(routes_of_set[vehicle]) if vehicle < len(routes_of_set) else []
+                if route and route[0] == self.starts[vehicle]:
+                    route = route[1:]
+                if route and route[-1] == self.ends[vehicle]:
+                    route = route[:-1]
+                routes.append(route)
+        lengths = np.array([len(route) for route in routes])
+        packed = np.full((len(routes), max(lengths.max(initial=0), 1)), -1, dtype=np.int64)
+        packed[np.arange(packed.shape[1]) < lengths[:, None]] = [node for route in routes for node in route]
+        if packed.size and packed.max() >= self.num_nodes:
+            raise ValueError(f"node {packed.max()} is not a node of the {self.num_nodes} nodes of the problem")
+        return packed.reshape(len(route_sets), self.num_vehicles, -1)
+
+    def _schedules(self, vehicles, nodes):
+        """
+        The paths of routes, their number of nodes, their arc mask, the windows of their visits, their travel
+        and their earliest arrival times.
+        """
+        length = (nodes >= 0).sum(axis=1)
+        paths = np.concatenate([self.starts[vehicles][:, None], nodes, self.ends[vehicles][:, None]], axis=1)
+        # the end takes the place of the padding, so the padded arcs are loops on it, masked out
+        index = np.arange(paths.shape[1])
+        paths = np.where(index > length[:, None], self.ends[vehicles][:, None], paths)
+        arcs = index[1:] <= length[:, None] + 1
+        at_end = index > length[:, None]
+        opens = np.where(at_end, self.end_opens[vehicles][:, None], self.opens[paths])
+        closes = np.where(at_end, self.end_closes[vehicles][:, None], self.closes[paths])
+        transits = np.where(arcs, self.costs[paths[:, :-1], paths[:, 1:]], 0)
+        travel = np.concatenate([np.zeros((len(paths), 1), dtype=np.int64), np.cumsum(transits, axis=1)], axis=1)
+        # the earliest arrival: the travel since the latest window opening before, plus that opening
+        times = travel + np.maximum.accumulate(opens - travel, axis=1) if self.timed else travel
+        return paths, length, arcs, opens, closes, travel, times
+
+    def evaluate_routes(self, vehicles, nodes):
+        """
+        The cost and the violations of routes, each on its own.
+
+        Args:
+            vehicles: the vehicle of each route, an int array
+            nodes: an int array (routes, longest route) of the nodes of the routes without their start
+                and end, padded with -1, e.g. a row of pack()
+
+        Returns:
+            a dict of arrays over the routes: "cost" (0 for an empty route), "depot_visits" (depots in
+            the route), "load" (the loads above the capacities or below 0, for each capacity), "distance"
+            (above the distance limit), "late" (the lateness of the visits on the earliest schedule, each
+            carried on to the visits after it) and "duration" (above the duration limit); and the times
+            of the depot resources: "leave" and "deadline" (the earliest and the latest departure that
+            meet the windows), "travel" and "back" (a departure at time t returns at max(t + travel, back))
+        """
+        vehicles = np.asarray(vehicles)
+        nodes = np.asarray(nodes)
+        paths, length, arcs, opens, closes, travel, times = self._schedules(vehicles, nodes)
+        total = travel[:, -1]
+        zeros = np.zeros(len(paths), dtype=np.int64)
+        result = {
+            'cost': np.where(length > 0, total, 0),
+            'depot_visits': (self.is_depot[np.maximum(nodes, 0)] & (nodes >= 0)).sum(axis=1),
+            'load': zeros.copy(),
+        }
+        for _, demands, capacities in self.capacities:
+            # the load on arrival at each node: the demands of the nodes before it
+            loads = np.concatenate([zeros[:, None], np.cumsum(np.where(arcs, demands[paths[:, :-1]], 0), axis=1)],
+                                   axis=1)
+            result['load'] += (np.maximum(loads.max(axis=1) - capacities[vehicles], 0)
+                               + np.maximum(-loads.min(axis=1), 0))
+        result['distance'] = np.maximum(total - self.distance_limit, 0) if self.distance_limit is not None else zeros
+
+        # the padding repeats the end, counted once
+        visits = np.concatenate([np.ones((len(paths), 1), dtype=bool), arcs], axis=1)
+        result['late'] = np.where(visits, np.maximum(times - closes, 0), 0).sum(axis=1)
+        back = times[:, -1]
+        # leaving later delays no visit up to the latest departure, which then still returns at the same time
+        latest = np.maximum((np.minimum(closes, back[:, None]) - travel).min(axis=1), times[:, 0])
+        result['duration'] = (np.maximum(back - latest - self.duration_limit, 0) if self.duration_limit is not None
+                              else zeros)
+        result.update(leave=times[:, 0], deadline=(closes - travel).min(axis=1), travel=total,
+                      back=(opens[:, 1:] - travel[:, 1:]).max(axis=1) + total)
+        return result
+
+    def evaluate(self, route_sets):
+        """
+        The objective and the violations of route sets.
+
+        Args:
+            route_sets: a list of route sets (see pack), or the array pack() returns
+
+        Returns:
+            a dict of arrays over the route sets: "objective" (the cost of the arcs and the prizes of the
+            nodes left out), "feasible", and each of VIOLATIONS: "missing" (nodes left out, without
+            prizes), "repeated" (extra visits of a node), "depot_visits", "load", "distance", "late",
+            "duration" (summed over the routes, see evaluate_routes), "pairs" (pickups and deliveries
+            not on the same route in order; a pair left out whole is fine with prizes) and
+            "depot_conflicts" (loads and unloads that find no room at their depot in time)
+        """
+        packed = route_sets if isinstance(route_sets, np.ndarray) else self.pack(route_sets)
+        sets, vehicles, width = packed.shape
+        routes = self.evaluate_routes(np.tile(np.arange(vehicles), sets), packed.reshape(-1, width))
+        result = {name: routes[name].reshape(sets, vehicles).sum(axis=1)
+                  for name in ('cost', 'depot_visits', 'load', 'distance', 'late', 'duration')}
+
+        visited = packed >= 0
+        set_of = np.broadcast_to(np.arange(sets)[:, None, None], packed.shape)[visited]
+        counts = np.bincount(set_of * self.num_nodes + packed[visited],
+                             minlength=sets * self.num_nodes).reshape(sets, self.num_nodes)
+        customers = ~self.is_depot
+        result['repeated'] = np.maximum(counts[:, customers] - 1, 0).sum(axis=1)
+        left_out = (counts == 0) & customers
+        if self.prizes is not None:
+            result['missing'] = np.zeros(sets, dtype=np.int64)
+            result['objective'] = result['cost'] + (left_out * self.prizes).sum(axis=1)
+        else:
+            result['missing'] = left_out.sum(axis=1)
+            result['objective'] = result['cost']
+
+        result['pairs'] = np.zeros(sets, dtype=np.int64)
+        if len(self.pairs):
+            # the vehicle and position of the last visit of each node, -1 when it is not visited
+            route_of = np.full((sets, self.num_nodes), -1)
+            position = np.full((sets, self.num_nodes), -1)
+            set_index, vehicle, index = np.nonzero(visited)
+            route_of[set_index, packed[visited]] = vehicle
+            position[set_index, packed[visited]] = index
+            pickups, deliveries = self.pairs[:, 0], self.pairs[:, 1]
+            served = ((route_of[:, pickups] == route_of[:, deliveries]) & (route_of[:, pickups] >= 0)
+                      & (position[:, pickups] < position[:, deliveries]))
+            if self.prizes is not None:
+                served |= (route_of[:, pickups] < 0) & (route_of[:, deliveries] < 0)
+            result['pairs'] = (~served).sum(axis=1)
+
+        result['depot_conflicts'] = np.zeros(sets, dtype=np.int64)
+        if self.depot_resource is not None:
+            times = [routes[name].reshape(sets, vehicles) for name in ('leave', 'deadline', 'travel', 'back')]
+            for s in range(sets):
+                result['depot_conflicts'][s] = self._depot_conflicts(*(values[s] for values in times))
+
+        result['feasible'] = np.all([result[name] == 0 for name in VIOLATIONS], axis=0)
+        return result
+
+    def _depot_conflicts(self, leave, deadline, travel, back):
+        """
+        The loads and unloads of the vehicles that find no room at their depot in time.
+
+        A vehicle leaves late enough to return within the duration limit, and its unload is due by
+        the window of the end and by that limit from its departure. The vehicles are taken in the
+        order of their latest departure, and their loads and unloads placed at the earliest time
+        their depot has room for them: all the loads before the unloads, or each load with its
+        unload. When one of the two schedules fits them all, the depots can serve the routes; when
+        neither does, another schedule might still, which is rare without a duration limit.
+        """
+        if self.duration_limit is not None:
+            # leaving earlier would only wait longer on the way
+            leave = np.maximum(leave, back - self.duration_limit)
+        return min(self._schedule_depots(leave, deadline, travel, back, paired) for paired in (False, True))
+
+    def _schedule_depots(self, leave, deadline, travel, back, paired):
+        """The loads and unloads that miss their due time in one schedule of the depots (see _depot_conflicts)."""
+        load_time, unload_time, capacity = self.depot_resource
+        placed = {depot: [] for depot in np.flatnonzero(self.is_depot)}
+        conflicts = 0
+        unloads = []
+        for vehicle in np.argsort(deadline, kind='stable'):
+            start = self._place(placed[self.starts[vehicle]], leave[vehicle], load_time, capacity)
+            conflicts += start > deadline[vehicle]
+            due = self.end_closes[vehicle]
+            if self.duration_limit is not None:
+                due = min(due, start + self.duration_limit)
+            unloads.append((due, max(start + travel[vehicle], back[vehicle]), vehicle))
+            if paired:
+                release = unloads[-1][1]
+                conflicts += self._place(placed[self.ends[vehicle]], release, unload_time, capacity) > due
+        if not paired:
+            for due, release, vehicle in sorted(unloads):
+                conflicts += self._place(placed[self.ends[vehicle]], release, unload_time, capacity) > due
+        return conflicts
+
+    @staticmethod
+    def _place(intervals, release, duration, capacity):
+        """Add an interval to those of a depot, at the earliest time from release it has room; its start."""
+        if duration <= 0:
+            return release
+        for start in sorted({release} | {end for _, end in intervals if end > release}):
+            # the overlap only grows at the starts of the other intervals
+            points = [start] + [begin for begin, _ in intervals if start < begin < start + duration]
+            if all(sum(begin <= point < end for begin, end in intervals) < capacity for point in points):
+                intervals.append((start, start + duration))
+                return start
+
+    def check(self, routes, violations=VIOLATIONS):
+        """
+        The violations of one route set, described, e.g. to verify a solution.
+
+        Args:
+            routes: the node sequence of every vehicle, with or without its start and end
+            violations: the VIOLATIONS to look for
+
+        Returns:
+            a list of messages, empty when the routes meet every constraint
+        """
+        packed = self.pack([routes])
+        result = self.evaluate(packed)
+        per_route = self.evaluate_routes(np.arange(self.num_vehicles), packed[0])
+        messages = []
+        for name, description in (('depot_visits', 'visits a depot'), ('load', 'exceeds its capacity by'),
+                                  ('distance', 'exceeds the distance limit by'),
+                                  ('late', 'is late at its visits by'),
+                                  ('duration', 'exceeds the duration limit by')):
+            for vehicle in np.flatnonzero(per_route[name]) if name in violations else ():
+                amount = '' if name == 'depot_visits' else f' {per_route[name][vehicle]}'
+                messages.append(f"the route of vehicle {vehicle} {description}{amount}")
+        for name, description in (('missing', 'nodes are not visited'), ('repeated', 'visits repeat a node'),
+                                  ('pairs', 'pickups and deliveries are not on one route, pickup first'),
+                                  ('depot_conflicts', 'loads or unloads find no room at their depot')):
+            if name in violations and result[name][0]:
+                messages.append(f"{result[name][0]} {description}")
+        return messages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Evaluate random variations of the solution of an instance, timing '
+                                                 'the evaluator against reading them into the routing solver')
+    parser.add_argument('instance', type=str, help='an instance directory, e.g. of generator.py')
+    parser.add_argument('--sets', type=int, default=1000, help='route sets evaluated')
+    parser.add_argument('--time_limit', type=float, default=5, help='seconds of the solve of the instance')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from instances import load_instance, read_meta
+    params = load_instance(args.instance)
+    model = model_from_params(params)
+    obj = model.solve(time_limit=args.time_limit)
+    # without a solution, the routes are the planted solution of the generator
+    routes = model.routes() if obj >= 0 else read_meta(args.instance)['meta']['planted_routes']
+    evaluator = RouteEvaluator(model)
+    print(f"{os.path.basename(os.path.normpath(args.instance))}: solve {obj}, evaluated "
+          f"{evaluator.evaluate([routes])['objective'][0]}, violations {evaluator.check(routes)}")
+
+    # each variation moves a node of the solution to another place
+    rng = random.Random(args.seed)
+    route_sets = []
+    for _ in range(args.sets):
+        variation = [[node for node in route if not evaluator.is_depot[node]] for route in routes]
+        source = rng.choice([route for route in variation if route])
+        node = source.pop(rng.randrange(len(source)))
+        target = rng.choice(variation)
+        target.insert(rng.randint(0, len(target)), node)
+        route_sets.append(variation)
+    begin = time.perf_counter()
+    packed = evaluator.pack(route_sets)
+    result = evaluator.evaluate(packed)
+    elapsed = time.perf_counter() - begin
+
+    # the routes are read into a model of their own, as the model of a solve that found nothing rejects some
+    reader = model_from_params(params)
+    manager, routing = reader.build()
+    routing.CloseModelWithParameters(search_profile())
+    begin = time.perf_counter()
+    feasible = [routing.ReadAssignmentFromRoutes([[manager.NodeToIndex(node) for node in route]
+                                                  for route in variation], True) is not None
+                for variation in route_sets]
+    solver_elapsed = time.perf_counter() - begin
+    agree = int((result['feasible'] == np.array(feasible)).sum())
+    print(f"{args.sets} route sets: {args.sets / elapsed:.0f} per second ({result['feasible'].sum()} feasible), "
+          f"the routing solver reads {args.sets / solver_elapsed:.0f} per second; feasibility agrees on "
+          f"{agree} of {args.sets}")
@@ -0,0 +1,873 @@
+import inspect
+import time
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+# Search profiles of the routing solver: the first solution strategy, the local search metaheuristic
+# (names of routing_enums_pb2) and the time limit in seconds when the call gives none. 'fast' stops at
+# the first local optimum, or at its limit when it finds none by then (e.g. no first solution of tight
+# time windows), below the 60 seconds the sandbox gives a candidate; the metaheuristics only stop at their limit.
+SEARCH_PROFILES = {
+    'fast': {'first_solution': 'PATH_CHEAPEST_ARC', 'metaheuristic': 'AUTOMATIC', 'time_limit': 30},
+    'gls': {'first_solution': 'PATH_CHEAPEST_ARC', 'metaheuristic': 'GUIDED_LOCAL_SEARCH', 'time_limit': 10},
+    'annealing': {'first_solution': 'PATH_CHEAPEST_ARC', 'metaheuristic': 'SIMULATED_ANNEALING', 'time_limit': 10},
+    'tabu': {'first_solution': 'PATH_CHEAPEST_ARC', 'metaheuristic': 'TABU_SEARCH', 'time_limit': 10},
+}
+# Cheapest positions tried for each node a warm start inserts into the initial routes, before the
+# node is left to the search (each try reads the whole assignment, a few milliseconds at 200 nodes).
+INSERTION_TRIES = 8
+# Rows of a matrix nearest_neighbors sorts at once.
+NEIGHBOR_BLOCK = 1024
+# Factor solve() widens the neighbor arcs of a model by when it finds no first solution with them, and
+# the share of the time limit (or seconds, without a time limit) it looks for that first solution.
+NEIGHBOR_ARCS_GROWTH = 2
+NEIGHBOR_ARCS_PROBE_SHARE = 0.05
+NEIGHBOR_ARCS_PROBE_SECONDS = 5
+# First solution strategies solve() falls back on, in turn, when the first solution of its profile leaves out
+# nodes of a model with time windows: the path heuristics fill one route after the other and run out of
+# vehicles on tight windows, where savings and parallel insertion, which grow all the routes at once, do not.
+TIME_WINDOW_FALLBACKS = ('SAVINGS', 'PARALLEL_CHEAPEST_INSERTION')
+
+
+def as_matrix(matrix):
+    """The integer array of a nested list (or array) of arc values, rounded when they are not integers."""
+    values = np.asarray(matrix)
+    if values.ndim != 2 or values.shape[0] != values.shape[1]:
+        raise ValueError(f"expected a square matrix, got shape {values.shape}")
+    if not np.issubdtype(values.dtype, np.integer):
+        values = np.rint(values)
+    return values.astype(np.int64)
+
+
+def as_vector(values):
+    """The integer array of a list (or array) of node values, rounded when they are not integers."""
+    values = np.asarray(values)
+    if values.ndim != 1:
+        raise ValueError(f"expected a vector, got shape {values.shape}")
+    if not np.issubdtype(values.dtype, np.integer):
+        values = np.rint(values)
+    return values.astype(np.int64)
+
+
+def register_transit_matrix(routing, matrix, service_time=None):
+    """
+    Register the arc values of a matrix as a transit evaluator of a routing model.
+
+    The values are copied into the solver, which evaluates them without calling back into Python,
+    unlike a callback registered with RegisterTransitCallback. They are indexed by node, the routing
+    model converts its indices through its manager.
+
+    Args:
+        routing: the pywrapcp.RoutingModel
+        matrix: matrix[i][j], the transit from node i to node j (distance, travel time)
+        service_time: service_time[i], the time spent at node i, added to the transits leaving it
+
+    Returns:
+        the index of the evaluator, as returned by RegisterTransitCallback
+    """
+    values = as_matrix(matrix)
+    if service_time is not None:
+        values = values + as_vector(service_time)[:, None]
+    return routing.RegisterTransitMatrix(values.tolist())
+
+
+def register_unary_vector(routing, values):
+    """
+    Register the node values of a vector (e.g. demands) as a unary transit evaluator of a routing model.
+
+    Args:
+        routing: the pywrapcp.RoutingModel
+        values: values[i], the transit of node i
+
+    Returns:
+        the index of the evaluator, as returned by RegisterUnaryTransitCallback
+    """
+    return routing.RegisterUnaryTransitVector(as_vector(values).tolist())
+
+
+def cheapest_insertions(costs, paths, node, delivery=None):
+    """
+    The insertions of a node, or of a pickup node and its delivery after it, into paths, cheapest first.
+
+    Args:
+        costs: costs[i][j], the cost of the arc from node i to node j, as an array
+        paths: the node sequence of each route, its start and end included
+        node: the node to insert
+        delivery: the delivery of the node, inserted on the same path after it
+
+    Returns:
+        (deltas, paths, positions, delivery positions) arrays, sorted by delta: the cost each insertion
+        adds, the index of its path, the position i of the arc (path[i], path[i + 1]) the node is inserted
+        into, and the position j >= i of the arc the delivery is inserted into (-1 without a delivery)
+    """
+    found = []
+    for p, path in enumerate(paths):
+        path = np.asarray(path)
+        before, after = path[:-1], path[1:]
+        arcs = costs[before, after]
+        deltas = costs[before, node] + costs[node, after] - arcs
+        if delivery is None:
+            positions = np.arange(len(deltas))
+            found.append((deltas, np.full(len(deltas), p), positions, np.full(len(deltas), -1)))
+            continue
+        pairs = deltas[:, None] + (costs[before, delivery] + costs[delivery, after] - arcs)[None, :]
+        # the delivery right after the node replaces the arc out of it rather than another arc
+        np.fill_diagonal(pairs, costs[before, node] + costs[node, delivery] + costs[delivery, after] - arcs)
+        i, j = np.triu_indices(len(deltas))
+        found.append((pairs[i, j], np.full(len(i), p), i, j))
+    deltas, indices, positions, deliveries = (np.concatenate(column) for column in zip(*found))
+    order = np.argsort(deltas, kind='stable')
+    return deltas[order], indices[order], positions[order], deliveries[order]
+
+
+def insert_request(route, node, position, delivery=None, delivery_position=-1):
+    """
+    The route with a node inserted, and its delivery after it, at positions of cheapest_insertions.
+
+    Args:
+        route: the nodes of the route, without its start and end
+    """
+    if delivery is None:
+        return route[:position] + [node] + route[position:]
+    return route[:position] + [node] + route[position:delivery_position] + [delivery] + route[delivery_position:]
+
+
+def nearest_neighbors(matrix, k, nodes=None):
+    """
+    The k nearest nodes of each node, by the arcs leaving it, nearest first.
+
+    Args:
+        matrix: matrix[i][j], the cost of the arc from node i to node j, as an array
+        k: the number of neighbors, at most the number of nodes less one
+        nodes: the nodes to consider, as nodes and as neighbors (e.g. the customers), all by default
+
+    Returns:
+        an int array (len(nodes), k) whose row i holds the neighbors of nodes[i]
+    """
+    matrix = np.asarray(matrix)
+    nodes = np.arange(len(matrix)) if nodes is None else np.asarray(nodes)
+    k = max(min(k, len(nodes) - 1), 0)
+    neighbors = np.empty((len(nodes), k), dtype=np.int64)
+    # a block of rows at a time, to keep the memory linear in the number of nodes
+    for begin in range(0, len(nodes) if k else 0, NEIGHBOR_BLOCK):
+        rows = np.asarray(matrix[nodes[begin:begin + NEIGHBOR_BLOCK]][:, nodes], dtype=float)
+        rows[np.arange(len(rows)), np.arange(begin, begin + len(rows))] = np.inf
+        nearest = np.argpartition(rows, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(rows, nearest, axis=1).argsort(axis=1, kind='stable')
+        neighbors[begin:begin + len(rows)] = nodes[np.take_along_axis(nearest, order, axis=1)]
+    return neighbors
+
+
+def remap_routes(routes, node_map):
+    """
+    The routes of a previous solution in the node numbering of a changed instance, to warm start it.
+
+    Args:
+        routes: the node sequence of each vehicle in the previous instance
+        node_map: {previous node: node} (or a list indexed by previous node), None or missing for the
+            nodes that are no longer in the instance
+
+    Returns:
+        the routes in the new numbering, without the nodes that are no longer in the instance
+    """
+    if not isinstance(node_map, dict):
+        node_map = dict(enumerate(node_map))
+    return [[node_map[node] for node in route if node_map.get(node) is not None] for route in routes]
+
+
+def search_profile(profile='fast', time_limit=None):
+    """
+    The routing search parameters of a profile.
+
+    Args:
+        profile: a name of SEARCH_PROFILES
+        time_limit: seconds of search, instead of the time limit of the profile
+
+    Returns:
+        the pywrapcp search parameters
+    """
+    if profile not in SEARCH_PROFILES:
+        raise ValueError(f"unknown search profile {profile!r}, expected one of {sorted(SEARCH_PROFILES)}")
+    settings = SEARCH_PROFILES[profile]
+    parameters = pywrapcp.DefaultRoutingSearchParameters()
+    parameters.first_solution_strategy = getattr(routing_enums_pb2.FirstSolutionStrategy, settings['first_solution'])
+    parameters.local_search_metaheuristic = getattr(routing_enums_pb2.LocalSearchMetaheuristic,
+                                                    settings['metaheuristic'])
+    time_limit = time_limit if time_limit is not None else settings['time_limit']
+    if time_limit is not None:
+        parameters.time_limit.FromMilliseconds(int(time_limit * 1000))
+    return parameters
+
+
+class RoutingModelBuilder:
+    """
+    A routing model put together from the constraints of a problem, in any combination.
+
+    The add_ methods record the constraints and check them against the size of the problem; build()
+    then creates the model in one pass. The transits are registered as matrices, the time dimension
+    is sized from the time windows rather than a fixed horizon, and the depots are the start and end
+    nodes of the vehicles, whether there is one or several.
+
+    Example:
+        model = RoutingModelBuilder(time_matrix, num_vehicle, depot=depot)
+        model.add_capacity(demands, vehicle_capacities)
+        model.add_time_windows(time_windows)
+        obj = model.solve(profile='gls', time_limit=30)
+
+    Re-optimization: add_initial_routes starts the search from the routes of a previous solution
+    instead of the first solution heuristic, e.g. to re-solve an instance after a few orders changed.
+
+    Large instances: add_neighbor_arcs keeps only the arcs between near nodes, which the search
+    explores much faster than all n*n arcs.
+    """
+
+    def __init__(self, matrix, num_vehicles=1, depot=0, starts=None, ends=None):
+        """
+        Args:
+            matrix: matrix[i][j], the distance or travel time from node i to node j, the cost of the arc
+            num_vehicles: the number of vehicles
+            depot: the start and end node of every vehicle, unless starts or ends are given
+            starts, ends: the start and end node of each vehicle (multiple depots)
+        """
+        self.matrix = as_matrix(matrix)
+        self.num_nodes = len(self.matrix)
+        self.num_vehicles = num_vehicles
+        if starts is None and ends is None:
+            starts = ends = [depot] * num_vehicles
+        starts = list(starts if starts is not None else ends)
+        ends = list(ends if ends is not None else starts)
+        if len(starts) != num_vehicles or len(ends) != num_vehicles:
+            raise ValueError(f"expected a start and an end for each of the {num_vehicles} vehicles, "
+                             f"got {len(starts)} starts and {len(ends)} ends")
+        self._check_nodes('depot', starts + ends)
+        self.starts = [int(node) for node in starts]
+        self.ends = [int(node) for node in ends]
+        self.depots = set(self.starts) | set(self.ends)
+
+        self.service_time = None
+        self.capacities = []
+        self.distance_limit = None
+        self.time_windows = None
+        self.end_windows = False
+        self.duration_limit = None
+        self.pickups_deliveries = []
+        self.prizes = None
+        self.depot_resource = None
+        self.initial_routes = None
+        self.warm_start = None
+        self.neighbor_arcs = None
+        self.manager = None
+        self.routing = None
+        self.solution = None
+        self.incumbents = []
+        self._started = None
+
+    def _check_nodes(self, name, nodes):
+        for node in nodes:
+            if not 0 <= node < self.num_nodes:
+                raise ValueError(f"{name} node {node} is not a node of the {self.num_nodes}x{self.num_nodes} matrix")
+
+    def _check_length(self, name, values, length=None):
+        length = self.num_nodes if length is None else length
+        if len(values) != length:
+            raise ValueError(f"expected {length} {name}, got {len(values)}")
+
+    def add_service_times(self, service_time):
+        """Add the service time of each node to the arcs leaving it, in the cost and the time dimension."""
+        self._check_length('service times', service_time)
+        self.service_time = as_vector(service_time)
+        return self
+
+    def add_capacity(self, demands, vehicle_capacities, name='Capacity'):
+        """
+        Limit the load of each vehicle: the demands of the nodes it visits add up to at most its capacity.
+
+        Args:
+            demands: demands[i], the demand of node i
+            vehicle_capacities: the capacity of each vehicle, or one capacity for all
+            name: the name of the dimension, to add several capacities (e.g. weight and volume)
+        """
+        self._check_length('demands', demands)
+        if np.ndim(vehicle_capacities) == 0:
+            vehicle_capacities = [vehicle_capacities] * self.num_vehicles
+        self._check_length('vehicle capacities', vehicle_capacities, self.num_vehicles)
+        self.capacities.append((name, as_vector(demands), [int(c) for c in vehicle_capacities]))
+        return self
+
+    def add_distance_limit(self, limit):
+        """Limit the total cost (distance) of the arcs of each route."""
+        self.distance_limit = int(limit)
+        return self
+
+    def add_time_windows(self, time_windows, end_windows=False):
+        """
+        Visit each node within its time window; the window of a depot applies to the routes starting there.
+
+        Vehicles may wait before a window opens. A route may come back to its end depot after the
+        windows closed, unless end_windows also bounds its return by the window of its end depot.
+        """
+        self._check_length('time windows', time_windows)
+        for node, (start, end) in enumerate(time_windows):
+            if not 0 <= start <= end:
+                raise ValueError(f"time window {(start, end)} of node {node} is empty or negative")
+        self.time_windows = [(int(start), int(end)) for start, end in time_windows]
+        self.end_windows = bool(end_windows)
+        return self
+
+    def add_duration_limit(self, limit):
+        """Limit the time from the start to the end of each route, waiting and service times included."""
+        self.duration_limit = int(limit)
+        return self
+
+    def add_pickups_deliveries(self, pickups_deliveries):
+        """Serve each (pickup, delivery) pair of nodes by the same vehicle, the pickup first."""
+        nodes = [node for pair in pickups_deliveries for node in pair]
+        self._check_nodes('pickup or delivery', nodes)
+        if self.depots & set(nodes):
+            raise ValueError(f"depots {sorted(self.depots & set(nodes))} cannot be pickups or deliveries")
+        if len(set(nodes)) != len(nodes):
+            raise ValueError("a node is in more than one pickup and delivery pair")
+        self.pickups_deliveries += [(int(pickup), int(delivery)) for pickup, delivery in pickups_deliveries]
+        return self
+
+    def add_prizes(self, prizes):
+        """Let the routes skip nodes, at the cost of the prize of each node skipped."""
+        self._check_length('prizes', prizes)
+        self.prizes = as_vector(prizes)
+        return self
+
+    def add_depot_resource(self, load_time, unload_time, capacity):
+        """
+        Share each depot between the vehicles loading and unloading there.
+
+        A vehicle loads for load_time at the start of its route and unloads for unload_time at its end,
+        and at most capacity vehicles load or unload at the same depot at the same time.
+        """
+        if capacity < 1:
+            raise ValueError(f"the depot capacity must be at least 1, got {capacity}")
+        self.depot_resource = (int(load_time), int(unload_time), int(capacity))
+        return self
+
+    def add_initial_routes(self, routes):
+        """
+        Start the search from the routes of a previous solution (None to start from scratch).
+
+        The routes are the node sequence of each vehicle, with or without their depots, as routes()
+        returns them; see remap_routes when the nodes were renumbered. The nodes the instance does not
+        have and the repeated ones are left out, and so are the visits that no longer fit the
+        constraints when the solve starts (e.g. a window that closed); the nodes the routes miss
+        (e.g. new orders) are inserted by the search.
+        """
+        if routes is None:
+            self.initial_routes = None
+            return self
+        if len(routes) > self.num_vehicles:
+            raise ValueError(f"expected at most {self.num_vehicles} routes, got {len(routes)}")
+        seen = set(self.depots)
+        self.initial_routes = []
+        for route in routes:
+            kept = []
+            for node in route:
+                node = int(node)
+                if 0 <= node < self.num_nodes and node not in seen:
+                    seen.add(node)
+                    kept.append(node)
+            self.initial_routes.append(kept)
+        self.initial_routes += [[] for _ in range(self.num_vehicles - len(routes))]
+        return self
+
+    def add_neighbor_arcs(self, k):
+        """
+        Keep only the arcs from each node to its k nearest nodes (None to keep all the arcs).
+
+        The arcs from the depots and to them are all kept, and so are the arcs the other way round
+        (from a node to those it is a nearest node of), between a pickup and its delivery and along
+        the initial routes. When the first solution heuristic finds no solution with these arcs,
+        solve() widens k by NEIGHBOR_ARCS_GROWTH and tries again within the same time limit, up to all
+        the arcs; neighbor_arcs is then the k of the solution.
+        """
+        if k is not None and k < 1:
+            raise ValueError(f"expected at least 1 neighbor, got {k}")
+        self.neighbor_arcs = None if k is None else int(k)
+        return self
+
+    def sub_model(self, nodes, vehicles):
+        """
+        The model of a part of the problem: some of its nodes, served by some of its vehicles.
+
+        The part numbers its nodes in the order of nodes, which holds the starts and ends of the
+        vehicles. It has the constraints of the problem on these nodes and vehicles, the pickups and
+        deliveries of the pairs it has both nodes of; not the initial routes or the neighbor arcs.
+
+        Args:
+            nodes: the nodes of the part
+            vehicles: the vehicles of the part
+
+        Returns:
+            the RoutingModelBuilder of the part, not built
+        """
+        index = {int(node): k for k, node in enumerate(nodes)}
+        nodes = list(index)
+        part = RoutingModelBuilder(self.matrix[np.ix_(nodes, nodes)], len(vehicles),
+                                   starts=[index[self.starts[v]] for v in vehicles],
+                                   ends=[index[self.ends[v]] for v in vehicles])
+        if self.service_time is not None:
+            part.add_service_times(self.service_time[nodes])
+        for name, demands, capacities in self.capacities:
+            part.add_capacity(demands[nodes], [capacities[v] for v in vehicles], name)
+        if self.distance_limit is not None:
+            part.add_distance_limit(self.distance_limit)
+        if self.time_windows is not None:
+            part.add_time_windows([self.time_windows[node] for node in nodes], self.end_windows)
+        if self.duration_limit is not None:
+            part.add_duration_limit(self.duration_limit)
+        part.add_pickups_deliveries([(index[p], index[d]) for p, d in self.pickups_deliveries
+                                     if p in index and d in index])
+        if self.prizes is not None:
+            part.add_prizes(self.prizes[nodes])
+        if self.depot_resource is not None:
+            part.add_depot_resource(*self.depot_resource)
+        return part
+
+    def _restricted(self):
+        """Whether the neighbor arcs leave out arcs between nodes that are not depots."""
+        return self.neighbor_arcs is not None and self.neighbor_arcs < self.num_nodes - len(self.depots) - 1
+
+    def _neighbor_arcs(self):
+        """The arcs kept between the nodes that are not depots, as (sources, targets) arrays sorted by source."""
+        customers = np.array([node for node in range(self.num_nodes) if node not in self.depots], dtype=np.int64)
+        nearest = nearest_neighbors(self._transits(), self.neighbor_arcs, customers)
+        sources, targets = np.repeat(customers, nearest.shape[1]), nearest.ravel()
+        kept = list(self.pickups_deliveries)
+        kept += [(a, b) for route in self.initial_routes or [] for a, b in zip(route, route[1:])]
+        if kept:
+            sources = np.concatenate([sources, [a for a, _ in kept]])
+            targets = np.concatenate([targets, [b for _, b in kept]])
+        arcs = np.unique(np.concatenate([sources * self.num_nodes + targets, targets * self.num_nodes + sources]))
+        return arcs // self.num_nodes, arcs % self.num_nodes
+
+    def _restrict_arcs(self, manager, routing):
+        """Restrict the successors of the nodes that are not depots to their neighbor arcs and the vehicle ends."""
+        sources, targets = self._neighbor_arcs()
+        ends = [routing.End(vehicle) for vehicle in range(self.num_vehicles)]
+        split = np.flatnonzero(np.diff(sources)) + 1
+        for node, successors in zip(sources[np.concatenate([[0], split])], np.split(targets, split)):
+            index = manager.NodeToIndex(int(node))
+            # a node left out of the routes is its own successor
+            routing.NextVar(index).SetValues([index] + [manager.NodeToIndex(int(n)) for n in successors] + ends)
+
+    def _transits(self):
+        if self.service_time is None:
+            return self.matrix
+        return self.matrix + self.service_time[:, None]
+
+    def _bound(self):
+        """A bound on the length of any route: each node left once by its longest arc, and every depot wait."""
+        bound = int(self._transits().max(axis=1).sum())
+        if self.depot_resource is not None:
+            bound += (self.depot_resource[0] + self.depot_resource[1]) * self.num_vehicles
+        return max(bound, 1)
+
+    def _horizon(self):
+        """The latest time of the routes: the latest closing of the windows, then any way back to a depot."""
+        if self.time_windows is None:
+            return self._bound()
+        return max(end for _, end in self.time_windows) + self._bound()
+
+    def _timed(self):
+        return (self.time_windows is not None or self.duration_limit is not None
+                or self.depot_resource is not None)
+
+    def build(self):
+        """
+        Create the routing model of the constraints added so far, once.
+
+        Returns:
+            (manager, routing): the pywrapcp.RoutingIndexManager and pywrapcp.RoutingModel
+        """
+        if self.routing is not None:
+            return self.manager, self.routing
+        manager = pywrapcp.RoutingIndexManager(self.num_nodes, self.num_vehicles, self.starts, self.ends)
+        routing = pywrapcp.RoutingModel(manager)
+        transit = register_transit_matrix(routing, self.matrix, self.service_time)
+        routing.SetArcCostEvaluatorOfAllVehicles(transit)
+
+        for name, demands, vehicle_capacities in self.capacities:
+            routing.AddDimensionWithVehicleCapacity(register_unary_vector(routing, demands), 0, vehicle_capacities,
+                                                    True, name)
+
+        # pickups are ordered before their deliveries along the time, or else the distance, of the route
+        if self.distance_limit is not None or (self.pickups_deliveries and not self._timed()):
+            limit = self.distance_limit if self.distance_limit is not None else self._bound()
+            routing.AddDimension(transit, 0, limit, True, 'Distance')
+        if self._timed():
+            self._add_time(manager, routing, transit)
+        if self.pickups_deliveries:
+            order = routing.GetDimensionOrDie('Time' if self._timed() else 'Distance')
+            for pickup, delivery in self.pickups_deliveries:
+                pickup_index, delivery_index = manager.NodeToIndex(pickup), manager.NodeToIndex(delivery)
+                routing.AddPickupAndDelivery(pickup_index, delivery_index)
+                routing.solver().Add(routing.VehicleVar(pickup_index) == routing.VehicleVar(delivery_index))
+                routing.solver().Add(order.CumulVar(pickup_index) <= order.CumulVar(delivery_index))
+
+        if self.prizes is not None:
+            for node in range(self.num_nodes):
+                if node not in self.depots:
+                    routing.AddDisjunction([manager.NodeToIndex(node)], int(self.prizes[node]))
+        elif self.initial_routes is not None or self.time_windows is not None:
+            # the initial routes may miss nodes, and the first solution of tight windows too, which are then
+            # left out at a penalty above any cost of inserting them rather than failing the search, so the
+            # search inserts them all; solve() rejects the solutions still missing one
+            penalty = self._bound()
+            for node in range(self.num_nodes):
+                if node not in self.depots:
+                    routing.AddDisjunction([manager.NodeToIndex(node)], penalty)
+
+        if self._restricted():
+            self._restrict_arcs(manager, routing)
+
+        routing.AddAtSolutionCallback(self._record_incumbent)
+        self.manager, self.routing = manager, routing
+        return manager, routing
+
+    def _record_incumbent(self):
+        if self.prizes is None and self._unperformed(None):
+            # a solution missing nodes only pays their penalty
+            return
+        objective = self.routing.CostVar().Max()
+        if not self.incumbents or objective < self.incumbents[-1][1]:
+            self.incumbents.append((round(time.monotonic() - self._started, 4), objective))
+
+    def _add_time(self, manager, routing, transit):
+        """The time dimension: time windows, duration limit and depot resources."""
+        horizon = self._horizon()
+        # vehicles may wait up to the whole horizon, and do not have to leave at time 0
+        routing.AddDimension(transit, horizon, horizon, False, 'Time')
+        time_dimension = routing.GetDimensionOrDie('Time')
+
+        if self.time_windows is not None:
+            for node, (start, end) in enumerate(self.time_windows):
+                if node not in self.depots:
+                    time_dimension.CumulVar(manager.NodeToIndex(node)).SetRange(start, end)
+            for vehicle in range(self.num_vehicles):
+                time_dimension.CumulVar(routing.Start(vehicle)).SetRange(*self.time_windows[self.starts[vehicle]])
+                if self.end_windows:
+                    time_dimension.CumulVar(routing.End(vehicle)).SetRange(*self.time_windows[self.ends[vehicle]])
+
+        if self.duration_limit is not None:
+            for vehicle in range(self.num_vehicles):
+                time_dimension.SetSpanUpperBoundForVehicle(self.duration_limit, vehicle)
+
+        if self.depot_resource is not None:
+            load_time, unload_time, capacity = self.depot_resource
+            solver = routing.solver()
+            for depot in sorted(self.depots):
+                intervals = [solver.FixedDurationIntervalVar(time_dimension.CumulVar(routing.Start(vehicle)),
+                                                             load_time, "depot_interval")
+                             for vehicle in range(self.num_vehicles) if self.starts[vehicle] == depot]
+                intervals += [solver.FixedDurationIntervalVar(time_dimension.CumulVar(routing.End(vehicle)),
+                                                              unload_time, "depot_interval")
+                              for vehicle in range(self.num_vehicles) if self.ends[vehicle] == depot]
+                solver.Add(solver.Cumulative(intervals, [1] * len(intervals), capacity, f"depot_{depot}"))
+
+        # leave as late and come back as early as the solution allows
+        for vehicle in range(self.num_vehicles):
+            routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.Start(vehicle)))
+            routing.AddVariableMinimizedByFinalizer(time_dimension.CumulVar(routing.End(vehicle)))
+
+    def _paired_routes(self, routes):
+        """The routes without the pickups and deliveries whose pair is not on the same route, pickup first."""
+        position = {node: (vehicle, i) for vehicle, route in enumerate(routes) for i, node in enumerate(route)}
+        dropped = set()
+        for pickup, delivery in self.pickups_deliveries:
+            if pickup not in position or delivery not in position or not (
+                    position[pickup][0] == position[delivery][0] and position[pickup][1] < position[delivery][1]):
+                dropped.update((pickup, delivery))
+        return [[node for node in route if node not in dropped] for route in routes]
+
+    def _read(self, routes):
+        """The assignment of routes of nodes, or None when they do not fit the model."""
+        return self.routing.ReadAssignmentFromRoutes(
+            [[self.manager.NodeToIndex(node) for node in route] for route in routes], True)
+
+    def _insert_missing(self, routes):
+        """Insert the nodes the routes miss where it is cheapest and fits, a pickup with its delivery."""
+        read = self._read
+        delivery_of = dict(self.pickups_deliveries)
+        deliveries = set(delivery_of.values())
+        visited = {node for route in routes for node in route}
+        for node in range(self.num_nodes):
+            if node in self.depots or node in visited or node in deliveries:
+                continue
+            delivery = delivery_of.get(node)
+            paths = [[self.starts[vehicle]] + route + [self.ends[vehicle]] for vehicle, route in enumerate(routes)]
+            _, vehicles, positions, later = cheapest_insertions(self._transits(), paths, node, delivery)
+            for vehicle, i, j in zip(vehicles[:INSERTION_TRIES], positions[:INSERTION_TRIES], later[:INSERTION_TRIES]):
+                route = insert_request(routes[vehicle], node, i, delivery, j)
+                trial = routes[:vehicle] + [route] + routes[vehicle + 1:]
+                if read(trial) is not None:
+                    routes = trial
+                    break
+        return routes
+
+    def _initial_assignment(self):
+        """
+        The assignment of the initial routes, without the visits that do not fit the constraints, and
+        with the nodes they miss inserted where they fit.
+
+        When the routes do not fit as a whole, each route is kept as it is if it fits, or else rebuilt
+        node by node in its order, keeping each node (a pickup with its delivery) that still fits. Unless
+        the nodes have prizes, the nodes missing then are inserted at the cheapest of INSERTION_TRIES
+        positions that fits; those that fit none of them are left to the search.
+        """
+        routes = self._paired_routes(self.initial_routes)
+        read = self._read
+        if read(routes) is None:
+            delivered = {delivery: pickup for pickup, delivery in self.pickups_deliveries}
+            pickups = set(delivered.values())
+            repaired = [[] for _ in routes]
+            for vehicle, route in enumerate(routes):
+                if read(repaired[:vehicle] + [route] + repaired[vehicle + 1:]) is not None:
+                    repaired[vehicle] = route
+                    continue
+                accepted = set()
+                for node in route:
+                    if node in pickups:
+                        continue
+                    trial = accepted | {node, delivered.get(node, node)}
+                    candidate = [n for n in route if n in trial]
+                    if read(repaired[:vehicle] + [candidate] + repaired[vehicle + 1:]) is not None:
+                        accepted, repaired[vehicle] = trial, candidate
+            routes = repaired
+        kept = sum(len(route) for route in routes)
+        if self.prizes is None:
+            routes = self._insert_missing(routes)
+        self.warm_start = {'nodes': sum(len(route) for route in self.initial_routes), 'kept': kept,
+                           'inserted': sum(len(route) for route in routes) - kept}
+        return read(routes)
+
+    def _unperformed(self, solution=False):
+        """The number of nodes a solution (the last one by default, the one being recorded with None) leaves out."""
+        solution = self.solution if solution is False else solution
+        value = (lambda var: var.Value()) if solution is None else solution.Value
+        return sum(1 for index in range(self.routing.Size())
+                   if not self.routing.IsStart(index) and value(self.routing.NextVar(index)) == index)
+
+    def solve(self, search_parameters=None, profile='fast', time_limit=None, deadline=None):
+        """
+        Build the model and solve it, recording each better solution found in incumbents.
+
+        With initial routes (see add_initial_routes) the search starts from them, and warm_start
+        records how many of their nodes were kept and how many nodes were inserted into them:
+        {"nodes", "kept", "inserted"}.
+
+        Anytime mode: with a deadline the search stops by then whatever its profile, and the best
+        solution found so far is returned.
+
+        With neighbor arcs (see add_neighbor_arcs), the first solution is looked for in
+        NEIGHBOR_ARCS_PROBE_SHARE of the time limit; without one, the model is rebuilt with
+        NEIGHBOR_ARCS_GROWTH times more neighbor arcs and tried again, until one is found or all the
+        arcs are kept, and the search then goes on from it for the rest of the time limit.
+
+        With time windows, the nodes a first solution cannot reach in time are left out at a penalty, and
+        when they are still out after a descent, the first solution of the next TIME_WINDOW_FALLBACKS
+        strategy is tried instead.
+
+        Args:
+            search_parameters: the pywrapcp search parameters, instead of those of the profile
+            profile: a name of SEARCH_PROFILES, 'fast' by default: the PATH_CHEAPEST_ARC first solution
+                improved to a local optimum, within 30 seconds
+            time_limit: seconds of search, instead of the time limit of the profile
+            deadline: a time.monotonic() time to stop the search at
+
+        Returns:
+            the objective value of the solution, or -1 when none was found
+        """
+        if search_parameters is None:
+            search_parameters = search_profile(profile, time_limit)
+        self.incumbents = []
+        self._started = time.monotonic()
+        if not self._restricted():
+            return self._solve(search_parameters, deadline)
+
+        limit = None
+        if search_parameters.HasField('time_limit'):
+            limit = search_parameters.time_limit.ToMilliseconds() / 1000
+        if deadline is None and limit is not None:
+            # the tries with wider neighbor arcs share the time limit
+            deadline = self._started + limit
+        probe = type(search_parameters)()
+        probe.CopyFrom(search_parameters)
+        probe.solution_limit = 1
+        while self._restricted():
+            seconds = limit * NEIGHBOR_ARCS_PROBE_SHARE if limit is not None else NEIGHBOR_ARCS_PROBE_SECONDS
+            probe.time_limit.FromMilliseconds(int(seconds * 1000))
+            if self._solve(probe, deadline) >= 0:
+                # the rest of the search, from the first solution
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self._objective()
+                    search_parameters.time_limit.FromMilliseconds(int(remaining * 1000))
+                self.solution = self.routing.SolveFromAssignmentWithParameters(self.solution, search_parameters) \
+                    or self.solution
+                return self._objective()
+            if deadline is not None and time.monotonic() >= deadline:
+                return -1
+            self.neighbor_arcs *= NEIGHBOR_ARCS_GROWTH
+            self.manager = self.routing = None
+        return self._solve(search_parameters, deadline)
+
+    def _objective(self):
+        """The objective value of the solution, or -1 without one or when it leaves out nodes it may not."""
+        if not self.solution or (self.prizes is None and self._unperformed()):
+            return -1
+        return self.solution.ObjectiveValue()
+
+    def _solve(self, search_parameters, deadline):
+        """Build the model and solve it once; the objective value, or -1."""
+        _, routing = self.build()
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return -1
+            if not search_parameters.HasField('time_limit') or search_parameters.time_limit.ToSeconds() > remaining:
+                search_parameters.time_limit.FromMilliseconds(int(remaining * 1000))
+        if self.initial_routes is None:
+            if self.time_windows is not None and self.prizes is None:
+                self.solution = self._search_time_windows(search_parameters, deadline)
+            else:
+                self.solution = routing.SolveWithParameters(search_parameters)
+            return self._objective()
+
+        routing.CloseModelWithParameters(search_parameters)
+        assignment = self._initial_assignment()
+        if assignment is None:
+            self.solution = routing.SolveWithParameters(search_parameters)
+        else:
+            self.solution = routing.SolveFromAssignmentWithParameters(assignment, search_parameters)
+        return self._objective()
+
+    def _search_time_windows(self, search_parameters, deadline):
+        """
+        The search of a model with time windows, from the first solution of its profile, or else of the
+        TIME_WINDOW_FALLBACKS, that leaves out no node once improved by a descent; from the one that leaves
+        out the fewest when they all do, with a guided local search if the profile only descends. Each first
+        solution has an equal share of the time left with the search after them, on a model built anew, as
+        a model solved before gives the heuristics other solutions.
+        """
+        if deadline is None and search_parameters.HasField('time_limit'):
+            deadline = time.monotonic() + search_parameters.time_limit.ToMilliseconds() / 1000
+        strategies = [search_parameters.first_solution_strategy]
+        strategies += [getattr(routing_enums_pb2.FirstSolutionStrategy, name) for name in TIME_WINDOW_FALLBACKS
+                       if getattr(routing_enums_pb2.FirstSolutionStrategy, name) not in strategies]
+        probe = type(search_parameters)()
+        probe.CopyFrom(search_parameters)
+        probe.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GREEDY_DESCENT
+        # (nodes left out, manager, routing model, solution) of the best first solution
+        best = None
+        for k, strategy in enumerate(strategies):
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                probe.time_limit.FromMilliseconds(int(remaining / (len(strategies) - k + 1) * 1000))
+            if k:
+                self.manager = self.routing = None
+                self.build()
+            probe.first_solution_strategy = strategy
+            solution = self.routing.SolveWithParameters(probe)
+            if solution and (best is None or self._unperformed(solution) < best[0]):
+                best = (self._unperformed(solution), self.manager, self.routing, solution)
+            if best is not None and best[0] == 0:
+                break
+        if best is None:
+            return None
+        missing, self.manager, self.routing, solution = best
+        metaheuristics = routing_enums_pb2.LocalSearchMetaheuristic
+        if missing and search_parameters.local_search_metaheuristic in (metaheuristics.AUTOMATIC,
+                                                                         metaheuristics.GREEDY_DESCENT):
+            # a descent stops where it is, with the nodes left out; the guided local search goes on inserting them
+            search_parameters.local_search_metaheuristic = metaheuristics.GUIDED_LOCAL_SEARCH
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return solution
+            search_parameters.time_limit.FromMilliseconds(int(remaining * 1000))
+        return self.routing.SolveFromAssignmentWithParameters(solution, search_parameters) or solution
+
+    def routes(self):
+        """The node sequence of each vehicle in the last solution, depots included, or None without one."""
+        if not self.solution:
+            return None
+        routes = []
+        for vehicle in range(self.num_vehicles):
+            index, route = self.routing.Start(vehicle), []
+            while not self.routing.IsEnd(index):
+                route.append(self.manager.IndexToNode(index))
+                index = self.solution.Value(self.routing.NextVar(index))
+            routes.append(route + [self.manager.IndexToNode(index)])
+        return routes
+
+
+def model_from_params(params):
+    """
+    The RoutingModelBuilder of a problem given by the params of the gene_codes solvers, by their names.
+
+    Args:
+        params: the params_dict of the problem, e.g. loaded with instances.load_instance
+
+    Returns:
+        the RoutingModelBuilder, not built yet
+    """
+    matrix = params['time_matrix'] if 'time_matrix' in params else params['distance_matrix']
+    model = RoutingModelBuilder(matrix, params.get('num_vehicle', params.get('num_vehicles', 1)),
+                                depot=params.get('depot', 0), starts=params.get('starts'), ends=params.get('ends'))
+    if 'service_time' in params:
+        model.add_service_times(params['service_time'])
+    if 'demands' in params:
+        model.add_capacity(params['demands'], params.get('vehicle_capacities', params.get('vehicle_capacity')))
+    limit = params.get('distance_limit', params.get('max_distance'))
+    if limit is not None:
+        model.add_distance_limit(limit)
+    if 'time_windows' in params:
+        model.add_time_windows(params['time_windows'])
+    if 'duration_limit' in params:
+        model.add_duration_limit(params['duration_limit'])
+    if 'pickups_deliveries' in params:
+        model.add_pickups_deliveries(params['pickups_deliveries'])
+    if 'prizes' in params:
+        model.add_prizes(params['prizes'])
+    if 'depot_capacity' in params:
+        model.add_depot_resource(params['vehicle_load_time'], params['vehicle_unload_time'], params['depot_capacity'])
+    return model
+
+
+def describe(names):
+    """
+    Comment lines describing the toolkit functions and classes of the given names, for code templates.
+
+    A class is described by its constructor and its public methods, each by its signature and the
+    first line of its docstring.
+    """
+    lines = []
+    for name in names:
+        obj = globals().get(name)
+        if obj is None or name.startswith('_'):
+            continue
+        if inspect.isclass(obj):
+            # (label, function, documented object), without self
+            members = [(name, obj.__init__, obj)] + [(f"    .{method}", function, function)
+                                                     for method, function in vars(obj).items()
+                                                     if inspect.isfunction(function) and not method.startswith('_')]
+        else:
+            members = [(name, obj, obj)]
+        for label, function, documented in members:
+            parameters = list(inspect.signature(function).parameters.values())
+            if inspect.isclass(obj):
+                parameters = parameters[1:]
+            signature = inspect.signature(function).replace(parameters=parameters)
+            summary = (inspect.getdoc(documented) or '').strip().splitlines()
+            lines.append(f"# {label}{signature}" + (f": {summary[0]}" if summary else ''))
+    return lines
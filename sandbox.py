@@ -0,0 +1,526 @@
+import ast
+import copy
+import json
+import os
+import re
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import types
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Solver entry points timed by the profiler: (module, class, methods).
+SOLVE_METHODS = [
+    ('ortools.constraint_solver.pywrapcp', 'RoutingModel',
+     ['Solve', 'SolveWithParameters', 'SolveFromAssignmentWithParameters']),
+    ('ortools.sat.python.cp_model', 'CpSolver', ['Solve', 'solve', 'SolveWithSolutionCallback']),
+    ('ortools.linear_solver.pywraplp', 'Solver', ['Solve']),
+    ('gurobipy', 'Model', ['optimize']),
+]
+
+# Seconds a batch worker may take beyond the timeout of a candidate: to start, e.g. to import the solvers, and
+# to kill a forked candidate itself. A candidate without a verdict by then gets the worker killed by run_batch.
+BATCH_GRACE = 10
+# Seconds between two reads of the verdicts of a batch worker.
+BATCH_POLL = 0.05
+
+# Registrations of Python callbacks whose invocations are counted by the profiler.
+CALLBACK_METHODS = [
+    ('ortools.constraint_solver.pywrapcp', 'RoutingModel',
+     ['RegisterTransitCallback', 'RegisterUnaryTransitCallback',
+      'RegisterPositiveTransitCallback', 'RegisterPositiveUnaryTransitCallback']),
+]
+
+
+def patch_methods(targets, wrap):
+    """Replace the methods of targets by wrap(method); returns what was patched, for unpatch_methods."""
+    patched = []
+    for module_name, cls_name, methods in targets:
+        # only modules the candidate imported are patched, the sandbox never imports a solver itself
+        cls = getattr(sys.modules.get(module_name), cls_name, None)
+        if cls is None:
+            continue
+        for name in methods:
+            method = cls.__dict__.get(name)
+            if method is None or not callable(method):
+                continue
+            try:
+                setattr(cls, name, wrap(method))
+                patched.append((cls, name, method))
+            except (TypeError, AttributeError):
+                pass  # extension types that do not allow patching are left as they are
+    return patched
+
+
+def unpatch_methods(patched):
+    for cls, name, method in reversed(patched):
+        setattr(cls, name, method)
+
+
+class Profiler:
+    """
+    Splits the execution of a candidate into model building and solving.
+
+    The solver entry points of the modules the candidate imported are wrapped, so the time before
+    the first solver call counts as model building; transit callbacks are wrapped to count how
+    often the solver calls back into Python. The branches and solutions of the routing searches
+    measure how much of the search space the solve time covered, and their incumbents, the better
+    solutions as they are found, how the quality grew with the time. The routes of the last routing
+    solution are kept, for a later solve to start from (see RoutingModelBuilder.add_initial_routes).
+    """
+
+    def __init__(self):
+        self.patched = []
+        self.depth = 0
+        self.start = None
+        self.end = None
+        self.first_solve = None
+        self.solve_time = 0.
+        self.solver_calls = 0
+        self.callback_calls = 0
+        self.branches = None
+        self.solutions = None
+        self.incumbents = []
+        self.traced = set()
+        self.solve_begin = None
+        self.managers = {}
+        self.routes = None
+
+    def _timed(self, method):
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            if profiler.depth:
+                return method(*args, **kwargs)
+            profiler.depth += 1
+            begin = time.perf_counter()
+            if profiler.first_solve is None:
+                profiler.first_solve = begin
+            profiler.solve_begin = begin
+            profiler.trace_incumbents(args[0])
+            try:
+                solution = method(*args, **kwargs)
+                profiler.record_routes(args[0], solution)
+                return solution
+            finally:
+                profiler.solve_time += time.perf_counter() - begin
+                profiler.solver_calls += 1
+                profiler.depth -= 1
+                profiler.count_search(args[0])
+        return wrapper
+
+    def trace_incumbents(self, model):
+        """Record the better solutions of a routing model, as (seconds since its solve began, objective)."""
+        if not hasattr(model, 'AddAtSolutionCallback') or id(model) in self.traced:
+            return
+        self.traced.add(id(model))
+        profiler = self
+
+        def record():
+            objective = model.CostVar().Max()
+            if not profiler.incumbents or objective < profiler.incumbents[-1][1]:
+                profiler.incumbents.append([round(time.perf_counter() - profiler.solve_begin, 4), objective])
+        model.AddAtSolutionCallback(record)
+
+    def _managed(self, method):
+        profiler = self
+
+        def wrapper(model, manager, *args, **kwargs):
+            method(model, manager, *args, **kwargs)
+            # the routing model does not give back its manager, which converts its indices into nodes
+            profiler.managers[id(model)] = manager
+        return wrapper
+
+    def record_routes(self, model, solution):
+        """Keep the node sequence of each vehicle in a routing solution, depots included."""
+        manager = self.managers.get(id(model))
+        if manager is None or not solution:
+            return
+        routes = []
+        for vehicle in range(model.vehicles()):
+            index, route = model.Start(vehicle), []
+            while not model.IsEnd(index):
+                route.append(manager.IndexToNode(index))
+                index = solution.Value(model.NextVar(index))
+            routes.append(route + [manager.IndexToNode(index)])
+        self.routes = routes
+
+    def count_search(self, model):
+        """Add up the branches and solutions of a routing model after a solve (other solvers are skipped)."""
+        solver = getattr(model, 'solver', None)
+        if not callable(solver) or not hasattr(solver(), 'Branches'):
+            return
+        self.branches = (self.branches or 0) + solver().Branches()
+        self.solutions = (self.solutions or 0) + solver().Solutions()
+
+    def _counted(self, method):
+        profiler = self
+
+        def wrapper(model, callback, *args, **kwargs):
+            def counted_callback(*callback_args):
+                profiler.callback_calls += 1
+                return callback(*callback_args)
+            return method(model, counted_callback, *args, **kwargs)
+        return wrapper
+
+    def install(self):
+        self.patched += patch_methods(SOLVE_METHODS, self._timed)
+        self.patched += patch_methods(CALLBACK_METHODS, self._counted)
+        self.patched += patch_methods([('ortools.constraint_solver.pywrapcp', 'RoutingModel', ['__init__'])],
+                                      self._managed)
+
+    def uninstall(self):
+        unpatch_methods(self.patched)
+        self.patched = []
+
+    def run(self, fn, *args):
+        self.install()
+        self.start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.end = time.perf_counter()
+            self.uninstall()
+
+    def report(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        start = self.start if self.start is not None else end
+        build_end = self.first_solve if self.first_solve is not None else end
+        peak_memory = None
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            scale = 1 if sys.platform == 'darwin' else 1024
+            peak_memory = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+        return {
+            "build_time": round(build_end - start, 4),
+            "solve_time": round(self.solve_time, 4),
+            "total_time": round(end - start, 4),
+            "solver_calls": self.solver_calls,
+            "callback_calls": self.callback_calls,
+            "branches": self.branches,
+            "solutions": self.solutions,
+            "incumbents": self.incumbents,
+            "routes": self.routes,
+            "peak_memory_mb": peak_memory,
+        }
+
+
+class SearchLimits:
+    """
+    Overrides the search parameters of every solver call of a candidate.
+
+    Used to give the saved solvers the same time limit (and, for routing, the same metaheuristic)
+    whatever they set themselves, e.g. for long reference solves or benchmarks.
+
+    Args:
+        time_limit: time limit of each solver call, in seconds
+        metaheuristic: name of a routing_enums_pb2.LocalSearchMetaheuristic (e.g. 'GUIDED_LOCAL_SEARCH'),
+            for the routing solver only
+        profile: name of a routing_toolkit.SEARCH_PROFILES, whose first solution strategy and
+            metaheuristic replace those of the routing solver (before metaheuristic, if both are given)
+        first_solution: name of a routing_enums_pb2.FirstSolutionStrategy (e.g. 'SAVINGS'), for the
+            routing solver only
+    """
+
+    def __init__(self, time_limit=None, metaheuristic=None, profile=None, first_solution=None):
+        self.time_limit = time_limit
+        self.metaheuristic = metaheuristic
+        self.profile = profile
+        self.first_solution = first_solution
+        self.patched = []
+
+    def routing_parameters(self, parameters):
+        if self.profile is not None:
+            from routing_toolkit import search_profile
+            profiled = search_profile(self.profile)
+            parameters.first_solution_strategy = profiled.first_solution_strategy
+            parameters.local_search_metaheuristic = profiled.local_search_metaheuristic
+        if self.time_limit is not None:
+            parameters.time_limit.FromMilliseconds(int(self.time_limit * 1000))
+        if self.metaheuristic is not None:
+            from ortools.constraint_solver import routing_enums_pb2
+            parameters.local_search_metaheuristic = getattr(routing_enums_pb2.LocalSearchMetaheuristic,
+                                                            self.metaheuristic)
+        if self.first_solution is not None:
+            from ortools.constraint_solver import routing_enums_pb2
+            parameters.first_solution_strategy = getattr(routing_enums_pb2.FirstSolutionStrategy,
+                                                         self.first_solution)
+        return parameters
+
+    def _routing_solve(self, method):
+        limits = self
+
+        def wrapper(model, *args, **kwargs):
+            if args or kwargs:
+                return method(model, *args, **kwargs)
+            # Solve() without arguments uses the default parameters, which are limited instead
+            from ortools.constraint_solver import pywrapcp
+            return model.SolveWithParameters(limits.routing_parameters(pywrapcp.DefaultRoutingSearchParameters()))
+        return wrapper
+
+    def _routing_solve_with_parameters(self, method):
+        limits = self
+
+        def wrapper(model, parameters, *args, **kwargs):
+            return method(model, limits.routing_parameters(parameters), *args, **kwargs)
+        return wrapper
+
+    def _routing_solve_from_assignment(self, method):
+        limits = self
+
+        def wrapper(model, assignment, parameters, *args, **kwargs):
+            return method(model, assignment, limits.routing_parameters(parameters), *args, **kwargs)
+        return wrapper
+
+    def _cp_sat_solve(self, method):
+        limits = self
+
+        def wrapper(solver, *args, **kwargs):
+            solver.parameters.max_time_in_seconds = limits.time_limit
+            return method(solver, *args, **kwargs)
+        return wrapper
+
+    def _linear_solve(self, method):
+        limits = self
+
+        def wrapper(solver, *args, **kwargs):
+            solver.SetTimeLimit(int(limits.time_limit * 1000))
+            return method(solver, *args, **kwargs)
+        return wrapper
+
+    def _gurobi_optimize(self, method):
+        limits = self
+
+        def wrapper(model, *args, **kwargs):
+            model.Params.TimeLimit = limits.time_limit
+            return method(model, *args, **kwargs)
+        return wrapper
+
+    def install(self):
+        routing = 'ortools.constraint_solver.pywrapcp'
+        self.patched += patch_methods([(routing, 'RoutingModel', ['Solve'])], self._routing_solve)
+        self.patched += patch_methods([(routing, 'RoutingModel', ['SolveWithParameters'])],
+                                      self._routing_solve_with_parameters)
+        self.patched += patch_methods([(routing, 'RoutingModel', ['SolveFromAssignmentWithParameters'])],
+                                      self._routing_solve_from_assignment)
+        if self.time_limit is not None:
+            self.patched += patch_methods([('ortools.sat.python.cp_model', 'CpSolver', ['Solve', 'solve'])],
+                                          self._cp_sat_solve)
+            self.patched += patch_methods([('ortools.linear_solver.pywraplp', 'Solver', ['Solve'])],
+                                          self._linear_solve)
+            self.patched += patch_methods([('gurobipy', 'Model', ['optimize'])], self._gurobi_optimize)
+
+    def uninstall(self):
+        unpatch_methods(self.patched)
+        self.patched = []
+
+
+def parse_objective(result):
+    """Extract the objective the same way write_and_run does: the number as a string, or -1."""
+    match = re.search(r'^\s*([\d.]+)', str(result))
+    if match is not None:
+        return match.group(1)
+    return -1
+
+
+def load_candidate(index, source):
+    """Execute a candidate in its own module namespace, so candidates cannot see each other."""
+    module = types.ModuleType(f"candidate_{index}")
+    exec(compile(source, f"<candidate_{index}>", "exec"), module.__dict__)
+    return module
+
+
+def run_candidate(index, source, params, limits=None):
+    profiler = Profiler()
+    search_limits = SearchLimits(**limits) if limits else None
+    try:
+        module = load_candidate(index, source)
+        if search_limits is not None:
+            # installed after the candidate imported its solver, and under the profiler's timing wrappers
+            search_limits.install()
+        # solve functions may modify their arguments in place, so every candidate gets its own copy
+        result = profiler.run(module.solve, *copy.deepcopy(list(params.values())))
+        return {"index": index, "status": "ok", "obj": str(result), "profile": profiler.report()}
+    except Exception as e:
+        return {"index": index, "status": "error", "profile": profiler.report(),
+                "error": f"Error: {e}\nTraceback: {traceback.format_exc()}"}
+    finally:
+        if search_limits is not None:
+            search_limits.uninstall()
+
+
+def run_forked(index, source, params, timeout, limits=None):
+    """Run one candidate in a forked child, which inherits the already imported modules of the worker."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # the child must never return into the worker loop, whatever the candidate raises
+        try:
+            os.close(read_fd)
+            payload = json.dumps(run_candidate(index, source, params, limits))
+            with os.fdopen(write_fd, 'w') as f:
+                f.write(payload)
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        ready, _, _ = select.select([f], [], [], timeout)
+        if not ready:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            return {"index": index, "status": "timeout", "error": f"Timed out after {timeout} seconds"}
+        payload = f.read()
+    os.waitpid(pid, 0)
+    if not payload:
+        return {"index": index, "status": "error", "error": "Error: the candidate process crashed"}
+    return json.loads(payload)
+
+
+def preload_imports(sources):
+    """Import the modules of all candidates once in the worker, so forked children share them."""
+    for source in sources:
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            continue
+        for node in tree.body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                try:
+                    exec(compile(ast.Module(body=[node], type_ignores=[]), "<imports>", "exec"), {})
+                except Exception:
+                    pass
+
+
+def worker(batch_path, params_path, results_path):
+    with open(batch_path, 'r') as f:
+        batch = json.load(f)
+    if os.path.isdir(params_path):
+        from instances import load_instance
+        params = load_instance(params_path)
+    else:
+        with open(params_path, 'r') as f:
+            params = json.load(f)
+
+    fork = batch['fork'] and hasattr(os, 'fork')
+    start = batch.get('start', 0)
+    if fork:
+        preload_imports(batch['sources'][start:])
+    for index, source in enumerate(batch['sources'][start:], start):
+        if fork:
+            verdict = run_forked(index, source, params, batch['timeout'], batch.get('limits'))
+        else:
+            verdict = run_candidate(index, source, params, batch.get('limits'))
+        # results are flushed one by one, so a worker killed by the global timeout still reports the finished ones
+        with open(results_path, 'a') as f:
+            f.write(json.dumps(verdict) + "\n")
+
+
+def _watch(command, results_path, start, count, timeout, margin, verdicts):
+    """
+    Run a batch worker from a candidate until it exits, reading the verdicts it writes into verdicts.
+
+    The candidate the worker stops on gets its verdict here: a timeout when it gave no verdict for timeout
+    seconds plus margin (plus BATCH_GRACE for the first), and the worker was killed; an error when the worker
+    exited before the last of the count candidates, e.g. the candidate crashed the interpreter or called exit.
+
+    Returns:
+        the index of the candidate to start a new worker from, or None when the worker gave all the verdicts
+    """
+    position = os.path.getsize(results_path)
+    current = start
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout + margin + BATCH_GRACE
+    while True:
+        exited = process.poll() is not None
+        with open(results_path, 'rb') as f:
+            f.seek(position)
+            written = f.read()
+        # a verdict being written is read once its line is complete
+        complete = written[:written.rfind(b"\n") + 1]
+        position += len(complete)
+        for line in complete.decode().splitlines():
+            verdict = json.loads(line)
+            verdicts[verdict['index']] = verdict
+            current = verdict['index'] + 1
+            deadline = time.monotonic() + timeout + margin
+        if exited:
+            if current >= count:
+                return None
+            print(f"Batch worker failed with exit code {process.returncode} on candidate {current}")
+            verdicts[current] = {"index": current, "status": "error", "error": "Error: the candidate process crashed"}
+            return current + 1
+        if time.monotonic() > deadline:
+            process.kill()
+            process.wait()
+            print(f"Batch worker timed out after {timeout} seconds on candidate {current}")
+            verdicts[current] = {"index": current, "status": "timeout", "error": f"Timed out after {timeout} seconds"}
+            return current + 1
+        time.sleep(BATCH_POLL)
+
+
+def run_batch(sources, params, timeout=60, fork=True, limits=None):
+    """
+    Verify several candidates for the same problem in a single worker process.
+
+    A candidate that runs over its timeout is stopped either way: its forked child is killed by the
+    worker, or, when the candidates run inside the worker, the worker itself is killed and started
+    again on the next candidate. The same goes for a candidate that takes the worker down with it.
+
+    Args:
+        sources: the imports and code of each candidate
+        params: the params_dict of the problem, deserialized once and shared by all candidates
+            (read from the instance files when it was loaded with instances.load_instance)
+        timeout: time limit per candidate, in seconds
+        fork: run each candidate in a forked child of the worker (isolated, killed on timeout);
+            otherwise the candidates run sequentially inside the worker
+        limits: keyword arguments of SearchLimits overriding the search of every solver call,
+            e.g. {"time_limit": 60, "metaheuristic": "GUIDED_LOCAL_SEARCH"}
+
+    Returns:
+        a verdict per candidate, in order: {"index", "status": "ok"|"error"|"timeout", "obj" or "error", "profile"}
+    """
+    paths = []
+    instance_path = getattr(params, 'path', None)
+    verdicts = {}
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.json', mode='w') as f:
+            paths.append(f.name)
+        if instance_path is None:
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.json', mode='w') as f:
+                json.dump(params, f)
+                paths.append(f.name)
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.jsonl', mode='w') as f:
+            paths.append(f.name)
+        if instance_path is not None:
+            # params loaded from an instance are read by the worker from the same files
+            paths.insert(1, os.path.abspath(instance_path))
+
+        start = 0
+        while start is not None and start < len(sources):
+            with open(paths[0], 'w') as f:
+                json.dump({'sources': sources, 'timeout': timeout, 'fork': fork, 'limits': limits, 'start': start}, f)
+            # forked candidates are killed by the worker, which is only killed when it fails to
+            margin = BATCH_GRACE if fork and hasattr(os, 'fork') else 0
+            start = _watch([sys.executable, os.path.abspath(__file__)] + paths, paths[2], start, len(sources),
+                           timeout, margin, verdicts)
+    finally:
+        for path in paths:
+            if instance_path is None or path != os.path.abspath(instance_path):
+                os.remove(path)
+
+    return [verdicts.get(i, {"index": i, "status": "timeout", "error": "The batch worker stopped before this candidate"})
+            for i in range(len(sources))]
+
+
+if __name__ == "__main__":
+    worker(*sys.argv[1:4])
@@ -1,33 +1,22 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain.globals import set_debug
 from common import *
 import numpy as np
 from langchain_experimental.llms.ollama_functions import OllamaFunctions
-from langchain_anthropic import ChatAnthropic
 import time
 import getpass
 from langchain_groq import ChatGroq
+from journal import load_state
+from tracking import current_usage
+from compaction import compact_messages
+from streaming import code_chain, invoke_code, ainvoke_code, check_generation, acheck_generation
+from llms import retrying, call_priority, GENERATION_PRIORITY
 
 set_debug(False)
 
 
-def run(params_dict, input, optimal, model, max_iterations=3, self_debug=True):
-    iters = 0
-    no_run_time_error = False
-    accu_solution = False
-
-    if model.startswith("gpt"):
-        llm = ChatOpenAI(model=model, temperature=0.0, verbose=True)
-    elif model.startswith("claude"):
-        llm = ChatAnthropic(model=model,
-                            temperature=0.0, max_tokens=5000)
-    elif model.startswith("llama"):
-        llm = ChatGroq(
-            model=model,
-            temperature=0,
-            max_tokens=None
-        )
+def build_chains(model, stream=False):
+    """The generation and debugging chains of the standard method, streamed with stream (see streaming.code_chain)."""
 
     pm = """
              Respond with the syntactically correct code for solving a {problem} using {solver}. Make sure you follow these rules:
@@ -77,34 +66,68 @@ Then list the imports. Finally list the functioning code block and solve the pro
         ]
     )
 
-    chain_1 = prompt_template_gen | llm.with_structured_output(code)
-    chain_2 = prompt_template_debugger | llm.with_structured_output(code)
+    if model.startswith("llama"):
+        llm = ChatGroq(
+            model=model,
+            temperature=0,
+            max_tokens=None
+        )
+        chain_1 = retrying(prompt_template_gen | llm.with_structured_output(code))
+        chain_2 = retrying(prompt_template_debugger | llm.with_structured_output(code))
+        return chain_1, chain_2
+    return code_chain(prompt_template_gen, model, stream=stream), code_chain(prompt_template_debugger, model,
+                                                                             stream=stream)
 
-    result = chain_1.invoke(input)
 
-    state = GraphState(error='', messages=[], generation=result, iterations=iters)
-    state = code_check(state, params_dict, optimal)
-    print("======== episode=" + str(int(iters)) + "=========")
-    print(state)
+def is_inaccurate(state):
+    """Whether the first message of a failed check says the code ran but its result is wrong."""
+    message = state['messages']
+    return len(message[0]) > 1 and ("The obj. is far from the optimum" in message[0][1]
+                                    or "You did not finish the function" in message[0][1]
+                                    or "You solution returns nothing or 0" in message[0][1])
+
+
+def run(params_dict, input, optimal, model, max_iterations=3, self_debug=True, profile_hint=False,
+        journal=None, checkpoint=None, stream=False):
+    iters = 0
+    no_run_time_error = False
+    accu_solution = False
+
+    chain_1, chain_2 = build_chains(model, stream)
+
+    if checkpoint is not None:
+        # Resume from the state journaled after the last checked candidate
+        iters = checkpoint['iteration']
+        no_run_time_error = checkpoint['no_run_time_error']
+        state = load_state(checkpoint['state'], code)
+    else:
+        state = check_generation(lambda: invoke_code(chain_1, input, stream), params_dict, optimal,
+                                 input.get('code_example'), profile_hint, iters)
+        print("======== episode=" + str(int(iters)) + "=========")
+        print(state)
+        if journal is not None:
+            journal.checkpoint(input['problem'], iters, state, no_run_time_error, usage=current_usage())
     while iters < max_iterations:
         if state['error'] != 'no':
             message = state['messages']
             if len(message[0]) > 1:
-                if ("The obj. is far from the optimum" in message[0][1]
-                        or "You did not finish the function" in message[0][1] or "You solution returns nothing or 0" in message[0][1]):
+                if is_inaccurate(state):
                     print("no_run_time_error, but the solution is not accurate")
                     no_run_time_error = True
                 if self_debug:
-                    res = chain_2.invoke(
-                        {'solver': 'OR-tools', 'prep_code': state['generation'].imports + "\n" + state['generation'].code,
-                         'message': state['messages']})
+                    chain, chain_input = chain_2, {
+                        'solver': 'OR-tools', 'prep_code': state['generation'].imports + "\n" + state['generation'].code,
+                        'message': compact_messages(state['messages'])}
                 else:
-                    res = chain_1.invoke(input)
-                state = GraphState(error='', messages=[], generation=res, iterations=iters)
-                state = code_check(state, params_dict, optimal)
+                    chain, chain_input = chain_1, input
+                with call_priority(GENERATION_PRIORITY + iters + 1):
+                    state = check_generation(lambda: invoke_code(chain, chain_input, stream), params_dict, optimal,
+                                             input.get('code_example'), profile_hint, iters)
                 iters += 1
                 print("======== episode=" + str(int(iters)) + "=========")
                 print(state)
+                if journal is not None:
+                    journal.checkpoint(input['problem'], iters, state, no_run_time_error, usage=current_usage())
                 if state['error'] == 'no':
                     print("---DONE---")
                     no_run_time_error = True
@@ -120,6 +143,55 @@ Then list the imports. Finally list the functioning code block and solve the pro
             return no_run_time_error, accu_solution
     return no_run_time_error, accu_solution
 
+async def arun(params_dict, input, optimal, model, max_iterations=3, self_debug=True, profile_hint=False,
+               journal=None, checkpoint=None, stream=False):
+    """Async variant of run: the LLM calls are awaited and the candidates checked in asyncio subprocesses."""
+    iters = 0
+    no_run_time_error = False
+
+    chain_1, chain_2 = build_chains(model, stream)
+
+    if checkpoint is not None:
+        iters = checkpoint['iteration']
+        no_run_time_error = checkpoint['no_run_time_error']
+        state = load_state(checkpoint['state'], code)
+    else:
+        state = await acheck_generation(lambda: ainvoke_code(chain_1, input, stream), params_dict, optimal,
+                                        input.get('code_example'), profile_hint, iters)
+        print("======== episode=" + str(int(iters)) + "=========")
+        print(state)
+        if journal is not None:
+            journal.checkpoint(input['problem'], iters, state, no_run_time_error, usage=current_usage())
+
+    while iters < max_iterations and state['error'] != 'no':
+        if len(state['messages'][0]) <= 1:
+            # there is no error message to refine the code from (run would loop on it forever)
+            break
+        if is_inaccurate(state):
+            print("no_run_time_error, but the solution is not accurate")
+            no_run_time_error = True
+        if self_debug:
+            chain, chain_input = chain_2, {
+                'solver': 'OR-tools', 'prep_code': state['generation'].imports + "\n" + state['generation'].code,
+                'message': compact_messages(state['messages'])}
+        else:
+            chain, chain_input = chain_1, input
+        # the calls of problems further along are served first
+        with call_priority(GENERATION_PRIORITY + iters + 1):
+            state = await acheck_generation(lambda: ainvoke_code(chain, chain_input, stream), params_dict, optimal,
+                                            input.get('code_example'), profile_hint, iters)
+        iters += 1
+        print("======== episode=" + str(int(iters)) + "=========")
+        print(state)
+        if journal is not None:
+            journal.checkpoint(input['problem'], iters, state, no_run_time_error, usage=current_usage())
+
+    if state['error'] == 'no':
+        print("---DONE---")
+        return True, True
+    return no_run_time_error, False
+
+
 if __name__ == "__main__":
     name, params, inputs, optimums = get_dataset()
     succ_metric = 0
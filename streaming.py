@@ -0,0 +1,196 @@
+import ast
+import asyncio
+import random
+import time
+
+from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
+
+from common import GraphState, acode_check, code, code_check
+from llms import MAX_ATTEMPTS, RETRYABLE_ERRORS, chat_model, provider, retrying
+from preflight import check_imports
+
+# Syntax errors of a complete statement followed by an unfinished one, which are not errors of the statement
+_UNFINISHED = ("never closed", "unterminated", "unexpected EOF", "EOF while")
+# Lines at the start of a statement that continue the previous one
+_CONTINUATIONS = ("else", "elif", "except", "finally", ")", "]", "}")
+
+
+class MalformedGeneration(Exception):
+    """A generation aborted while it was streamed, with what was generated so far."""
+
+    def __init__(self, generation, message):
+        self.generation = generation
+        self.message = message
+
+    def __str__(self):
+        return f'MalformedGeneration: {self.message}'
+
+    def state(self, iterations):
+        """The failed state of the generation, as code_check would return it."""
+        print("---STREAM CHECK: FAILED---")
+        return GraphState(generation=self.generation, iterations=iterations, error="yes",
+                          messages=[("user", f"Your solution was stopped while it was generated: {self.message}")])
+
+
+def code_chain(prompt, llm, max_tokens=5000, stream=False):
+    """
+    The chain of a prompt generating a code object.
+
+    With stream, the chain streams the arguments of the code tool call as they grow, instead of
+    returning the parsed object at the end, for stream_code to check them early.
+    """
+    model = chat_model(llm, max_tokens=max_tokens)
+    if not stream:
+        return retrying(prompt | model.with_structured_output(code))
+    # the tool choice forces the call as with_structured_output does, where the provider supports it
+    tool_choice = {} if provider(llm) == 'ollama' else {'tool_choice': 'code'}
+    return (prompt | model.bind_tools([code], **tool_choice)
+            | JsonOutputKeyToolsParser(key_name='code', first_tool_only=True))
+
+
+class StreamValidator:
+    """
+    Checks a code tool call while its arguments are streamed.
+
+    Only unambiguous failures abort the generation: imports that cannot be resolved, checked once they are
+    complete (i.e. once the model writes the next field), markdown fences, and a syntax error in the code up
+    to its last complete top-level statement. Everything else, e.g. the use of the solver APIs, is left to
+    code_check on the complete generation.
+    """
+
+    def __init__(self):
+        self.imports_checked = False
+        self.statements = 0
+
+    def feed(self, args):
+        """
+        Check the arguments streamed so far.
+
+        Raises:
+            MalformedGeneration: the generation can already be told to be wrong
+        """
+        imports = args.get('imports')
+        if not self.imports_checked and imports is not None and list(args)[-1] != 'imports':
+            self.imports_checked = True
+            try:
+                check_imports(imports)
+            except Exception as e:
+                raise MalformedGeneration(_partial(args), f"the imports failed the import test: {e}")
+
+        source = args.get('code')
+        if source is None:
+            return
+        if '```' in source:
+            raise MalformedGeneration(_partial(args), "the code contains markdown fences, return plain Python code.")
+        # the last line may still grow, and the last statement begun may still go on
+        lines = source.split('\n')[:-1]
+        starts = [i for i, line in enumerate(lines) if _starts_statement(line, lines[i - 1] if i else '')]
+        if len(starts) - 1 <= self.statements:
+            return
+        self.statements = len(starts) - 1
+        prefix = '\n'.join(lines[:starts[-1]])
+        try:
+            ast.parse(prefix)
+        except SyntaxError as e:
+            if any(reason in e.msg for reason in _UNFINISHED):
+                return
+            raise MalformedGeneration(_partial(args),
+                                      f"syntax error at line {e.lineno}: {e.msg}: {(e.text or '').strip()}")
+
+
+def _starts_statement(line, previous):
+    """Whether a line of code begins a top-level statement (unless it is inside a string or brackets)."""
+    return (line[:1].strip() != '' and not line.startswith('#') and not line.startswith(_CONTINUATIONS)
+            and not previous.startswith('@') and not previous.rstrip().endswith('\\'))
+
+
+def _partial(args):
+    return code(prefix=args.get('prefix', ''), imports=args.get('imports', ''), code=args.get('code', ''))
+
+
+def _backoff(attempt):
+    return min(2 ** attempt, 60) + random.uniform(0, 1)
+
+
+def stream_code(chain, input):
+    """
+    Stream a code generation, checking it as it arrives; leaving the stream closes it, aborting the generation.
+
+    The call is retried on the errors of retrying, as long as nothing was streamed yet.
+
+    Raises:
+        MalformedGeneration: the generation was aborted, or ended without a complete code object
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        validator = StreamValidator()
+        args = None
+        stream = chain.stream(input)
+        try:
+            for args in stream:
+                if args:
+                    validator.feed(args)
+        except RETRYABLE_ERRORS:
+            if args is not None or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+        finally:
+            stream.close()
+        return _complete(args)
+
+
+async def astream_code(chain, input):
+    """Async variant of stream_code."""
+    for attempt in range(MAX_ATTEMPTS):
+        validator = StreamValidator()
+        args = None
+        stream = chain.astream(input)
+        try:
+            async for args in stream:
+                if args:
+                    validator.feed(args)
+        except RETRYABLE_ERRORS:
+            if args is not None or attempt == MAX_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        finally:
+            await stream.aclose()
+        return _complete(args)
+
+
+def _complete(args):
+    if not args or any(args.get(field) is None for field in ('prefix', 'imports', 'code')):
+        raise MalformedGeneration(_partial(args or {}), "the answer did not include the description, the imports "
+                                                        "and the code.")
+    return code(prefix=args['prefix'], imports=args['imports'], code=args['code'])
+
+
+def invoke_code(chain, input, stream=False):
+    """Run a chain of code_chain, streamed or not."""
+    return stream_code(chain, input) if stream else chain.invoke(input)
+
+
+async def ainvoke_code(chain, input, stream=False):
+    """Async variant of invoke_code."""
+    return await astream_code(chain, input) if stream else await chain.ainvoke(input)
+
+
+def check_generation(generate, param_dict, optimal, template=None, hint=False, iterations=0):
+    """Check the candidate generate() returns with code_check; a generation aborted while streamed fails the check."""
+    try:
+        generation = generate()
+    except MalformedGeneration as e:
+        return e.state(iterations)
+    state = GraphState(error='', messages=[], generation=generation, iterations=iterations)
+    return code_check(state, param_dict, optimal, template, hint)
+
+
+async def acheck_generation(generate, param_dict, optimal, template=None, hint=False, iterations=0):
+    """Async variant of check_generation, generate() returning an awaitable."""
+    try:
+        generation = await generate()
+    except MalformedGeneration as e:
+        return e.state(iterations)
+    state = GraphState(error='', messages=[], generation=generation, iterations=iterations)
+    return await acode_check(state, param_dict, optimal, template, hint)
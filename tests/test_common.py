@@ -0,0 +1,35 @@
+import unittest
+
+from generator import generate
+from instances import select_params
+from tests.test_routing_toolkit import FAMILIES, load_gene_code
+
+try:
+    import common
+except ImportError:  # the LLM client packages are not installed
+    common = None
+
+
+def split_imports(source):
+    """The import lines of a gene code, and the rest of its code, as the code generation returns them."""
+    lines = source.splitlines()
+    imports = [line for line in lines if line.startswith(('import ', 'from '))]
+    return '\n'.join(imports), '\n'.join(line for line in lines if line not in imports)
+
+
+@unittest.skipIf(common is None, 'common needs the LLM client packages')
+class CodeCheckTest(unittest.TestCase):
+
+    def test_toolkit_gene_code(self):
+        # the harness runs from a temporary directory: the toolkit must be importable from the first line of the code
+        superset, _ = generate('CVRP', 24, seed=0, families=FAMILIES)
+        params = select_params(superset, FAMILIES['CVRP']['params'])
+        with open(FAMILIES['CVRP']['file']) as f:
+            imports, code = split_imports(f.read())
+        state = {'messages': [], 'generation': common.code(prefix='', imports=imports, code=code), 'iterations': 0}
+        result = common.code_check(state, params, load_gene_code('CVRP')(**params))
+        self.assertEqual(result['error'], 'no', result['messages'])
+
+
+if __name__ == '__main__':
+    unittest.main()
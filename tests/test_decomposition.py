@@ -0,0 +1,41 @@
+import unittest
+
+from decomposition import _route_apart, late_customers, solve_decomposed
+from insertion import RoutePlan
+from routing_toolkit import RoutingModelBuilder
+
+# Customer 3 is reached in time only through customer 2: the arc from the depot is longer than the detour.
+SHORTCUT_MATRIX = [
+    [0, 4, 5, 10],
+    [4, 0, 6, 9],
+    [5, 6, 0, 3],
+    [10, 9, 3, 0],
+]
+SHORTCUT_WINDOWS = [(0, 100), (0, 20), (0, 20), (0, 9)]
+
+
+class LateCustomersTest(unittest.TestCase):
+
+    def model(self):
+        return RoutingModelBuilder(SHORTCUT_MATRIX, 2, depot=0).add_time_windows(SHORTCUT_WINDOWS)
+
+    def test_chains(self):
+        self.assertEqual(late_customers(self.model()), {3: [2]})
+
+    def test_route_apart(self):
+        # no route reaches customer 3 in time: customer 2 leaves its route to serve it in the empty one
+        plan = RoutePlan(self.model(), [[1, 2], []])
+        self.assertEqual(plan.insert(3, reoptimize=False), [])
+        self.assertTrue(_route_apart(plan, [2, 3]))
+        self.assertEqual(plan.routes, [[1], [2, 3]])
+
+    def test_routed(self):
+        # left out of the parts, customer 3 is inserted after customer 2
+        result = solve_decomposed(self.model(), time_limit=2, parts=2, workers=1)
+        self.assertGreaterEqual(result['obj'], 0)
+        route = next(route for route in result['routes'] if 3 in route)
+        self.assertEqual(route[route.index(3) - 1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
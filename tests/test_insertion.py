@@ -0,0 +1,28 @@
+import unittest
+
+from generator import generate
+from insertion import RoutePlan
+from instances import select_params
+from routing_toolkit import model_from_params
+from tests.test_routing_toolkit import FAMILIES
+
+
+class RoutePlanTest(unittest.TestCase):
+
+    def test_reoptimize_pair(self):
+        # a pair taken out of the planted routes and inserted back by re-solving its routes with it
+        superset, meta = generate('PDPTW', 24, seed=0, families=FAMILIES)
+        model = model_from_params(select_params(superset, FAMILIES['PDPTW']['params']))
+        pickup, delivery = model.pickups_deliveries[0]
+        routes = [[node for node in route if node not in (pickup, delivery)] for route in meta['planted_routes']]
+        plan = RoutePlan(model, routes)
+        vehicles = [vehicle for vehicle, route in enumerate(routes) if len(route) > 2][:2]
+        self.assertTrue(plan._reoptimize(vehicles, [pickup, delivery], time_limit=2))
+        route = next(route for route in plan.routes if pickup in route)
+        self.assertLess(route.index(pickup), route.index(delivery))
+        self.assertEqual(len(plan.visited), sum(len(route) - 2 for route in meta['planted_routes']))
+        self.assertTrue(all(plan.fits(vehicle, route) for vehicle, route in enumerate(plan.routes)))
+
+
+if __name__ == '__main__':
+    unittest.main()
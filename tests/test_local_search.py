@@ -0,0 +1,36 @@
+import unittest
+
+from generator import generate
+from instances import select_params
+from local_search import LocalSearch
+from route_evaluator import RouteEvaluator
+from routing_toolkit import model_from_params
+from tests.test_routing_toolkit import FAMILIES
+
+
+class LocalSearchTest(unittest.TestCase):
+
+    def test_time_windows_routed(self):
+        # the planted solutions of the generated instances route every customer
+        for family in ('VRPTW', 'CVRPTW'):
+            for seed in range(3):
+                with self.subTest(family=family, seed=seed):
+                    superset, _ = generate(family, 30, seed=seed, families=FAMILIES)
+                    params = select_params(superset, FAMILIES[family]['params'])
+                    search = LocalSearch(model_from_params(params))
+                    self.assertGreaterEqual(search.solve(time_limit=1), 0)
+                    self.assertEqual(RouteEvaluator.from_params(params).check(search.routes()), [])
+
+    def test_tight_fleet_routed(self):
+        # about ten customers per vehicle: the ejections leave customers of tight windows out of the first routes
+        for seed in range(1, 4):
+            with self.subTest(seed=seed):
+                superset, _ = generate('VRPTW', 120, seed=seed, families=FAMILIES)
+                params = select_params(superset, FAMILIES['VRPTW']['params'])
+                search = LocalSearch(model_from_params(params))
+                self.assertGreaterEqual(search.solve(time_limit=10), 0)
+                self.assertEqual(RouteEvaluator.from_params(params).check(search.routes()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from generator import generate
+from instances import select_params
+from route_evaluator import RouteEvaluator
+from tests.test_routing_toolkit import FAMILIES, SAMPLE_OBJECTIVE, SAMPLE_TIME_MATRIX, SAMPLE_TIME_WINDOWS
+
+# The optimal routes of the VRPTW sample of the OR-tools guides.
+SAMPLE_ROUTES = [[0, 9, 14, 16, 0], [0, 7, 1, 4, 3, 0], [0, 12, 13, 15, 11, 0], [0, 5, 8, 6, 2, 10, 0]]
+
+
+class RouteEvaluatorTest(unittest.TestCase):
+
+    def sample(self):
+        return RouteEvaluator.from_params({'time_matrix': SAMPLE_TIME_MATRIX, 'time_windows': SAMPLE_TIME_WINDOWS,
+                                           'num_vehicle': 4, 'depot': 0})
+
+    def test_sample_routes(self):
+        evaluator = self.sample()
+        self.assertEqual(evaluator.check(SAMPLE_ROUTES), [])
+        self.assertEqual(evaluator.evaluate([SAMPLE_ROUTES])['objective'][0], SAMPLE_OBJECTIVE)
+
+    def test_reversed_sample_routes(self):
+        self.assertTrue(self.sample().check([route[::-1] for route in SAMPLE_ROUTES]))
+
+    def test_planted_routes_feasible(self):
+        for family in FAMILIES:
+            with self.subTest(family=family):
+                superset, meta = generate(family, 24, seed=0, families=FAMILIES)
+                evaluator = RouteEvaluator.from_params(select_params(superset, FAMILIES[family]['params']))
+                self.assertEqual(evaluator.check(meta['planted_routes']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import importlib.util
+import os
+import unittest
+
+from generator import generate, load_families
+from instances import select_params
+from routing_toolkit import RoutingModelBuilder, model_from_params, search_profile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAMILIES = load_families(os.path.join(ROOT, 'gene_codes'))
+
+# The VRPTW sample of the OR-tools guides: its optimal objective is 71.
+SAMPLE_TIME_MATRIX = [
+    [0, 6, 9, 8, 7, 3, 6, 2, 3, 2, 6, 6, 4, 4, 5, 9, 7],
+    [6, 0, 8, 3, 2, 6, 8, 4, 8, 8, 13, 7, 5, 8, 12, 10, 14],
+    [9, 8, 0, 11, 10, 6, 3, 9, 5, 8, 4, 15, 14, 13, 9, 18, 9],
+    [8, 3, 11, 0, 1, 7, 10, 6, 10, 10, 14, 6, 7, 9, 14, 6, 16],
+    [7, 2, 10, 1, 0, 6, 9, 4, 8, 9, 13, 4, 6, 8, 12, 8, 14],
+    [3, 6, 6, 7, 6, 0, 2, 3, 2, 2, 7, 9, 7, 7, 6, 12, 8],
+    [6, 8, 3, 10, 9, 2, 0, 6, 2, 5, 4, 12, 10, 10, 6, 15, 5],
+    [2, 4, 9, 6, 4, 3, 6, 0, 4, 4, 8, 5, 4, 3, 7, 8, 10],
+    [3, 8, 5, 10, 8, 2, 2, 4, 0, 3, 4, 9, 8, 7, 3, 13, 6],
+    [2, 8, 8, 10, 9, 2, 5, 4, 3, 0, 4, 6, 5, 4, 3, 9, 5],
+    [6, 13, 4, 14, 13, 7, 4, 8, 4, 4, 0, 10, 9, 8, 4, 13, 4],
+    [6, 7, 15, 6, 4, 9, 12, 5, 9, 6, 10, 0, 1, 3, 7, 3, 10],
+    [4, 5, 14, 7, 6, 7, 10, 4, 8, 5, 9, 1, 0, 2, 6, 4, 8],
+    [4, 8, 13, 9, 8, 7, 10, 3, 7, 4, 8, 3, 2, 0, 4, 5, 6],
+    [5, 12, 9, 14, 12, 6, 6, 7, 3, 3, 4, 7, 6, 4, 0, 9, 2],
+    [9, 10, 18, 6, 8, 12, 15, 8, 13, 9, 13, 3, 4, 5, 9, 0, 9],
+    [7, 14, 9, 16, 14, 8, 5, 10, 6, 5, 4, 10, 8, 6, 2, 9, 0],
+]
+SAMPLE_TIME_WINDOWS = [(0, 5), (7, 12), (10, 15), (16, 18), (10, 13), (0, 5), (5, 10), (0, 4), (5, 10), (0, 3),
+                       (10, 16), (10, 15), (0, 5), (5, 10), (7, 8), (10, 15), (11, 15)]
+SAMPLE_OBJECTIVE = 71
+
+
+def load_gene_code(family):
+    """The solve function of a gene_codes family."""
+    spec = importlib.util.spec_from_file_location(family, FAMILIES[family]['file'])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.solve
+
+
+def reads(model, routes):
+    """Whether the routing model of a builder accepts routes, given with their depots."""
+    _, routing = model.build()
+    routing.CloseModelWithParameters(search_profile())
+    return model._read([route[1:-1] for route in routes]) is not None
+
+
+class VRPTWSampleTest(unittest.TestCase):
+
+    def test_builder_objective(self):
+        model = RoutingModelBuilder(SAMPLE_TIME_MATRIX, 4, depot=0).add_time_windows(SAMPLE_TIME_WINDOWS)
+        self.assertEqual(model.solve(time_limit=5), SAMPLE_OBJECTIVE)
+
+    def test_gene_codes_objective(self):
+        for family in ('VRPTW', 'CVRPTW'):
+            with self.subTest(family=family):
+                params = {'time_matrix': SAMPLE_TIME_MATRIX, 'time_windows': SAMPLE_TIME_WINDOWS,
+                          'num_vehicle': 4, 'depot': 0, 'demands': [0] * 17, 'vehicle_capacities': [100] * 4}
+                solve = load_gene_code(family)
+                self.assertEqual(solve(**select_params(params, FAMILIES[family]['params'])), SAMPLE_OBJECTIVE)
+
+    def test_end_windows(self):
+        # the routes come back after the depot window closed
+        model = RoutingModelBuilder(SAMPLE_TIME_MATRIX, 4, depot=0)
+        self.assertEqual(model.add_time_windows(SAMPLE_TIME_WINDOWS, end_windows=True).solve(time_limit=5), -1)
+        widened = [(0, 30)] + SAMPLE_TIME_WINDOWS[1:]
+        model = RoutingModelBuilder(SAMPLE_TIME_MATRIX, 4, depot=0)
+        self.assertEqual(model.add_time_windows(widened, end_windows=True).solve(time_limit=5), SAMPLE_OBJECTIVE)
+
+
+class PlantedRoutesTest(unittest.TestCase):
+    """Each family of gene_codes is a combination of constraints, with a planted solution."""
+
+    def generated(self, family):
+        superset, meta = generate(family, 24, seed=0, families=FAMILIES)
+        return select_params(superset, FAMILIES[family]['params']), meta['planted_routes']
+
+    def test_planted_routes_accepted(self):
+        for family in FAMILIES:
+            with self.subTest(family=family):
+                params, routes = self.generated(family)
+                self.assertTrue(reads(model_from_params(params), routes))
+
+    def test_reversed_routes_rejected(self):
+        for family, spec in FAMILIES.items():
+            if 'time_windows' not in spec['params'] and 'pickups_deliveries' not in spec['params']:
+                continue
+            with self.subTest(family=family):
+                params, routes = self.generated(family)
+                self.assertFalse(reads(model_from_params(params), [route[::-1] for route in routes]))
+
+    def test_solved(self):
+        for family in FAMILIES:
+            with self.subTest(family=family):
+                params, routes = self.generated(family)
+                model = model_from_params(params).add_initial_routes(routes)
+                self.assertGreaterEqual(model.solve(time_limit=2), 0)
+
+    def test_time_windows_solved_from_scratch(self):
+        # without the planted routes: the first solution heuristics miss nodes of tight windows
+        for family, spec in FAMILIES.items():
+            if 'time_windows' not in spec['params']:
+                continue
+            with self.subTest(family=family):
+                superset, _ = generate(family, 30, seed=1, families=FAMILIES)
+                model = model_from_params(select_params(superset, spec['params']))
+                self.assertGreaterEqual(model.solve(time_limit=5), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
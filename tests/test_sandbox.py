@@ -0,0 +1,31 @@
+import unittest
+from unittest import mock
+
+from sandbox import run_batch
+
+# Candidates of a batch, each followed by the status of its verdict.
+CANDIDATES = [
+    ("def solve(n):\n    return n + 1", "ok"),
+    ("import os\ndef solve(n):\n    os._exit(3)", "error"),
+    ("import time\ndef solve(n):\n    time.sleep(60)", "timeout"),
+    ("def solve(n)\n    return n", "error"),
+    ("import sys\ndef solve(n):\n    sys.exit(0)", "error"),
+    ("def solve(n):\n    return n + 2", "ok"),
+]
+
+
+class RunBatchTest(unittest.TestCase):
+
+    def test_verdicts(self):
+        # the candidates after one that crashes or times out still get their own verdicts
+        sources, statuses = zip(*CANDIDATES)
+        for fork in (True, False):
+            with self.subTest(fork=fork), mock.patch('sandbox.BATCH_GRACE', 3):
+                verdicts = run_batch(list(sources), {'n': 1}, timeout=1, fork=fork)
+                self.assertEqual([verdict['status'] for verdict in verdicts], list(statuses))
+                self.assertEqual([verdicts[0]['obj'], verdicts[-1]['obj']], ['2', '3'])
+                self.assertIn('crashed', verdicts[1]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+
+def token_usage(response):
+    """The (input, output) tokens of an LLM response, from the usage of its messages or of the provider output."""
+    input_tokens, output_tokens = 0, 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                input_tokens += usage.get('input_tokens', 0)
+                output_tokens += usage.get('output_tokens', 0)
+    if not input_tokens and not output_tokens and response.llm_output:
+        usage = response.llm_output.get('token_usage') or response.llm_output.get('usage') or {}
+        input_tokens = usage.get('prompt_tokens', usage.get('input_tokens', 0))
+        output_tokens = usage.get('completion_tokens', usage.get('output_tokens', 0))
+    return input_tokens, output_tokens
+
+
+class UsageTracker(BaseCallbackHandler):
+    """
+    Counts the LLM calls, tokens and time of every chain invoked while it is active.
+
+    The time spent in retrievers (reported by their callbacks) and in code checks (reported by
+    timed_sandbox) is counted separately, so the wall time of a problem can be split between them.
+    """
+
+    def __init__(self, snapshot=None):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.previous_wall_time = 0.
+        self.starts = {}
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.llm_time = 0.
+        self.retrievals = set()
+        self.retrieval_calls = 0
+        self.retrieval_time = 0.
+        self.sandbox_calls = 0
+        self.sandbox_time = 0.
+        if snapshot:
+            self.restore(snapshot)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        with self.lock:
+            self.starts[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self.lock:
+            self.starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        input_tokens, output_tokens = token_usage(response)
+        with self.lock:
+            start = self.starts.pop(run_id, None)
+            if start is not None:
+                self.llm_time += time.perf_counter() - start
+            self.llm_calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self.lock:
+            start = self.starts.pop(run_id, None)
+            if start is not None:
+                self.llm_time += time.perf_counter() - start
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        with self.lock:
+            # retrievers combining other retrievers are timed once, at the outermost one
+            if parent_run_id not in self.retrievals:
+                self.starts[run_id] = time.perf_counter()
+            self.retrievals.add(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        with self.lock:
+            self.retrievals.discard(run_id)
+            start = self.starts.pop(run_id, None)
+            if start is not None:
+                self.retrieval_time += time.perf_counter() - start
+                self.retrieval_calls += 1
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self.on_retriever_end([], run_id=run_id)
+
+    def add_sandbox_time(self, seconds):
+        with self.lock:
+            self.sandbox_calls += 1
+            self.sandbox_time += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "llm_calls": self.llm_calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "llm_time": round(self.llm_time, 3),
+                "retrieval_calls": self.retrieval_calls,
+                "retrieval_time": round(self.retrieval_time, 3),
+                "sandbox_calls": self.sandbox_calls,
+                "sandbox_time": round(self.sandbox_time, 3),
+                "wall_time": round(self.previous_wall_time + time.perf_counter() - self.started, 3),
+            }
+
+    def restore(self, snapshot):
+        self.llm_calls = snapshot.get("llm_calls", 0)
+        self.input_tokens = snapshot.get("input_tokens", 0)
+        self.output_tokens = snapshot.get("output_tokens", 0)
+        self.llm_time = snapshot.get("llm_time", 0.)
+        self.retrieval_calls = snapshot.get("retrieval_calls", 0)
+        self.retrieval_time = snapshot.get("retrieval_time", 0.)
+        self.sandbox_calls = snapshot.get("sandbox_calls", 0)
+        self.sandbox_time = snapshot.get("sandbox_time", 0.)
+        self.previous_wall_time = snapshot.get("wall_time", 0.)
+
+
+usage_tracker_var = ContextVar("usage_tracker", default=None)
+# Every chain invoked while the variable is set gets the tracker as a callback, without passing it around
+register_configure_hook(usage_tracker_var, inheritable=True)
+
+
+@contextmanager
+def track_usage(snapshot=None):
+    """Track the LLM usage of everything run inside the context, starting from a previous snapshot if given."""
+    tracker = UsageTracker(snapshot)
+    token = usage_tracker_var.set(tracker)
+    try:
+        yield tracker
+    finally:
+        usage_tracker_var.reset(token)
+
+
+@contextmanager
+def timed_sandbox():
+    """Count the time spent inside the context (or decorated function) as sandbox time of the active tracker."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracker = usage_tracker_var.get()
+        if tracker is not None:
+            tracker.add_sandbox_time(time.perf_counter() - start)
+
+
+def current_usage():
+    """Snapshot of the active tracker, or None outside of track_usage."""
+    tracker = usage_tracker_var.get()
+    return tracker.snapshot() if tracker is not None else None
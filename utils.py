@@ -212,8 +212,12 @@ Please directly return the commented code snippet and do not change the code and
     return result
 
 
+# Directory where the successfully generated codes are saved
+GENE_CODES_DIR = "./data/OR-tools/gene_codes"
+
+
 def write_code_to_file(problem, imports, code, llm):
-    file_path = f"./data/OR-tools/gene_codes/{problem}.py"
+    file_path = os.path.join(GENE_CODES_DIR, f"{problem}.py")
     code_string = "# " + problem + "\n" + imports + "\n" + code
     new_code_string = commenter(code_string, llm).code
     with open(file_path, "w") as file: